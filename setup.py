@@ -84,6 +84,8 @@ setup(
         'matplotlib>=3',
         ],
     extras_require={
+        'parquet': ['pyarrow'],
+        'hdf5': ['h5py'],
         # eg:
         #   'rst': ['docutils>=0.11'],
         #   ':python_version=="2.6"': ['argparse'],
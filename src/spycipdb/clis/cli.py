@@ -16,9 +16,11 @@ import sys
 
 from spycipdb import __version__, log
 from spycipdb.clis import (
+    cli_all,
     cli_cs,
     cli_jc,
     cli_noe,
+    cli_pack,
     cli_pre,
     cli_rdc,
     cli_rh,
@@ -44,6 +46,11 @@ Core back-calculator functions:
     * {cli_rh._name}
     * {cli_rdc._name}
     * {cli_smfret._name}
+    * {cli_all._name}
+
+Utilities:
+
+    * {cli_pack._name}
 """
 
 ap = libcli.CustomParser(
@@ -68,6 +75,8 @@ libcli.add_subparser(subparsers, cli_saxs)
 libcli.add_subparser(subparsers, cli_rh)
 libcli.add_subparser(subparsers, cli_rdc)
 libcli.add_subparser(subparsers, cli_smfret)
+libcli.add_subparser(subparsers, cli_all)
+libcli.add_subparser(subparsers, cli_pack)
 
 
 def load_args():
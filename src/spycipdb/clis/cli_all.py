@@ -0,0 +1,186 @@
+"""
+Back-calculates several observables in a single pass over the ensemble.
+
+Each conformer is read and parsed once, and its coordinates are
+dispatched to every requested back-calculator in the same worker.
+Supports the internal PRE, NOE, JC and smFRET back-calculators, as
+well as Rh with HullRadSAS.
+
+USAGE:
+    $ spycipdb all <PDB-FILES> [--noe] [--pre] [--jc] [--smfret] [--rh]
+    $ spycipdb all <PDB-FILES> [--noe] [--pre] [--jc] [--smfret] [--rh]
+        [--output] [--ncores]
+
+REQUIREMENTS:
+    Experimental data templates as required by each module.
+
+OUTPUT:
+    One file per observable, `<output>_<observable>.<output-format>`,
+    formatted as the output of the respective module.
+"""
+import argparse
+from contextlib import ExitStack
+
+from spycipdb import log
+from spycipdb.core.plans import (
+    CombinedPlan,
+    JCPlan,
+    NOEPlan,
+    PREPlan,
+    SmFRETPlan,
+    execute_plan,
+    )
+from spycipdb.libs import libcli
+from spycipdb.libs.libfuncs import get_plan_inputs
+from spycipdb.libs.liboutput import get_writer
+from spycipdb.logger import S, T, init_files
+
+
+LOGFILESNAME = '.spycipdb_all'
+_name = 'all'
+_help = 'Back-calculates several observables in a single pass.'
+
+_prog, _des, _usage = libcli.parse_doc_params(__doc__)
+
+ap = libcli.CustomParser(
+    prog=_prog,
+    description=libcli.detailed.format(_des),
+    usage=_usage,
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+libcli.add_argument_pdb_files(ap)
+
+# observable name, plan and help of each template argument
+PLANS = {
+    'pre': (PREPlan, 'Path to the PRE experimental file template.'),
+    'noe': (NOEPlan, 'Path to the NOE experimental file template.'),
+    'jc': (JCPlan, 'Path to the JC experimental file template.'),
+    'smfret': (SmFRETPlan, 'Path to the smFRET experimental file template.'),
+    }
+
+for _obs, (_plan, _obs_help) in PLANS.items():
+    ap.add_argument(f'--{_obs}', help=_obs_help, type=str, default=None)
+
+ap.add_argument(
+    '--rh',
+    help='Back-calculate Rh values using HullRadSAS v3.1.',
+    action='store_true',
+    )
+
+ap.add_argument(
+    '-o',
+    '--output',
+    help=(
+        'Prefix of the output files, one per observable. '
+        'Defaults to `output`.'
+        ),
+    type=str,
+    default='output',
+    )
+
+libcli.add_argument_output_format(ap)
+
+libcli.add_argument_ncores(ap)
+
+
+def main(
+        pdb_files,
+        output='output',
+        ncores=1,
+        output_format='json',
+        pre=None,
+        noe=None,
+        jc=None,
+        smfret=None,
+        rh=False,
+        **kwargs,
+        ):
+    """
+    Process PDB structures and output back-calculated values.
+
+    Parameters
+    ----------
+    pdb_files : str or Path, required
+        Path to a .TAR or folder of PDB files.
+
+    output : str, optional
+        Prefix of the output files.
+        Defaults to `output`.
+
+    ncores : int, optional
+        The number of cores to use.
+        Defaults to 1.
+
+    output_format : str, optional
+        Format of the output files, `json`, `ndjson`,
+        `npz`, `parquet` or `hdf5`.
+        Defaults to `json`.
+
+    pre, noe, jc, smfret : str or Path, optional
+        Paths to the experimental file templates of the
+        observables to back-calculate.
+
+    rh : Bool, optional
+        Whether to back-calculate Rh values.
+        Defaults to False.
+    """
+    init_files(log, LOGFILESNAME)
+
+    exp_files = {
+        obs: fexp
+        for obs, fexp in zip(PLANS, (pre, noe, jc, smfret))
+        if fexp is not None
+        }
+    if not exp_files and not rh:
+        log.info(
+            'No observables were requested. Give at least one experimental '
+            'file template or `--rh`.'
+            )
+        return
+
+    log.info(T('reading input paths'))
+    pdbs2operate, reference, ensemble = get_plan_inputs(pdb_files)
+    if reference is None:
+        log.info(
+            'No .pdb files were found based on the input. Make sure the '
+            'folder/tarball contains .pdb files. Only .tar, .tar.xz, .tar.gz '
+            'tarballs are accepted.'
+            )
+        return
+    log.info(S('done'))
+
+    log.info(T('compiling experimental templates'))
+    plans = {
+        obs: PLANS[obs][0](fexp, reference)
+        for obs, fexp in exp_files.items()
+        }
+    plan = CombinedPlan(plans, reference, rh=rh)
+    log.info(S('done'))
+
+    log.info(T(f'back calculating using {ncores} workers'))
+    execute_pool = execute_plan(plan, pdbs2operate, ncores, ensemble)
+
+    observables = list(plan.format) + (['rh'] if rh else [])
+    with ExitStack() as stack:
+        writers = {
+            obs: stack.enter_context(
+                get_writer(f'{output}_{obs}.{output_format}', output_format)
+                )
+            for obs in observables
+            }
+        for obs, fmt in plan.format.items():
+            writers[obs].write('format', fmt)
+
+        for pdb, results in execute_pool:
+            for obs, values in results.items():
+                # Rh is keyed by file name as in the `rh` module
+                key = pdb.name if obs == 'rh' else pdb.stem
+                writers[obs].write(key, values)
+    log.info(S('done'))
+
+    return
+
+
+if __name__ == '__main__':
+    libcli.maincli(ap, main)
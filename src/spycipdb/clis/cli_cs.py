@@ -44,17 +44,20 @@ OUTPUT:
     }
 """
 import argparse
-import json
+import multiprocessing
 import shutil
 from functools import partial
+from itertools import chain
 from pathlib import Path
 
-from idpconfgen.libs.libmulticore import pool_function
 from natsort import os_sorted
 
 from spycipdb import log
+from spycipdb.components.helpers import keep_ucbshift_warm
 from spycipdb.libs import libcli
 from spycipdb.libs.libfuncs import get_pdb_paths
+from spycipdb.libs.libmulticore import pool_function
+from spycipdb.libs.liboutput import get_resumable_writer
 from spycipdb.logger import S, T, init_files, report_on_crash
 
 
@@ -90,6 +93,8 @@ ap.add_argument(
     )
 
 libcli.add_argument_output(ap)
+libcli.add_argument_output_format(ap)
+libcli.add_argument_resume(ap)
 libcli.add_argument_ncores(ap)
 
 TMPDIR = '__tmpcs__'
@@ -109,6 +114,8 @@ def main(
         output,
         ph=5,
         ncores=1,
+        output_format='json',
+        resume=False,
         tmpdir=TMPDIR,
         **kwargs,
         ):
@@ -132,13 +139,27 @@ def main(
         The number of cores to use.
         Defaults to 1.
     
+    output_format : str, optional
+        Format of the output file, `json`, `ndjson`,
+        `npz`, `parquet` or `hdf5`.
+        Defaults to `json`.
+    
+    resume : Bool, optional
+        Whether to record completed conformers in a journal and
+        skip those recorded by a previous run.
+        Defaults to False.
+    
     tmpdir : str or Path, optional
         Path to the temporary directory if working with .TAR files.
         Defaults to TMPDIR.
     """
     init_files(log, LOGFILESNAME)
     
-    if ncores > 4:
+    # models loaded by the first conformer are kept in memory and
+    # inherited by the workers forked afterwards
+    shared = keep_ucbshift_warm() \
+        and multiprocessing.get_start_method() == 'fork'
+    if ncores > 4 and not shared:
         log.info(S(
             'WARNING: UCBShift models are RAM hungry! '
             'Consider running with lower number of workers if you '
@@ -165,35 +186,48 @@ def main(
     log.info(S('done'))
     
     log.info(T(f'back calculaing using {ncores} workers'))
+    writer, pending = get_resumable_writer(
+        output,
+        output_format,
+        str_pdbpaths,
+        resume,
+        )
     execute = partial(
         report_on_crash,
         calc_sing_pdb,
         pH=ph,
         )
-    execute_pool = pool_function(execute, str_pdbpaths, method='imap', ncores=ncores)  # noqa: E501
-
-    _output = {}
-    for result in execute_pool:
-        per_struct = {}
-        format = {}
-        format['res'] = result[1].RESNUM.values.astype(int).tolist()
-        format['resname'] = result[1].RESNAME.values.tolist()
-        
-        per_struct['H'] = result[1].H_UCBShift.values.astype(float).tolist()
-        per_struct['HA'] = result[1].HA_UCBShift.values.astype(float).tolist()
-        per_struct['C'] = result[1].C_UCBShift.values.astype(float).tolist()
-        per_struct['CA'] = result[1].CA_UCBShift.values.astype(float).tolist()
-        per_struct['CB'] = result[1].CB_UCBShift.values.astype(float).tolist()
-        per_struct['N'] = result[1].N_UCBShift.values.astype(float).tolist()
-        
-        _output['format'] = format
-        _output[result[0]] = per_struct
-    
-    log.info(S('done'))
-    
-    log.info(T('Writing output onto disk'))
-    with open(output, mode="w") as fout:
-        fout.write(json.dumps(_output, indent=4))
+    warm = [execute(pdb) for pdb in pending[:1]]
+    execute_pool = chain(
+        warm,
+        pool_function(
+            execute,
+            pending[1:],
+            method='imap',
+            ncores=ncores,
+            initializer=keep_ucbshift_warm,
+            ),
+        )
+
+    with writer:
+        for pdb, result in zip(pending, execute_pool):
+            writer.start(Path(pdb).name)
+            shifts = result[1]
+            if writer.empty:
+                format = {}
+                format['res'] = shifts.RESNUM.values.astype(int).tolist()
+                format['resname'] = shifts.RESNAME.values.tolist()
+                writer.write('format', format)
+            
+            per_struct = {}
+            per_struct['H'] = shifts.H_UCBShift.values.astype(float).tolist()
+            per_struct['HA'] = shifts.HA_UCBShift.values.astype(float).tolist()
+            per_struct['C'] = shifts.C_UCBShift.values.astype(float).tolist()
+            per_struct['CA'] = shifts.CA_UCBShift.values.astype(float).tolist()
+            per_struct['CB'] = shifts.CB_UCBShift.values.astype(float).tolist()
+            per_struct['N'] = shifts.N_UCBShift.values.astype(float).tolist()
+            
+            writer.write(result[0], per_struct)
     log.info(S('done'))
     
     if _istarfile:
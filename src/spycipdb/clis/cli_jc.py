@@ -4,9 +4,12 @@ Back-calculates the J-Couping angles (radians) from PDB structure file.
 Uses idpconfgen libraries for coordinate parsing as it's proven
 to be faster than BioPython.
 
+Use `--karplus` to output values in hertz, converted with the Karplus
+equation and constants from Lincoff et al. 2020.
+
 USAGE:
     $ spycipdb jc <PDB-FILES>
-    $ spycipdb jc <PDB-FILES> [--output] [--ncores] [--plot]
+    $ spycipdb jc <PDB-FILES> [--output] [--ncores] [--plot] [--karplus]
     
 REQUIREMENTS:
     Experimental data must be comma-delimited with the following column:
@@ -27,23 +30,17 @@ OUTPUT:
     }
 """
 import argparse
-import json
-import shutil
-from functools import partial
-from pathlib import Path
 
 import matplotlib.pyplot as plt
 import pandas as pd
-from idpconfgen.libs.libmulticore import pool_function
-from idpconfgen.libs.libstructure import Structure, col_resSeq
-from natsort import os_sorted
 
 from spycipdb import log
-from spycipdb.core.calculators import calc_jc
-from spycipdb.core.exceptions import SPyCiPDBException
+from spycipdb.core.calculators import karplus_j
+from spycipdb.core.plans import JCPlan, write_plan
 from spycipdb.libs import libcli
-from spycipdb.libs.libfuncs import get_pdb_paths
-from spycipdb.logger import S, T, init_files, report_on_crash
+from spycipdb.libs.libfuncs import get_plan_inputs
+from spycipdb.libs.liboutput import get_writer, read_output
+from spycipdb.logger import S, T, init_files
 
 
 LOGFILESNAME = '.spycipdb_jc'
@@ -62,51 +59,30 @@ ap = libcli.CustomParser(
 libcli.add_argument_pdb_files(ap)
 libcli.add_argument_exp_file(ap)
 libcli.add_argument_output(ap)
+libcli.add_argument_output_format(ap)
 libcli.add_argument_ncores(ap)
 libcli.add_argument_plot(ap)
+libcli.add_argument_deprecated_tmpdir(ap)
 
-TMPDIR = '__tmpjc__'
 ap.add_argument(
-    '--tmpdir',
+    '--karplus',
     help=(
-        'Temporary directory to store data during calculation '
-        'if needed.'
+        'Output JC values in hertz, converted with the Karplus equation. '
+        'Defaults to off, values are the cosine of phi - 60 degrees.'
         ),
-    type=Path,
-    default=TMPDIR,
+    action='store_true',
+    default=False,
     )
 
 
-def karplus_j(x):
-    """
-    Convert back-calculated units to hertz using the Karplus equation.
-    
-    Constants defined from Lincoff et al. 2020
-    (https://doi.org/10.1038/s42004-020-0323-0)
-
-    Parameters
-    ----------
-    x : float
-        Back calculated value.
-
-    Returns
-    -------
-        Value converted to Hertz.
-    """
-    a = 6.51
-    b = -1.76
-    c = 1.6
-    
-    return (a * (x ** 2)) + b * x + c
-
-
 def main(
         pdb_files,
         exp_file,
         output,
         ncores=1,
+        output_format='json',
         plot=False,
-        tmpdir=TMPDIR,
+        karplus=False,
         **kwargs,
         ):
     """
@@ -129,19 +105,29 @@ def main(
         The number of cores to use.
         Defaults to 1.
     
+    output_format : str, optional
+        Format of the output file, `json`, `ndjson`,
+        `npz`, `parquet` or `hdf5`.
+        Defaults to `json`.
+    
     plot : Bool, optional
         Whether to plot the back-calculated results or not.
         Defaults to False.
     
-    tmpdir : str or Path, optional
-        Path to the temporary directory if working with .TAR files.
-        Defaults to TMPDIR.
+    karplus : Bool, optional
+        Whether to output the values in hertz.
+        Defaults to False.
     """
     init_files(log, LOGFILESNAME)
+    if kwargs.get('tmpdir') is not None:
+        log.info(S(
+            'WARNING: --tmpdir is deprecated and ignored, tarballs '
+            'are streamed without extracting them.'
+            ))
     
     log.info(T('reading input paths'))
-    pdbs2operate, _istarfile = get_pdb_paths(pdb_files, tmpdir)
-    if len(pdbs2operate) == 0 or pdbs2operate is None:
+    pdbs2operate, reference, ensemble = get_plan_inputs(pdb_files)
+    if reference is None:
         log.info(
             'No .pdb files were found based on the input. Make sure the '
             'folder/tarball contains .pdb files. Only .tar, .tar.xz, .tar.gz '
@@ -149,57 +135,19 @@ def main(
             )
         return
     log.info(S('done'))
-    pdbs2operate = os_sorted(pdbs2operate)
-    _output = {}
-    exp = pd.read_csv(exp_file)
-    try:
-        _output['format'] = exp.resnum.values.tolist()
-        struc = Structure(pdbs2operate[0])
-        struc.build()
-        last_residue = int(struc.data_array[:, col_resSeq][-1])
-        resnums = exp.resnum.values.astype(int).tolist()
-        
-        for res in resnums:
-            if res <= 0 or res > last_residue:
-                errmsg = (
-                    'resnum cannot contain 0 or negative values '
-                    'and cannot be greater than the maximum number of '
-                    'residues in your PDB structure.'
-                    )
-                raise SPyCiPDBException(errmsg)
-        
-    except AttributeError as err:
-        errmsg = (
-            'Incorrect experimental file format for JC subclient. '
-            'Text file must have the following columns: '
-            'resnum'
-            )
-        raise SPyCiPDBException(errmsg) from err
-    
-    log.info(T(f'back calculaing using {ncores} workers'))
-    execute = partial(
-        report_on_crash,
-        calc_jc,
-        exp_file,
-        )
-    execute_pool = pool_function(execute, pdbs2operate, method='imap', ncores=ncores)  # noqa: E501
-
-    for result in execute_pool:
-        _output[result[0].stem] = result[1]
+    log.info(T('compiling experimental template'))
+    plan = JCPlan(exp_file, reference, karplus=karplus)
     log.info(S('done'))
     
-    log.info(T('Writing output onto disk'))
-    with open(output, mode="w") as fout:
-        fout.write(json.dumps(_output, indent=4))
+    log.info(T(f'back calculaing using {ncores} workers'))
+    with get_writer(output, output_format) as writer:
+        write_plan(plan, pdbs2operate, writer, ncores, ensemble)
     log.info(S('done'))
     
-    if _istarfile:
-        shutil.rmtree(tmpdir)
-    
     if plot:
         log.info(T('Plotting back-calculated data'))
         
-        rawdata = _output
+        rawdata = read_output(output)
         RESIDUES = rawdata['format']
         del rawdata['format']
 
@@ -210,7 +158,7 @@ def main(
         for conf in rawdata:
             jc = rawdata[conf]
             for i, res in enumerate(RESIDUES):
-                j = karplus_j(jc[i])
+                j = jc[i] if karplus else karplus_j(jc[i])
                 aligned_data[res].append(j)
 
         dataframe = pd.DataFrame(aligned_data)
@@ -40,21 +40,15 @@ OUTPUT:
     }
 """
 import argparse
-import json
-import shutil
-from functools import partial
-from pathlib import Path
 
 import pandas as pd
-from idpconfgen.libs.libmulticore import pool_function
-from natsort import os_sorted
 
 from spycipdb import log
-from spycipdb.core.calculators import calc_noe
-from spycipdb.core.parsers import get_exp_format_noe
+from spycipdb.core.plans import NOEPlan, write_plan
 from spycipdb.libs import libcli
-from spycipdb.libs.libfuncs import get_pdb_paths, plot_data_and_ranges
-from spycipdb.logger import S, T, init_files, report_on_crash
+from spycipdb.libs.libfuncs import get_plan_inputs, plot_data_and_ranges
+from spycipdb.libs.liboutput import get_writer, read_output
+from spycipdb.logger import S, T, init_files
 
 
 LOGFILESNAME = '.spycipdb_noe'
@@ -73,19 +67,10 @@ ap = libcli.CustomParser(
 libcli.add_argument_pdb_files(ap)
 libcli.add_argument_exp_file(ap)
 libcli.add_argument_output(ap)
+libcli.add_argument_output_format(ap)
 libcli.add_argument_ncores(ap)
 libcli.add_argument_plot(ap)
-
-TMPDIR = '__tmpnoe__'
-ap.add_argument(
-    '--tmpdir',
-    help=(
-        'Temporary directory to store data during calculation '
-        'if needed.'
-        ),
-    type=Path,
-    default=TMPDIR,
-    )
+libcli.add_argument_deprecated_tmpdir(ap)
 
 
 def main(
@@ -93,8 +78,8 @@ def main(
         exp_file,
         output,
         ncores=1,
+        output_format='json',
         plot=False,
-        tmpdir=TMPDIR,
         **kwargs,
         ):
     """
@@ -117,18 +102,25 @@ def main(
         The number of cores to use.
         Defaults to 1.
     
+    output_format : str, optional
+        Format of the output file, `json`, `ndjson`,
+        `npz`, `parquet` or `hdf5`.
+        Defaults to `json`.
+    
     plot : Bool, optional
         Whether to plot the back-calculated results or not.
         Defaults to False.
-    
-    tmpdir : str or Path, optional
-        Path to the temporary directory if working with .TAR files.
-        Defaults to TMPDIR.
     """
     init_files(log, LOGFILESNAME)
+    if kwargs.get('tmpdir') is not None:
+        log.info(S(
+            'WARNING: --tmpdir is deprecated and ignored, tarballs '
+            'are streamed without extracting them.'
+            ))
+    
     log.info(T('reading input paths'))
-    pdbs2operate, _istarfile = get_pdb_paths(pdb_files, tmpdir)
-    if len(pdbs2operate) == 0 or pdbs2operate is None:
+    pdbs2operate, reference, ensemble = get_plan_inputs(pdb_files)
+    if reference is None:
         log.info(
             'No .pdb files were found based on the input. Make sure the '
             'folder/tarball contains .pdb files. Only .tar, .tar.xz, .tar.gz '
@@ -136,30 +128,15 @@ def main(
             )
         return
     log.info(S('done'))
-    pdbs2operate = os_sorted(pdbs2operate)
-    log.info(T(f'back calculating using {ncores} workers'))
-    execute = partial(
-        report_on_crash,
-        calc_noe,
-        exp_file,
-        )
-    execute_pool = pool_function(execute, pdbs2operate, method='imap', ncores=ncores)  # noqa: E501
-    
-    _output = {}
-    _output['format'], _ = get_exp_format_noe(exp_file, pdbs2operate[0])
-    
-    for result in execute_pool:
-        _output[result[0].stem] = result[1]
+    log.info(T('compiling experimental template'))
+    plan = NOEPlan(exp_file, reference)
     log.info(S('done'))
     
-    log.info(T('Writing output onto disk'))
-    with open(output, mode="w") as fout:
-        fout.write(json.dumps(_output, indent=4))
+    log.info(T(f'back calculating using {ncores} workers'))
+    with get_writer(output, output_format) as writer:
+        write_plan(plan, pdbs2operate, writer, ncores, ensemble)
     log.info(S('done'))
     
-    if _istarfile:
-        shutil.rmtree(tmpdir)
-    
     if plot:
         log.info(T('Plotting back-calculated data'))
         log.info(S('Please be patient if you have a large ensemble...'))
@@ -176,6 +153,7 @@ def main(
             noe_indices.append(row.Index)
         
         noe_vals = []
+        _output = read_output(output)
         _output.pop("format")
         for i in noe_indices:
             temp_vals = []
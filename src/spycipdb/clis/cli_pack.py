@@ -0,0 +1,177 @@
+"""
+Packs an ensemble of PDB structures into a memory-mapped coordinate file.
+
+All conformers must share the same topology (atoms, order and residues),
+as is the case for ensembles generated with IDPConformerGenerator.
+
+The packed ensemble can be given in place of PDB files to the ``pre``,
+``noe``, ``jc`` and ``smfret`` modules. Coordinates are read as
+zero-copy slices instead of parsing PDB text on every run.
+
+USAGE:
+    $ spycipdb pack <PDB-FILES>
+    $ spycipdb pack <PDB-FILES> [--output] [--ncores]
+
+OUTPUT:
+    A folder with the following files:
+
+    coords.npy      float32 coordinates (n_conformers, n_atoms, 3)
+    topology.pdb    atom records shared by all conformers
+    names.txt       file name of each conformer, one per line
+"""
+import argparse
+import shutil
+from functools import partial
+from pathlib import Path
+
+from natsort import os_sorted
+
+from spycipdb import log
+from spycipdb.core.exceptions import SPyCiPDBException
+from spycipdb.libs import libcli
+from spycipdb.libs.libensemble import create_ensemble, remove_ensemble
+from spycipdb.libs.libfuncs import get_pdb_paths
+from spycipdb.libs.libmulticore import pool_function
+from spycipdb.libs.libpdb import get_coords, get_topology, read_atom_lines
+from spycipdb.logger import S, T, init_files, report_on_crash
+
+
+LOGFILESNAME = '.spycipdb_pack'
+_name = 'pack'
+_help = 'Packs PDB files into a memory-mapped ensemble.'
+
+_prog, _des, _usage = libcli.parse_doc_params(__doc__)
+
+ap = libcli.CustomParser(
+    prog=_prog,
+    description=libcli.detailed.format(_des),
+    usage=_usage,
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+libcli.add_argument_pdb_files(ap)
+
+ap.add_argument(
+    '-o',
+    '--output',
+    help='Folder of the packed ensemble. Defaults to `packed_ensemble`.',
+    type=Path,
+    default='packed_ensemble',
+    )
+
+libcli.add_argument_ncores(ap)
+
+TMPDIR = '__tmppack__'
+ap.add_argument(
+    '--tmpdir',
+    help=(
+        'Temporary directory to store data during calculation '
+        'if needed.'
+        ),
+    type=Path,
+    default=TMPDIR,
+    )
+
+
+def read_conformer(pdb):
+    """Read the topology and coordinates of a conformer."""
+    lines = read_atom_lines(pdb)
+    return pdb, get_topology(lines), get_coords(lines)
+
+
+def pack_pdbs(pdbs2operate, output, ncores=1):
+    """
+    Pack sorted PDB files into the ensemble folder `output`.
+
+    If packing fails or is interrupted, only the files of the ensemble
+    are removed, other files in `output` are kept.
+    """
+    reference_lines = read_atom_lines(pdbs2operate[0])
+    reference = get_topology(reference_lines)
+
+    log.info(T(f'packing {len(pdbs2operate)} conformers using {ncores} workers'))  # noqa: E501
+    coords = create_ensemble(
+        output,
+        [Path(pdb).name for pdb in pdbs2operate],
+        reference_lines,
+        len(reference_lines),
+        )
+    execute_pool = pool_function(
+        partial(report_on_crash, read_conformer),
+        pdbs2operate,
+        method='imap',
+        ncores=ncores,
+        )
+
+    try:
+        for i, (pdb, topology, xyz) in enumerate(execute_pool):
+            if topology != reference:
+                raise SPyCiPDBException(
+                    errmsg=(
+                        f'{Path(pdb).name} does not share the topology of '
+                        f'{Path(pdbs2operate[0]).name}. All conformers of a '
+                        'packed ensemble must have the same atoms in the '
+                        'same order.'
+                        )
+                    )
+            coords[i] = xyz
+        coords.flush()
+    except BaseException:
+        del coords
+        remove_ensemble(output)
+        raise
+
+    log.info(S('done'))
+
+
+def main(
+        pdb_files,
+        output='packed_ensemble',
+        ncores=1,
+        tmpdir=TMPDIR,
+        **kwargs,
+        ):
+    """
+    Pack PDB structures into a memory-mapped ensemble.
+
+    Parameters
+    ----------
+    pdb_files : str or Path, required
+        Path to a .TAR or folder of PDB files.
+
+    output : str or Path, optional
+        Folder of the packed ensemble.
+        Defaults to `packed_ensemble`.
+
+    ncores : int, optional
+        The number of cores to use.
+        Defaults to 1.
+
+    tmpdir : str or Path, optional
+        Path to the temporary directory if working with .TAR files.
+        Defaults to TMPDIR.
+    """
+    init_files(log, LOGFILESNAME)
+
+    log.info(T('reading input paths'))
+    pdbs2operate, _istarfile = get_pdb_paths(pdb_files, tmpdir)
+    if len(pdbs2operate) == 0 or pdbs2operate is None:
+        log.info(
+            'No .pdb files were found based on the input. Make sure the '
+            'folder/tarball contains .pdb files. Only .tar, .tar.xz, .tar.gz '
+            'tarballs are accepted.'
+            )
+        return
+    log.info(S('done'))
+    
+    try:
+        pack_pdbs(os_sorted(pdbs2operate), output, ncores)
+    finally:
+        if _istarfile:
+            shutil.rmtree(tmpdir)
+
+    return
+
+
+if __name__ == '__main__':
+    libcli.maincli(ap, main)
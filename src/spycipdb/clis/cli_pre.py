@@ -45,13 +45,11 @@ OUTPUT:
     }
 """
 import argparse
-import json
 import shutil
 from functools import partial
 from pathlib import Path
 
 import pandas as pd
-from idpconfgen.libs.libmulticore import pool_function
 from natsort import os_sorted
 
 from spycipdb import log
@@ -68,10 +66,17 @@ except ImportError:
         "If you would like to use the DEERPREdict method, "
         "please refer to the installation instructions."
         )
-from spycipdb.core.calculators import calc_pre
 from spycipdb.core.parsers import get_exp_format_pre
+from spycipdb.core.plans import PREPlan, write_plan
 from spycipdb.libs import libcli
-from spycipdb.libs.libfuncs import get_pdb_paths, plot_data_and_ranges
+from spycipdb.libs.libensemble import is_ensemble
+from spycipdb.libs.libfuncs import (
+    get_pdb_paths,
+    get_plan_inputs,
+    plot_data_and_ranges,
+    )
+from spycipdb.libs.libmulticore import pool_function
+from spycipdb.libs.liboutput import get_writer, read_output
 from spycipdb.logger import S, T, init_files, report_on_crash
 
 
@@ -93,6 +98,7 @@ libcli.add_argument_parameters(ap)
 libcli.add_argument_method(ap)
 libcli.add_argument_exp_file(ap)
 libcli.add_argument_output(ap)
+libcli.add_argument_output_format(ap)
 libcli.add_argument_ncores(ap)
 libcli.add_argument_plot(ap)
 
@@ -115,6 +121,7 @@ def main(
         parameters,
         method="default",
         ncores=1,
+        output_format='json',
         plot=False,
         tmpdir=TMPDIR,
         **kwargs,
@@ -147,48 +154,51 @@ def main(
     ncores : int, optional
         The number of cores to use.
         Defaults to 1.
+    
+    output_format : str, optional
+        Format of the output file, `json`, `ndjson`,
+        `npz`, `parquet` or `hdf5`.
+        Defaults to `json`.
                 
     plot : Bool, optional
         Whether to plot the back-calculated results or not.
         Defaults to False.
     
     tmpdir : str or Path, optional
-        Path to the temporary directory if working with .TAR files.
+        Path to the temporary directory if working with .TAR files
+        and DEERPREdict.
         Defaults to TMPDIR.
     """
     init_files(log, LOGFILESNAME)
     
     log.info(T('reading input paths'))
-    pdbs2operate, _istarfile = get_pdb_paths(pdb_files, tmpdir)
-    if len(pdbs2operate) == 0 or pdbs2operate is None:
+    _istarfile = False
+    ensemble = None
+    if method.lower() == "deerpredict":
+        if is_ensemble(pdb_files):
+            log.info(S(
+                'DEERPREdict requires PDB files and is incompatible with '
+                'packed ensembles. Exiting...'
+                ))
+            return
+        # DEERPREdict reads the PDB files from disk
+        pdbs2operate, _istarfile = get_pdb_paths(pdb_files, tmpdir)
+        pdbs2operate = os_sorted(pdbs2operate)
+        reference = pdbs2operate[0] if pdbs2operate else None
+    else:
+        pdbs2operate, reference, ensemble = get_plan_inputs(pdb_files)
+    if reference is None:
         log.info(
             'No .pdb files were found based on the input. Make sure the '
             'folder/tarball contains .pdb files. Only .tar, .tar.xz, .tar.gz '
             'tarballs are accepted.'
             )
     log.info(S('done'))
-    pdbs2operate = os_sorted(pdbs2operate)
     
     log.info(T(f'back calculating using {ncores} workers'))
     
     if method.lower() == "default":
-        execute = partial(
-            report_on_crash,
-            calc_pre,
-            exp_file,
-            )
-        execute_pool = pool_function(
-            execute,
-            pdbs2operate,
-            method='imap',
-            ncores=ncores
-            )
-
-        _output = {}
-        _output['format'], _ = get_exp_format_pre(exp_file, pdbs2operate[0])
-        for result in execute_pool:
-            _output[result[0].stem] = result[1]
-        log.info(S('done'))
+        plan = PREPlan(exp_file, reference)
     elif method.lower() == "deerpredict":
         log.info(T('reading parameters'))
         try:
@@ -223,16 +233,15 @@ def main(
             method='imap',
             ncores=ncores
             )
-
-        _output = {}
-        _output['format'], _ = get_exp_format_pre(exp_file, pdbs2operate[0])
-        for result in execute_pool:
-            _output[result[0].stem] = result[1]
-        log.info(S('done'))
+        fmt, _ = get_exp_format_pre(exp_file, pdbs2operate[0])
     
-    log.info(T('Writing output onto disk'))
-    with open(output, mode="w") as fout:
-        fout.write(json.dumps(_output, indent=4))
+    with get_writer(output, output_format) as writer:
+        if method.lower() == "default":
+            write_plan(plan, pdbs2operate, writer, ncores, ensemble)
+        else:
+            writer.write('format', fmt)
+            for result in execute_pool:
+                writer.write(result[0].stem, result[1])
     log.info(S('done'))
 
     if _istarfile:
@@ -258,6 +267,7 @@ def main(
                 pre_indices.append(row.Index)
 
             pre_vals = []
+            _output = read_output(output)
             _output.pop("format")
             for i in pre_indices:
                 temp_vals = []
@@ -55,19 +55,21 @@ OUTPUT:
     }
 """
 import argparse
-import json
+import asyncio
 import shutil
 from functools import partial
+from itertools import chain
 from pathlib import Path
 
-from idpconfgen.libs.libmulticore import pool_function
 from natsort import os_sorted
 
 from spycipdb import log
-from spycipdb.components.helpers import pales_helper
+from spycipdb.components.helpers import run_pales
 from spycipdb.libs import libcli
 from spycipdb.libs.libfuncs import get_pdb_paths
-from spycipdb.logger import S, T, init_files, report_on_crash
+from spycipdb.libs.libmulticore import async_pool_function
+from spycipdb.libs.liboutput import get_resumable_writer
+from spycipdb.logger import S, T, async_report_on_crash, init_files
 
 
 LOGFILESNAME = '.spycipdb_rdc'
@@ -93,6 +95,8 @@ ap.add_argument(
 libcli.add_argument_pdb_files(ap)
 libcli.add_argument_exp_file(ap)
 libcli.add_argument_output(ap)
+libcli.add_argument_output_format(ap)
+libcli.add_argument_resume(ap)
 libcli.add_argument_ncores(ap)
 
 TMPDIR = '__tmprdc__'
@@ -113,6 +117,8 @@ def main(
         output,
         pales=True,
         ncores=1,
+        output_format='json',
+        resume=False,
         tmpdir=TMPDIR,
         **kwargs,
         ):
@@ -139,6 +145,16 @@ def main(
         The number of cores to use.
         Defaults to 1.
     
+    output_format : str, optional
+        Format of the output file, `json`, `ndjson`,
+        `npz`, `parquet` or `hdf5`.
+        Defaults to `json`.
+    
+    resume : Bool, optional
+        Whether to record completed conformers in a journal and
+        skip those recorded by a previous run.
+        Defaults to False.
+    
     tmpdir : str or Path, optional
         Path to the temporary directory if working with .TAR files.
         Defaults to TMPDIR.
@@ -159,26 +175,31 @@ def main(
     str_pdbpaths = os_sorted(str_pdbpaths)
     log.info(T(f'back calculaing using {ncores} workers'))
     if pales:
-        execute = partial(
-            report_on_crash,
-            pales_helper,
-            exp_file,
+        writer, pending = get_resumable_writer(
+            output,
+            output_format,
+            str_pdbpaths,
+            resume,
             )
-        execute_pool = pool_function(execute, str_pdbpaths, method='imap', ncores=ncores)  # noqa: E501
+        # the atom pairs are read once, from the first conformer
+        execute = partial(async_report_on_crash, run_pales, exp_file)
+        first = [asyncio.run(execute(pdb)) for pdb in pending[:1]]
+        layout = first[0][0] if first else None
+        execute_pool = chain(first, async_pool_function(
+            partial(execute, layout=layout),
+            pending[1:],
+            ncores=ncores,
+            ))
         
-        _output = {}
-        for result in execute_pool:
-            _output['format'] = result[0]
-            _output[result[1]] = result[2]
-            log.info(S('done'))
+        with writer:
+            for pdb, (_, name, rdc_bc) in zip(pending, execute_pool):
+                writer.start(Path(pdb).name)
+                if writer.empty:
+                    writer.write('format', layout.format)
+                writer.write(name, rdc_bc.tolist())
+        log.info(S('done'))
     
     # TODO: future PR, do LRDC module
-        
-    # process output
-    log.info(T('Writing output onto disk'))
-    with open(output, mode="w") as fout:
-        fout.write(json.dumps(_output, indent=4))
-    log.info(S('done'))
     
     if _istarfile:
         shutil.rmtree(tmpdir)
@@ -11,7 +11,8 @@ https://www.biorxiv.org/content/10.1101/2022.10.20.513022v1
 
 USAGE:
     $ spycipdb rh <PDB-FILES>
-    $ spycipdb rh <PDB-FILES> [--output] [--ncores] [--plot]
+    $ spycipdb rh <PDB-FILES> [--output] [--ncores] [--plot] [--mesh-dir]
+    $ spycipdb rh <PDB-FILES> [--dmax] [--properties]
 
 OUTPUT:
     Output is in standard .JSON format as follows:
@@ -20,9 +21,13 @@ OUTPUT:
         'pdb2': value,
         ...
     }
+    
+    With `--dmax`, each value is `{'rh': value, 'dmax': value}`.
+    With `--properties`, each value has all the HullRad properties:
+    `{'rh': value, 'rh_rot': value, 'dmax': value, 'rg_anhydrous': value,
+    ...}`. Use a matrix `--output-format` to get them as columns.
 """
 import argparse
-import json
 import shutil
 from functools import partial
 from pathlib import Path
@@ -34,8 +39,10 @@ from natsort import os_sorted
 
 from spycipdb import log
 from spycipdb.components.helpers import hullrad_helper
+from spycipdb.components.hullrad_arrays import HULLRAD_PROPERTIES
 from spycipdb.libs import libcli
 from spycipdb.libs.libfuncs import get_pdb_paths
+from spycipdb.libs.liboutput import get_resumable_writer, read_output
 from spycipdb.logger import S, T, init_files, report_on_crash
 
 
@@ -54,9 +61,40 @@ ap = libcli.CustomParser(
 
 libcli.add_argument_pdb_files(ap)
 libcli.add_argument_output(ap)
+libcli.add_argument_output_format(ap)
+libcli.add_argument_resume(ap)
 libcli.add_argument_ncores(ap)
 libcli.add_argument_plot(ap)
 
+ap.add_argument(
+    '--dmax',
+    help=(
+        'Also output Dmax, the maximum dimension from the convex hull, '
+        'for each conformer.'
+        ),
+    action='store_true',
+    )
+
+ap.add_argument(
+    '--properties',
+    help=(
+        'Output all the HullRad properties of each conformer, from '
+        'the same hull calculation: ' + ', '.join(HULLRAD_PROPERTIES) + '.'
+        ),
+    action='store_true',
+    )
+
+ap.add_argument(
+    '--mesh-dir',
+    help=(
+        'Folder where to write the solvent accessible surface points '
+        'of each conformer as `<name>_mesh.pdb`. Defaults to None, '
+        'no files are written.'
+        ),
+    type=Path,
+    default=None,
+    )
+
 TMPDIR = '__tmprh__'
 ap.add_argument(
     '--tmpdir',
@@ -73,7 +111,12 @@ def main(
         pdb_files,
         output,
         ncores=1,
+        output_format='json',
+        resume=False,
         plot=False,
+        dmax=False,
+        properties=False,
+        mesh_dir=None,
         tmpdir=TMPDIR,
         **kwargs,
         ):
@@ -92,11 +135,33 @@ def main(
     ncores : int, optional
         The number of cores to use.
         Defaults to 1.
+    
+    output_format : str, optional
+        Format of the output file, `json`, `ndjson`,
+        `npz`, `parquet` or `hdf5`.
+        Defaults to `json`.
+    
+    resume : Bool, optional
+        Whether to record completed conformers in a journal and
+        skip those recorded by a previous run.
+        Defaults to False.
             
     plot : Bool, optional
         Whether to plot the back-calculated results or not.
         Defaults to False.
     
+    dmax : Bool, optional
+        Whether to also output the maximum dimension of each conformer.
+        Defaults to False.
+    
+    properties : Bool, optional
+        Whether to output all the HullRad properties of each conformer.
+        Defaults to False.
+    
+    mesh_dir : str or Path, optional
+        Folder where to write the SAS points of each conformer.
+        Defaults to None, no files are written.
+    
     tmpdir : str or Path, optional
         Path to the temporary directory if working with .TAR files.
         Defaults to TMPDIR.
@@ -116,23 +181,29 @@ def main(
         return
     log.info(S('done'))
     
+    if mesh_dir is not None:
+        Path(mesh_dir).mkdir(parents=True, exist_ok=True)
+    
     log.info(T(f'back calculaing using {ncores} workers'))
+    writer, pending = get_resumable_writer(
+        output,
+        output_format,
+        str_pdbpaths,
+        resume,
+        )
     execute = partial(
         report_on_crash,
         hullrad_helper,
+        mesh_dir=mesh_dir,
+        dmax=dmax,
+        properties=properties,
         )
-    execute_pool = pool_function(execute, str_pdbpaths, method='imap', ncores=ncores)  # noqa: E501
-    
-    _output = {}
-    rh = []
-    for result in execute_pool:
-        _output[result[0]] = result[1]
-        rh.append(result[1])
-    log.info(S('done'))
+    execute_pool = pool_function(execute, pending, method='imap', ncores=ncores)  # noqa: E501
     
-    log.info(T('Writing output onto disk'))
-    with open(output, mode="w") as fout:
-        fout.write(json.dumps(_output, indent=4))
+    with writer:
+        for pdb, result in zip(pending, execute_pool):
+            writer.start(Path(pdb).name)
+            writer.write(result[0], result[1])
     log.info(S('done'))
 
     if _istarfile:
@@ -141,6 +212,10 @@ def main(
     if plot:
         log.info(T('Plotting back-calculated data'))
         
+        rh = [
+            value['rh'] if isinstance(value, dict) else value
+            for value in read_output(output).values()
+            ]
         dataframe = pd.DataFrame(rh)
         fig, ax = plt.subplots()
         fig.set_size_inches(2, 4)
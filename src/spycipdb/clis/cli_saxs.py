@@ -31,20 +31,22 @@ OUTPUT:
     }
 """
 import argparse
-import json
+import asyncio
 import shutil
 import subprocess
 from functools import partial
+from itertools import chain
 from pathlib import Path
 
-from idpconfgen.libs.libmulticore import pool_function
 from natsort import os_sorted
 
 from spycipdb import log
-from spycipdb.components.helpers import crysol_helper
+from spycipdb.components.helpers import run_crysol
 from spycipdb.libs import libcli
 from spycipdb.libs.libfuncs import get_pdb_paths
-from spycipdb.logger import S, T, init_files, report_on_crash
+from spycipdb.libs.libmulticore import async_pool_function
+from spycipdb.libs.liboutput import get_resumable_writer
+from spycipdb.logger import S, T, async_report_on_crash, init_files
 
 
 LOGFILESNAME = '.spycipdb_saxs'
@@ -74,6 +76,8 @@ ap.add_argument(
     )
 
 libcli.add_argument_output(ap)
+libcli.add_argument_output_format(ap)
+libcli.add_argument_resume(ap)
 libcli.add_argument_ncores(ap)
 
 TMPDIR = '__tmpsaxs__'
@@ -93,6 +97,8 @@ def main(
         output,
         lm=20,
         ncores=1,
+        output_format='json',
+        resume=False,
         tmpdir=TMPDIR,
         **kwargs,
         ):
@@ -116,6 +122,16 @@ def main(
         The number of cores to use.
         Defaults to 1.
     
+    output_format : str, optional
+        Format of the output file, `json`, `ndjson`,
+        `npz`, `parquet` or `hdf5`.
+        Defaults to `json`.
+    
+    resume : Bool, optional
+        Whether to record completed conformers in a journal and
+        skip those recorded by a previous run.
+        Defaults to False.
+    
     tmpdir : str or Path, optional
         Path to the temporary directory if working with .TAR files.
         Defaults to TMPDIR.
@@ -148,22 +164,28 @@ def main(
     log.info(S('done'))
     
     log.info(T(f'back calculaing using {ncores} workers'))
-    execute = partial(
-        report_on_crash,
-        crysol_helper,
-        lm=lm,
+    writer, pending = get_resumable_writer(
+        output,
+        output_format,
+        str_pdbpaths,
+        resume,
         )
-    execute_pool = pool_function(execute, str_pdbpaths, method='imap', ncores=ncores)  # noqa: E501
-    
-    _output = {}
-    for result in execute_pool:
-        _output['format'] = result[1]['index']
-        _output[result[0]] = result[1]['value']
-    log.info(S('done'))
+    # the scattering vector is read once, from the first conformer
+    execute = partial(async_report_on_crash, run_crysol, lm=lm)
+    first = [asyncio.run(execute(pdb)) for pdb in pending[:1]]
+    index = first[0][1]['index'] if first else None
+    execute_pool = chain(first, async_pool_function(
+        partial(execute, index=index),
+        pending[1:],
+        ncores=ncores,
+        ))
     
-    log.info(T('Writing output onto disk'))
-    with open(output, mode="w") as fout:
-        fout.write(json.dumps(_output, indent=4))
+    with writer:
+        for pdb, (name, saxs_bc) in zip(pending, execute_pool):
+            writer.start(Path(pdb).name)
+            if writer.empty:
+                writer.write('format', index.tolist())
+            writer.write(name, saxs_bc['value'].tolist())
     log.info(S('done'))
 
     if _istarfile:
@@ -10,6 +10,8 @@ Error = 0.0074 as reported in Lincoff et al. 2020.
 USAGE:
     $ spycipdb smfret <PDB-FILES> [--exp-file]
     $ spycipdb smfret <PDB-FILES> [--exp-file] [--output] [--ncores]
+    $ spycipdb smfret <PDB-FILES> [--exp-file] [--method]
+    $ spycipdb smfret <PDB-FILES> [--exp-file] [--average] [--weights]
 
 REQUIREMENTS:
     Experimental data must be comma-delimited with the following columns:
@@ -35,25 +37,38 @@ OUTPUT:
         ...
     }
     
+    With `--average`, ensemble averages of each dye pair are computed
+    as the conformers are back-calculated and saved to a separate .JSON
+    file, optionally weighting the conformers with `--weights`:
+    
+    {
+        'format': {...},
+        'n_conformers': int,
+        'total_weight': float,
+        'static': [<E>],
+        'dynamic': [E(<r^-6>)],
+        'mean_distance': [E(<r>)],
+    }
+
+DYE MODELS:
+    default CA-CA distances scaled for the dye size.
+    av      Accessible-volume dyes attached to the CA atoms, averaged
+            over pairs of donor and acceptor positions of a voxel grid
+            within the linker length and clear of protein heavy atoms.
+
 TODO: currently assumes 'CA' as atom labeled
-TODO: provide alternative strategies of back-calculating and
-    interpreting smFRET data.
 """
 import argparse
 import json
-import shutil
-from functools import partial
 from pathlib import Path
 
-from idpconfgen.libs.libmulticore import pool_function
-from natsort import os_sorted
-
 from spycipdb import log
-from spycipdb.core.calculators import calc_smfret
-from spycipdb.core.parsers import get_exp_format_smfret
+from spycipdb.core.averages import SmFRETAverage, read_weights
+from spycipdb.core.plans import SmFRETAVPlan, SmFRETPlan, write_plan
 from spycipdb.libs import libcli
-from spycipdb.libs.libfuncs import get_pdb_paths
-from spycipdb.logger import S, T, init_files, report_on_crash
+from spycipdb.libs.libfuncs import get_plan_inputs
+from spycipdb.libs.liboutput import get_writer
+from spycipdb.logger import S, T, init_files
 
 
 LOGFILESNAME = '.spycipdb_smfret'
@@ -72,26 +87,44 @@ ap = libcli.CustomParser(
 libcli.add_argument_pdb_files(ap)
 libcli.add_argument_exp_file(ap)
 libcli.add_argument_output(ap)
+libcli.add_argument_output_format(ap)
 libcli.add_argument_ncores(ap)
+libcli.add_argument_deprecated_tmpdir(ap)
+
+libcli.add_argument_method(ap)
 
-TMPDIR = '__tmpsmfret__'
 ap.add_argument(
-    '--tmpdir',
+    '--average',
     help=(
-        'Temporary directory to store data during calculation '
-        'if needed.'
+        'Path to a .JSON file where to save the static and dynamic '
+        'ensemble averages of the efficiencies.'
         ),
     type=Path,
-    default=TMPDIR,
+    default=None,
     )
 
+ap.add_argument(
+    '--weights',
+    help=(
+        'Path to a comma-delimited file of conformer weights for '
+        '`--average`, with `name,weight` columns.'
+        ),
+    type=Path,
+    default=None,
+    )
+
+PLANS = {'default': SmFRETPlan, 'av': SmFRETAVPlan}
+
 
 def main(
         pdb_files,
         exp_file,
         output,
         ncores=1,
-        tmpdir=TMPDIR,
+        output_format='json',
+        method='default',
+        average=None,
+        weights=None,
         **kwargs,
         ):
     """
@@ -116,15 +149,41 @@ def main(
         The number of cores to use.
         Defaults to 1.
     
-    tmpdir : str or Path, optional
-        Path to the temporary directory if working with .TAR files.
-        Defaults to TMPDIR.
+    output_format : str, optional
+        Format of the output file, `json`, `ndjson`,
+        `npz`, `parquet` or `hdf5`.
+        Defaults to `json`.
+    
+    method : str, optional
+        Model of the dyes, `default` for scaled CA-CA distances or
+        `av` for accessible volumes.
+        Defaults to `default`.
+    
+    average : str or Path, optional
+        Where to save the ensemble averages of the efficiencies.
+        Defaults to None, averages are not calculated.
+    
+    weights : str or Path, optional
+        Comma-delimited file with the `name,weight` of each conformer
+        for the averages. Defaults to None, conformers weight the same.
     """
     init_files(log, LOGFILESNAME)
+    if kwargs.get('tmpdir') is not None:
+        log.info(S(
+            'WARNING: --tmpdir is deprecated and ignored, tarballs '
+            'are streamed without extracting them.'
+            ))
+    
+    if method.lower() not in PLANS:
+        log.info(S(
+            f'WARNING: unknown method {method}, choose one of '
+            f'{", ".join(PLANS)}. Exiting...'
+            ))
+        return
     
     log.info(T('reading input paths'))
-    pdbs2operate, _istarfile = get_pdb_paths(pdb_files, tmpdir)
-    if len(pdbs2operate) == 0 or pdbs2operate is None:
+    pdbs2operate, reference, ensemble = get_plan_inputs(pdb_files)
+    if reference is None:
         log.info(
             'No .pdb files were found based on the input. Make sure the '
             'folder/tarball contains .pdb files. Only .tar, .tar.xz, .tar.gz '
@@ -132,29 +191,33 @@ def main(
             )
         return
     log.info(S('done'))
-    pdbs2operate = os_sorted(pdbs2operate)
+    log.info(T('compiling experimental template'))
+    plan = PLANS[method.lower()](exp_file, reference)
+    log.info(S('done'))
+    
     log.info(T(f'back calculating using {ncores} workers'))
-    execute = partial(
-        report_on_crash,
-        calc_smfret,
-        exp_file,
-        )
-    execute_pool = pool_function(execute, pdbs2operate, method='imap', ncores=ncores)  # noqa: E501
+    averages = None
+    if average is not None:
+        averages = SmFRETAverage(weights and read_weights(weights))
     
-    _output = {}
-    _output['format'], _ = get_exp_format_smfret(exp_file, pdbs2operate[0])
-    for results in execute_pool:
-        _output[results[0].stem] = results[1]
+    with get_writer(output, output_format) as writer:
+        write_plan(
+            plan,
+            pdbs2operate,
+            writer,
+            ncores,
+            ensemble,
+            callback=averages and averages.add,
+            )
     log.info(S('done'))
     
-    log.info(T('Writing output onto disk'))
-    with open(output, mode="w") as fout:
-        fout.write(json.dumps(_output, indent=4))
-    log.info(S('done'))
-        
-    if _istarfile:
-        shutil.rmtree(tmpdir)
-
+    if averages is not None:
+        log.info(T('saving ensemble averages'))
+        ensemble = {'format': plan.format, **averages.result()}
+        with open(average, 'w') as fout:
+            json.dump(ensemble, fout, indent=4)
+        log.info(S('done'))
+    
     return
 
 
@@ -6,6 +6,8 @@ import os
 import numpy as np
 import pandas as pd
 
+from spycipdb.libs.libfuncs import scratch_dir
+
 
 try:
     from DEERPREdict.PRE import PREpredict
@@ -30,7 +32,6 @@ def calc_pre_predict(pdb, fexp, parameters):
     """Back calculates PRE data intensity ratios based on DEERPREdict."""
     ratios = []
     pdb_name = os.path.splitext(os.path.basename(pdb))[0]
-    current_directory = os.getcwd()
     
     exp = pd.read_csv(fexp)
     res1 = exp.res1.values.astype(int)
@@ -53,45 +54,40 @@ def calc_pre_predict(pdb, fexp, parameters):
     
     u = Universe(pdb)
     
-    for i, res in enumerate(unique_res1):
-        pre = PREpredict(
-            u,
-            residue = res,
-            log_file = pdb_name + "_log",
-            temperature = temp,
-            atom_selection = atom
-            )
-        pre.run(
-            output_prefix = pdb_name,
-            tau_c = tau_c,
-            tau_t = tau_t,
-            delay = delay,
-            r_2 = r_2,
-            wh = wh
-            )
-        
-        results_dat = f"{current_directory}/{pdb_name}-{res}.dat"
-        
-        with open(results_dat, 'r') as results_f:
-            lines = results_f.readlines()
-            lines.pop(0)
-            for line in lines:
-                splitted = line.split()
+    # DEERPREdict writes the logs, .dat and .pkl files of each label
+    # next to `output_prefix`, removed along the scratch directory
+    with scratch_dir(prefix='deerpredict_') as tmpdir:
+        prefix = os.path.join(tmpdir, pdb_name)
+        for i, res in enumerate(unique_res1):
+            pre = PREpredict(
+                u,
+                residue = res,
+                log_file = prefix + "_log",
+                temperature = temp,
+                atom_selection = atom
+                )
+            pre.run(
+                output_prefix = prefix,
+                tau_c = tau_c,
+                tau_t = tau_t,
+                delay = delay,
+                r_2 = r_2,
+                wh = wh
+                )
+            
+            results_dat = f"{prefix}-{res}.dat"
+            
+            with open(results_dat, 'r') as results_f:
+                lines = results_f.readlines()
+                lines.pop(0)
+                for line in lines:
+                    splitted = line.split()
 
-                res_num = int(eval(splitted[0]))
-                try:
-                    ratio = float(eval(splitted[1]))
-                except NameError:
-                    ratio = float('nan')
-                if res_num in res2_splitted[i]:
-                    ratios.append(ratio)
-        
-        try:
-            os.remove(results_dat)
-            os.remove(f"{current_directory}/{pdb_name}-{res}.pkl")
-            os.remove(f"{current_directory}/{pdb_name}-Z-{res}.dat")
-            os.remove(f"{current_directory}/{pdb_name}_log")
-        except FileNotFoundError:
-            pass
+                    res_num = int(eval(splitted[0]))
+                    try:
+                        ratio = float(eval(splitted[1]))
+                    except NameError:
+                        ratio = float('nan')
+                    if res_num in res2_splitted[i]:
+                        ratios.append(ratio)
     return pdb, ratios
-    
\ No newline at end of file
@@ -1,9 +1,20 @@
 """Help SPyCi-PDB interact with third-party programs."""
+import asyncio
+import functools
 import os
-import subprocess
 import sys
+from collections import namedtuple
 
-from spycipdb.components.hullrad import Sved, mesh_from_pdb
+import numpy as np
+
+from spycipdb import log
+from spycipdb.components.hullrad_arrays import (
+    calc_hullrad,
+    calc_hullrad_properties,
+    )
+from spycipdb.libs.libfuncs import scratch_dir
+from spycipdb.libs.libmulticore import run_program
+from spycipdb.logger import S
 
 
 # Interesting way to import from repository that cannot be
@@ -27,6 +38,78 @@ except ModuleNotFoundError:
     pass
 
 
+# models kept in memory by UCBShift, a few per atom type
+UCBSHIFT_CACHE_SIZE = 64
+
+
+def load_once(load, maxsize=UCBSHIFT_CACHE_SIZE):
+    """
+    Wrap a model loader to load each file once per process.
+
+    Parameters
+    ----------
+    load : callable
+        Loads a model from a file name, as `joblib.load`.
+
+    maxsize : int, optional
+        Maximum number of models kept, the least recently used
+        are released first.
+        Defaults to `UCBSHIFT_CACHE_SIZE`.
+
+    Returns
+    -------
+    callable
+        The memoized loader. Calls with other arguments than a file
+        name are passed through.
+    """
+    @functools.lru_cache(maxsize=maxsize)
+    def load_path(path):
+        return load(path)
+    
+    @functools.wraps(load)
+    def load_model(filename, *args, **kwargs):
+        if args or kwargs or not isinstance(filename, (str, os.PathLike)):
+            return load(filename, *args, **kwargs)
+        return load_path(os.path.realpath(filename))
+    
+    load_model.loads_once = True
+    load_model.cache_clear = load_path.cache_clear
+    return load_model
+
+
+def keep_ucbshift_warm():
+    """
+    Load each UCBShift model once per process.
+
+    UCBShift loads its models from disk on every prediction. Only the
+    `load` reference of the `CSpred` module is replaced by a memoized
+    loader, which keeps the models in memory for all the conformers of
+    a worker, other users of `joblib.load` are not affected. Models
+    loaded before the pool forks are shared copy-on-write by all the
+    workers.
+
+    To be used as the `initializer` of a multiprocessing pool.
+
+    Returns
+    -------
+    bool
+        Whether the models are cached. False, with a warning, when
+        `CSpred` is not imported or has no `load` to replace.
+    """
+    cspred = sys.modules.get('CSpred')
+    load = getattr(cspred, 'load', None)
+    if load is None:
+        log.info(S(
+            'WARNING: could not find the model loader of UCBShift, '
+            'models will be loaded from disk for every conformer.'
+            ))
+        return False
+    
+    if not getattr(load, 'loads_once', False):
+        cspred.load = load_once(load)
+    return True
+
+
 # obtaining absolute path of pales executable from current file path
 current_file_path = os.path.realpath(__file__)
 curr_fp_split = current_file_path.split('/')
@@ -39,9 +122,87 @@ for item in curr_fp_split:
         PALES_FP += item + "/"
         
 
+# `skiprows` header lines precede the `nrows` rows of `format`
+PalesLayout = namedtuple('PalesLayout', ['format', 'skiprows', 'nrows'])
+
+
+def read_pales_layout(outpath):
+    """
+    Read the atom pairs back-calculated in a PALES output.
+
+    The pairs only depend on the experimental file and the topology,
+    read them once per run and use :func:`read_pales_values` for the
+    other conformers.
+
+    Parameters
+    ----------
+    outpath : str or Path
+        Path to the PALES output file.
+
+    Returns
+    -------
+    PalesLayout
+    """
+    format = {
+        "resnum1": [],
+        "resname1": [],
+        "atomname1": [],
+        "resnum2": [],
+        "resname2": [],
+        "atomname2": [],
+        }
+    skiprows = None
+    with open(outpath, 'r') as pales_out:
+        for i, line in enumerate(pales_out):
+            linesplit = line.split()
+            if len(linesplit) > 8 and linesplit[0].isdigit():
+                skiprows = i if skiprows is None else skiprows
+                format['resnum1'].append(int(linesplit[0]))
+                format['resname1'].append(linesplit[1])
+                format['atomname1'].append(linesplit[2])
+                format['resnum2'].append(int(linesplit[3]))
+                format['resname2'].append(linesplit[4])
+                format['atomname2'].append(linesplit[5])
+    
+    return PalesLayout(format, skiprows or 0, len(format['resnum1']))
+
+
+def read_pales_values(outpath, layout):
+    """
+    Read the back-calculated RDCs of a PALES output.
+
+    Parameters
+    ----------
+    outpath : str or Path
+        Path to the PALES output file.
+
+    layout : PalesLayout
+        As given by :func:`read_pales_layout` for the same
+        experimental file.
+
+    Returns
+    -------
+    np.ndarray
+        RDC values in the order of `layout.format`.
+    """
+    if layout.nrows == 0:
+        return np.empty(0)
+    
+    return np.loadtxt(
+        outpath,
+        skiprows=layout.skiprows,
+        max_rows=layout.nrows,
+        usecols=8,
+        ndmin=1,
+        )
+
+
 def pales_helper(exp, pdb_path):
     """
-    Handle external PALES shell command.
+    Handle external PALES command.
+
+    Runs :func:`run_pales` in its own event loop, see
+    `async_pool_function` to run several conformers at once.
 
     Parameters
     ----------
@@ -61,73 +222,170 @@ def pales_helper(exp, pdb_path):
     pdb_name_ext : str
         PDB file name with extension.
     
-    rdc_bc : list
-        List of RDC values. Formatting is given already.
+    rdc_bc : np.ndarray
+        RDC values. Formatting is given already.
     """
-    rdc_bc = []
-    format = {
-        "resnum1": [],
-        "resname1": [],
-        "atomname1": [],
-        "resnum2": [],
-        "resname2": [],
-        "atomname2": [],
-        }
-    pdb_name_ext = pdb_path.rsplit('/', 1)[-1]
-    outpath = pdb_name_ext + ".txt"
+    layout, pdb_name_ext, rdc_bc = asyncio.run(run_pales(exp, pdb_path))
+    return layout.format, pdb_name_ext, rdc_bc
+
+
+async def run_pales(exp, pdb_path, layout=None):
+    """
+    Run PALES on a PDB file and parse its output.
+
+    Parameters
+    ----------
+    exp : str
+        Absolute path of experimental file formatted per PALES
+        standard.
     
-    subprocess.run(
-        f"{PALES_FP} -inD {exp} -pdb {pdb_path} -outD {outpath}",
-        shell=True,
-        capture_output=True,
-        )
+    pdb_path : str
+        Absolute path of PDB file.
+
+    layout : PalesLayout, optional
+        Of a previous conformer with the same experimental file.
+        Defaults to None, read from the output of this conformer.
+
+    Returns
+    -------
+    layout : PalesLayout
+        The given `layout`, or the one read.
     
-    with open(outpath, 'r') as pales_out:
-        for line in pales_out:
-            linesplit = line.split()
-            try:
-                if linesplit[0].isdigit():
-                    format['resnum1'].append(int(linesplit[0]))
-                    format['resname1'].append(linesplit[1])
-                    format['atomname1'].append(linesplit[2])
-                    format['resnum2'].append(int(linesplit[3]))
-                    format['resname2'].append(linesplit[4])
-                    format['atomname2'].append(linesplit[5])
-                    rdc_bc.append(float(linesplit[8]))
-            except IndexError:
-                continue
+    pdb_name_ext : str
+        PDB file name with extension.
     
-    os.remove(outpath)
+    rdc_bc : np.ndarray
+        RDC values in the order of `layout.format`.
+    """
+    pdb_name_ext = pdb_path.rsplit('/', 1)[-1]
+    
+    with scratch_dir(prefix='pales_') as tmpdir:
+        outpath = os.path.join(tmpdir, pdb_name_ext + ".txt")
+        await run_program(
+            [
+                PALES_FP,
+                '-inD', os.path.abspath(exp),
+                '-pdb', os.path.abspath(pdb_path),
+                '-outD', outpath,
+                ],
+            cwd=tmpdir,
+            )
+        
+        layout = layout or read_pales_layout(outpath)
+        rdc_bc = read_pales_values(outpath, layout)
     
-    return format, pdb_name_ext, rdc_bc
+    return layout, pdb_name_ext, rdc_bc
+
+
+def hullrad_helper(pdb_path, mesh_dir=None, dmax=False, properties=False):
+    """
+    Return translational hydrodynamic radius given PDB.
+
+    Parameters
+    ----------
+    pdb_path : str
+        Absolute path of PDB file.
+
+    mesh_dir : str or Path, optional
+        Folder where to write the SAS points of the conformer as
+        `<name>_mesh.pdb`. Defaults to None, nothing is written.
 
+    dmax : bool, optional
+        Whether to also return the maximum dimension, Dmax.
+        Defaults to False.
+
+    properties : bool, optional
+        Whether to return all the HullRad properties, see
+        `HULLRAD_PROPERTIES`. Defaults to False.
+
+    Returns
+    -------
+    pdb_name_ext : str
+        PDB file name with extension.
 
-def hullrad_helper(pdb_path):
-    """Return translational hydrodynamic radius given PDB."""
+    Rht : float or dict
+        Translational hydrodynamic radius, or the requested
+        properties by name, `{'rh': Rht, 'dmax': Dmax, ...}`.
+    """
     pdb_name_ext = pdb_path.rsplit('/', 1)[-1]
+    mesh_file = None
+    if mesh_dir is not None:
+        pdb_name = pdb_name_ext.rsplit('.', 1)[0]
+        mesh_file = os.path.join(mesh_dir, pdb_name + "_mesh.pdb")
     
-    all_atm_rec, num_MG, num_MN, num_K, num_Na, model_array, mesh_coords, \
-        tot_asa, prb_rad, elec_atm_rec = mesh_from_pdb(pdb_path)
-    
-    s, Dt, Dr, vbar_prot, Rht, ffo_hyd_P, M, Ro, Rhr, int_vis, a_b_ratio, Ft, \
-        AnhRg, HydRg, Dmax, tauC, asphr, int_vis, tot_hydration, \
-        vbar_hyd_prot, ks, TanfordBex, kd, AA, NA, GL, DT, useNumpy \
-        = Sved(
-            all_atm_rec,
-            num_MG, num_MN,
-            num_K, num_Na,
-            model_array,
-            mesh_coords,
-            tot_asa,
-            prb_rad, elec_atm_rec
+    if properties:
+        return pdb_name_ext, calc_hullrad_properties(pdb_path, mesh_file)
+    
+    if dmax:
+        return pdb_name_ext, calc_hullrad_properties(
+            pdb_path,
+            mesh_file,
+            names=['rh', 'dmax'],
             )
+    
+    return pdb_name_ext, calc_hullrad_rh(pdb_path, mesh_file)
 
-    return pdb_name_ext, Rht
+
+def calc_hullrad_rh(pdb, mesh_file=None):
+    """
+    Calculate the translational hydrodynamic radius with HullRad.
+
+    Parameters
+    ----------
+    pdb : str, Path, bytes or list
+        Path to the PDB file, its content, or its lines.
+
+    mesh_file : str, Path or file, optional
+        Where to write the SAS points in PDB format, a file name
+        or an open file such as `io.StringIO`.
+        Defaults to None, nothing is written.
+
+    Returns
+    -------
+    float
+        Translational hydrodynamic radius.
+    """
+    return calc_hullrad(pdb, mesh_file)[4]
+
+
+def read_crysol_output(abs_path, index=None):
+    """
+    Read the scattering curve of a CRYSOL `.abs` file.
+
+    Parameters
+    ----------
+    abs_path : str or Path
+        Path to the `.abs` file.
+
+    index : np.ndarray, optional
+        Scattering vector of a previous conformer with the same
+        `lm`. Defaults to None, read from this file.
+
+    Returns
+    -------
+    dict
+        `index` and `value` arrays of the curve.
+    """
+    if index is not None:
+        value = np.loadtxt(abs_path, skiprows=1, usecols=1, ndmin=1)
+        return {'index': index, 'value': value}
+    
+    index, value = np.loadtxt(
+        abs_path,
+        skiprows=1,
+        usecols=(0, 1),
+        ndmin=2,
+        unpack=True,
+        )
+    return {'index': index, 'value': value}
 
 
 def crysol_helper(pdb_path, lm):
     """
-    Handle external crysol shell command.
+    Handle external crysol command.
+
+    Runs :func:`run_crysol` in its own event loop, see
+    `async_pool_function` to run several conformers at once.
 
     Parameters
     ----------
@@ -143,39 +401,36 @@ def crysol_helper(pdb_path, lm):
         PDB file name with extension.
     
     saxs_bc : dict
-        Dictionary of index and values for each back-calculation.
+        Dictionary of index and values arrays for each
+        back-calculation.
+    """
+    return asyncio.run(run_crysol(pdb_path, lm))
+
+
+async def run_crysol(pdb_path, lm, index=None):
+    """
+    Run CRYSOL on a PDB file and parse its output.
+
+    Parameters and returns as for :func:`crysol_helper`, `index`
+    is given to :func:`read_crysol_output`.
     """
-    saxs_bc = {}
-    index = []
-    value = []
-    
-    wrkdir = os.getcwd()
     pdb_name_ext = pdb_path.rsplit('/', 1)[-1]
     pdb_name = pdb_name_ext[0: pdb_name_ext.index('.')]
-    paths = wrkdir + "/" + pdb_name
     
-    p = subprocess.Popen(
-        f"crysol {pdb_path} --lm={lm} --shell=water",
-        stdout=subprocess.PIPE,
-        shell=True,
-        )
-    p.communicate()  # waits for subprocess to stop running
-    
-    with open(paths + ".abs", mode='r') as crysol_out:
-        data = crysol_out.readlines()
-        data.pop(0)
-        for line in data:
-            splitted = line.split()
-            index.append(float(splitted[0]))
-            value.append(float(splitted[1]))
+    # CRYSOL writes its .abs, .alm, .log and .int files in the
+    # working directory, removed along the scratch directory
+    with scratch_dir(prefix='crysol_') as tmpdir:
+        await run_program(
+            [
+                'crysol',
+                os.path.abspath(pdb_path),
+                f'--lm={lm}',
+                '--shell=water',
+                ],
+            cwd=tmpdir,
+            )
         
-    saxs_bc['index'] = index
-    saxs_bc['value'] = value
-    
-    # removing crysol generated files
-    os.remove(paths + ".abs")
-    os.remove(paths + ".alm")
-    os.remove(paths + ".log")
-    os.remove(paths + ".int")
+        abs_path = os.path.join(tmpdir, pdb_name + ".abs")
+        saxs_bc = read_crysol_output(abs_path, index)
     
     return pdb_name_ext, saxs_bc
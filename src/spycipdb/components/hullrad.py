@@ -148,8 +148,6 @@ import string
 import subprocess
 import sys
 
-from Bio.PDB.kdtrees import KDTree
-
 
 class MMCIFWrapperSyntaxError(Exception):
 
@@ -489,7 +487,7 @@ except:
 
 if useNumpy:
     try:
-        from scipy.spatial import ConvexHull
+        from scipy.spatial import ConvexHull, cKDTree
         useScipy = True
     except:
         pass
@@ -680,74 +678,67 @@ class ShrakeRupley:
 
         return coords
 
-    def compute(self, n_atms, coords):
+    def compute(self, n_atms, coords, mesh_file=None):
         """Calculate surface accessibility surface 
-        """
 
-        # Pre-compute atom neighbors using KDTree
-        kdt = KDTree(coords, 10)
+        Sphere points of all atoms are tested at once against the
+        overlapping atoms found with a single neighbor search.
+
+        :param mesh_file: where to write the SAS points in PDB format,
+            a file name or an open file. Default is None, nothing is written.
+        """
 
         # Pre-compute radius * probe table
         radii = np.array([2.0 for a in coords], dtype=np.float64)
         radii += self.probe_radius
         twice_maxradii = np.max(radii) * 2
 
-        # Calculate ASAs
-        asa_array = np.zeros((n_atms, 1), dtype=np.int64)
-        ptset = set(range(self.n_points))
-        mesh_coords = []
-        X = []
-        Y = []
-        Z = []
-        for i in range(n_atms):
-
-            r_i = radii[i]
-
-            # Move sphere to atom
-            s_on_i = (np.array(self._sphere, copy=True) * r_i) + coords[i]
-            available_set = ptset.copy()
-
-            # KDtree for sphere points
-            kdt_sphere = KDTree(s_on_i, 10)
-
-           # Iterate over neighbors of atom i
-            for jj in kdt.search(coords[i], twice_maxradii):
-                j = jj.index
-                if i == j:
-                    continue
-
-                if jj.radius < (r_i + radii[j]):
-                    # Remove overlapping points on sphere from available set
-                    available_set -= {
-                        pt.index for pt in kdt_sphere.search(coords[j], radii[j])
-                    }
-
-            asa_array[i] = len(available_set)  # update counts
-
-            for item in available_set:
-                mesh_coords.append((s_on_i[item][0],s_on_i[item][1],s_on_i[item][2]))
-                X.append(s_on_i[item][0])
-                Y.append(s_on_i[item][1])
-                Z.append(s_on_i[item][2])
-        
-        mesh_coords = np.array(mesh_coords)
-#       print((mesh_coords))
-
-        ## Uncomment next block to write out SAS points in PDB format
-        ff = open('mesh.pdb', 'w')
-        pdbfmt = 'ATOM  %5d %-4s %-3s  %4d    %8.3f%8.3f%8.3f%6.2f%6.2f\n'
-        atmname = " O"
-        resname = "UNK" 
-        Bfac = 1.0
-        Occ = 1.0
-        for i in range(0,len(X)):
-            ff.write(pdbfmt % (i+1, atmname, resname, i+1, X[i], Y[i], Z[i], Bfac, Occ))
-        ff.close()
+        # Move sphere to every atom, x, y and z of shape (n_atms, n_points)
+        s_on = [
+            self._sphere[:, k] * radii[:n_atms, np.newaxis]
+            + coords[:n_atms, k, np.newaxis]
+            for k in range(3)
+            ]
+
+        # Pre-compute pairs of overlapping atoms in a single search,
+        # each pair occludes the spheres of both of its atoms
+        pairs = cKDTree(coords).query_pairs(twice_maxradii, output_type='ndarray')
+        i = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        j = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        dif = coords[i] - coords[j]
+        dist = np.sqrt(dif[:, 0] ** 2 + dif[:, 1] ** 2 + dif[:, 2] ** 2)
+        overlap = (dist < radii[i] + radii[j]) & (i < n_atms)
+        order = np.argsort(i[overlap], kind='stable')
+        i = i[overlap][order]
+        j = j[overlap][order]
+
+        # Remove sphere points of atom i inside of atom j, per pair
+        d2 = np.zeros((i.size, self.n_points))
+        for k in range(3):
+            dif = coords[j, k, np.newaxis] - s_on[k][i]
+            dif *= dif
+            d2 += dif
+        inside = d2 <= (radii[j] * radii[j])[:, np.newaxis]
+
+        # Reduce the pairs of each atom i
+        buried = np.zeros((n_atms, self.n_points), dtype=bool)
+        if i.size:
+            starts = np.flatnonzero(np.diff(i, prepend=-1))
+            buried[i[starts]] = np.logical_or.reduceat(inside, starts, axis=0)
+
+        available = ~buried
+        asa_array = np.sum(available, axis=1, keepdims=True, dtype=np.int64)
+        mesh_coords = np.stack([s_on_k[available] for s_on_k in s_on], axis=1)
+
+        # Write out SAS points in PDB format only if requested
+        if mesh_file is not None:
+            write_mesh(mesh_coords, mesh_file)
 
         # Convert accessible point count to surface area in A**2
         f = radii * radii * (4 * np.pi / self.n_points)
         asa_array = asa_array * f[:, np.newaxis]
-        tot_asa = sum(asa_array)
+        # sequential sum, as the builtin sum over the atoms
+        tot_asa = np.cumsum(asa_array, axis=0)[-1]
 
         return mesh_coords,tot_asa
 
@@ -776,7 +767,7 @@ def get_coords(model_array):
     else:
         return coords
 
-def mesh_from_pdb(file):
+def mesh_from_pdb(file, mesh_file=None):
     # Makes a reduced atom  model of the pdb file
     # This is the model used to make the convex hull
     # For proteins the CB is displaced along the CA-CB vector a distance 
@@ -785,8 +776,11 @@ def mesh_from_pdb(file):
     # For saccharides only the phosphate, oxygen and nitrogen atoms are used
     # For detergents only the oxygen and nitrogen atoms are used
  
-    # Read the PDB file
-    data = open(file, 'r').readlines()
+    # Read the PDB file, unless given its lines
+    if isinstance(file, list):
+        data = file
+    else:
+        data = open(file, 'r').readlines()
  
     # Initialize all relevant atom record array
     # Used for AnhRg
@@ -1086,12 +1080,12 @@ def mesh_from_pdb(file):
 
     prb_rad = 0.6 
     sr = ShrakeRupley(probe_radius=prb_rad,n_points=10)
-    mesh_coords,tot_asa = sr.compute(n_atms,dum_coords)
+    mesh_coords,tot_asa = sr.compute(n_atms,dum_coords,mesh_file)
 
     return all_atm_array,num_MG,num_MN,num_K,num_Na,model_array,mesh_coords, \
            tot_asa,prb_rad,elec_atm_rec
 
-def mesh_from_cif(file):
+def mesh_from_cif(file, mesh_file=None):
     # Initialize all relevant atom record array
     # Used for AnhRg
     all_atm_rec = []
@@ -1379,7 +1373,7 @@ def mesh_from_cif(file):
 
     prb_rad = 0.6
     sr = ShrakeRupley(probe_radius=prb_rad,n_points=10)
-    mesh_coords,tot_asa = sr.compute(n_atms,dum_coords)
+    mesh_coords,tot_asa = sr.compute(n_atms,dum_coords,mesh_file)
 
     return all_atm_rec,num_MG,num_MN,num_K,num_Na,model_array,mesh_coords,tot_asa,prb_rad,elec_atm_rec
 
@@ -1402,6 +1396,28 @@ def write_pdb(model_array, filename):
 
     ff.close()
 
+def write_mesh(mesh_coords, filename):
+    # Write out SAS points in PDB format for display
+    # Open files, e.g. io.StringIO for an in-memory export, are not closed
+    if isinstance(filename, (str, os.PathLike)):
+        ff = open(filename, 'w')
+    else:
+        ff = filename
+
+    write = ff.write
+
+    pdbfmt = 'ATOM  %5d %-4s %-3s  %4d    %8.3f%8.3f%8.3f%6.2f%6.2f\n'
+    atmname = " O"
+    resname = "UNK"
+    Bfac = 1.0
+    Occ = 1.0
+    for i in range(len(mesh_coords)):
+        X, Y, Z = mesh_coords[i]
+        write(pdbfmt % (i+1, atmname, resname, i+1, X, Y, Z, Bfac, Occ))
+
+    if ff is not filename:
+        ff.close()
+
 def Sved(all_atm_rec,num_MG,num_MN,num_K,num_Na,model_array,mesh_coords,tot_asa,prb_rad,elec_atm_rec):
     #
     # Main function: Does most things and calls HullVolume
@@ -1544,6 +1560,15 @@ def Sved(all_atm_rec,num_MG,num_MN,num_K,num_Na,model_array,mesh_coords,tot_asa,
                         last_rnum = rnum
                         DT = DT +1
 
+    return Sved_coeffs(prot_mol_mass,numerator,AA,NA,GL,DT,num_MG,num_MN,num_K,num_Na, \
+                       mesh_coords,tot_asa,prb_rad,AnhRg,HydRg,asphr)
+
+def Sved_coeffs(prot_mol_mass,numerator,AA,NA,GL,DT,num_MG,num_MN,num_K,num_Na, \
+                mesh_coords,tot_asa,prb_rad,AnhRg,HydRg,asphr):
+    #
+    # Hydrodynamic coefficients from the masses, radii of gyration
+    #   and asphericity calculated by Sved, and the SAS mesh
+    #
     # Add weight of water for N-term and C-term of protein
     if AA > 0:
         prot_mol_mass += 18.0
@@ -1562,7 +1587,6 @@ def Sved(all_atm_rec,num_MG,num_MN,num_K,num_Na,model_array,mesh_coords,tot_asa,
     vbar_prot = (numerator / prot_mol_mass) - 0.0025
 
     # Get convex hull area and volume 
-    coords = get_coords(model_array)
     area_hull, vol_hull, Dmax = HullVolume(mesh_coords)
     # SAS rounded corners make Dmax larger than original HullRad
     Dmax = Dmax - 5.0
@@ -1732,6 +1756,20 @@ def Sved(all_atm_rec,num_MG,num_MN,num_K,num_Na,model_array,mesh_coords,tot_asa,
            Ft,AnhRg,HydRg,Dmax,tauC,asphr,int_vis,tot_hydration,vbar_hyd_prot,ks, \
            TanfordBex,kd,AA,NA,GL,DT,useNumpy
 
+def max_distance(points, chunk=256):
+    #
+    # Largest distance between any two points, as the all-pairs loop
+    #   it replaces: squares are summed in x, y, z order and sqrt is
+    #   monotonic, so the result is identical
+    # Rows are compared in chunks to bound memory for large hulls
+    #
+    Dmax = 0.0
+    for start in range(0, len(points), chunk):
+        d = points[start:start + chunk, np.newaxis] - points[np.newaxis]
+        d2 = d[..., 0]**2 + d[..., 1]**2 + d[..., 2]**2
+        Dmax = max(Dmax, math.sqrt(d2.max()))
+    return Dmax
+
 def HullVolume(coords):
     #
     # Uses qconvex to calculate convex hull
@@ -1754,14 +1792,7 @@ def HullVolume(coords):
         # Note that the "vertices" from ConvexHull are indices, i.e. pointers to
         # the coordinates in "coords" that serve as the vertices.
         vertices = convex_hull.vertices
-        Dmax = 0.0
-        for r1 in vertices:
-            for r2 in vertices:
-                dist = math.sqrt((coords[r1][0] - coords[r2][0])**2.0 + \
-                                 (coords[r1][1] - coords[r2][1])**2.0 + \
-                                 (coords[r1][2] - coords[r2][2])**2.0 )
-                if dist > Dmax:
-                    Dmax = dist
+        Dmax = max_distance(np.asarray(coords, dtype=np.float64)[vertices])
 
         return area_hull, vol_hull, Dmax
     else:
@@ -1809,14 +1840,17 @@ def HullVolume(coords):
         input.write(instring)
         input.close()
         data = list(map(string.split, output.readlines()))
-        Dmax = 0.0
-        for i in range(2,len(data)):
-            for j in range(3,len(data)):
-                dist = math.sqrt((float(data[i][0])-float(data[j][0]))**2.0 + \
-                                 (float(data[i][1])-float(data[j][1]))**2.0 + \
-                                 (float(data[i][2])-float(data[j][2]))**2.0 )
-                if dist > Dmax:
-                    Dmax = dist
+        if useNumpy:
+            Dmax = max_distance(np.array(data[2:], dtype=np.float64)[:, :3])
+        else:
+            Dmax = 0.0
+            for i in range(2,len(data)):
+                for j in range(3,len(data)):
+                    dist = math.sqrt((float(data[i][0])-float(data[j][0]))**2.0 + \
+                                     (float(data[i][1])-float(data[j][1]))**2.0 + \
+                                     (float(data[i][2])-float(data[j][2]))**2.0 )
+                    if dist > Dmax:
+                        Dmax = dist
     
         return area_hull, vol_hull, Dmax
 
@@ -0,0 +1,427 @@
+"""
+HullRadSAS pipeline on typed arrays.
+
+Each PDB is parsed once into arrays of coordinates, electron counts
+and residue names, and the quantities of
+:func:`spycipdb.components.hullrad.Sved` are calculated with vectorized
+reductions instead of re-parsing line strings in per-atom loops.
+
+The reduced model, its solvent accessible surface and hence Rh are
+identical to HullRadSAS. Radii of gyration and asphericity agree to
+floating point precision, as only the order of the sums changes.
+
+Only proteins take this path. Structures with nucleic acids,
+saccharides, detergents or ions fall back to the original HullRadSAS
+implementation.
+"""
+import math
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from spycipdb.components.hullrad import (
+    AA_data,
+    DT_data,
+    GL_data,
+    NA_data,
+    ShrakeRupley,
+    Sved,
+    Sved_coeffs,
+    mesh_from_pdb,
+    )
+from spycipdb.core.exceptions import SPyCiPDBException
+
+
+# HullRadSAS parameters of the solvent accessible surface
+PROBE_RADIUS = 0.6
+N_POINTS = 10
+# electrons of a water molecule in the hydration shell
+WAT_ELEC = 11.0
+
+WATERS = [b'TIP', b'HOH']
+OTHER_RESIDUES = [
+    name.encode()
+    for table in (NA_data, GL_data, DT_data)
+    for name in table
+    ]
+
+# fixed width of the records array
+RECORD_WIDTH = 80
+
+# per conformer properties, by their index in the results of `Sved`
+HULLRAD_PROPERTIES = {
+    'rh': 4,
+    'rh_rot': 8,
+    'dmax': 14,
+    'rg_anhydrous': 12,
+    'rg_hydrated': 13,
+    'asphericity': 16,
+    'axial_ratio': 10,
+    'f_fo': 5,
+    'ft': 11,
+    'dt': 1,
+    'dr': 2,
+    'tau_c': 15,
+    's': 0,
+    'int_vis': 9,
+    'ks': 20,
+    'kd': 22,
+    'bex': 21,
+    'mass': 6,
+    'ro': 7,
+    'vbar': 3,
+    'vbar_hydrated': 19,
+    'hydration': 18,
+    }
+
+HullRadAtoms = namedtuple(
+    'HullRadAtoms',
+    [
+        'coords',
+        'elec_coords',
+        'elec',
+        'model_coords',
+        'model_resnames',
+        'model_ca',
+        ],
+    )
+HullRadAtoms.__doc__ = """
+Typed arrays of a protein as used by HullRadSAS.
+
+coords : np.ndarray
+    Shape (n_atoms, 3), all non-water atoms.
+
+elec_coords : np.ndarray
+    Shape (n_elec, 3), atoms weighted by their electrons. Atoms
+    matching several HullRadSAS rules appear once per rule.
+
+elec : np.ndarray
+    Shape (n_elec,), the electrons of each entry of `elec_coords`.
+
+model_coords : np.ndarray
+    Shape (n_model, 3), the reduced model with unified side chains.
+
+model_resnames : np.ndarray
+    Shape (n_model,), residue names of the reduced model.
+
+model_ca : np.ndarray
+    Shape (n_model,), whether the atom of the reduced model is a CA.
+"""
+
+
+def atom_electrons(name):
+    """
+    Electrons HullRadSAS assigns to an atom.
+
+    Mirrors the rules of :func:`spycipdb.components.hullrad.mesh_from_pdb`,
+    an atom matching several rules has several entries.
+
+    Parameters
+    ----------
+    name : str
+        Columns 14 to 16 of the atom record.
+
+    Returns
+    -------
+    list
+        Of electrons, one per matching rule.
+    """
+    n1, n2 = name[:1], name[:2]
+    electrons = []
+    if n1 == 'N':
+        electrons.append(7.0)
+    if n2 in ('C ', 'C5', 'C4', 'C6') \
+            or name in ('CG ', 'CD ', 'CE ', 'C2 ', 'CZ ', 'CD2', 'CE2'):
+        electrons.append(6.0)
+    if n2 in ('CA', 'CB', 'C1', 'C3', 'C8') \
+            or name in ('CD1', 'CE1', 'CE3', 'CH2', 'CZ2', 'CZ3', 'C2 ',
+                        "C4'", "C2'"):
+        electrons.append(7.0)
+    if n1 == 'O' or name in ('C5*', 'CG1'):
+        electrons.append(8.0)
+    if name == 'CG2':
+        electrons.append(9.0)
+    if n2 == 'P ':
+        electrons.append(15.0)
+    if n2 == 'SD':
+        electrons.append(16.0)
+    if n2 == 'SG':
+        electrons.append(17.0)
+    return electrons
+
+
+def read_records(pdb):
+    """
+    Read the ATOM and HETATM records of a PDB as a fixed width array.
+
+    Parameters
+    ----------
+    pdb : str, Path, bytes or list
+        Path to the PDB file, its content, or its lines.
+
+    Returns
+    -------
+    np.ndarray
+        Shape (n_records, 80), of single characters.
+    """
+    if isinstance(pdb, (list, tuple)):
+        lines = [
+            line.encode() if isinstance(line, str) else line
+            for line in pdb
+            ]
+    else:
+        data = pdb if isinstance(pdb, bytes) else Path(pdb).read_bytes()
+        lines = data.splitlines()
+
+    lines = [
+        line.rstrip(b'\r\n')
+        for line in lines
+        if line.startswith((b'ATOM', b'HETATM'))
+        ]
+    records = np.array(lines, dtype=f'S{RECORD_WIDTH}')
+    return records.view('S1').reshape(len(lines), RECORD_WIDTH)
+
+
+def get_column(records, start, stop):
+    """Get the columns `start` to `stop` of the records as bytes."""
+    return records[:, start:stop].copy().view(f'S{stop - start}').ravel()
+
+
+def get_xyz(records, z_stop=54):
+    """Get the coordinates of the records as float64."""
+    return np.stack(
+        [
+            get_column(records, 30, 38).astype(np.float64),
+            get_column(records, 38, 46).astype(np.float64),
+            get_column(records, 46, z_stop).astype(np.float64),
+            ],
+        axis=1,
+        )
+
+
+def read_hullrad_atoms(pdb):
+    """
+    Parse a protein once into the arrays used by HullRadSAS.
+
+    Parameters
+    ----------
+    pdb : str, Path, bytes or list
+        Path to the PDB file, its content, or its lines.
+
+    Returns
+    -------
+    HullRadAtoms or None
+        None if the structure has other molecules than proteins and
+        water, which HullRadSAS handles through other paths.
+    """
+    records = read_records(pdb)
+
+    is_atom = get_column(records, 0, 4) == b'ATOM'
+    resnames_raw = get_column(records, 17, 20)
+    resnames = np.char.replace(np.char.strip(resnames_raw), b"'", b'')
+    not_water = ~np.isin(resnames, WATERS)
+
+    if np.any(~is_atom & not_water) \
+            or np.any(is_atom & np.isin(resnames, OTHER_RESIDUES)):
+        return None
+
+    keep = is_atom & not_water
+    records = records[keep]
+    resnames_raw = resnames_raw[keep]
+    resnames = resnames[keep]
+    names = get_column(records, 13, 16)
+    coords = get_xyz(records)
+
+    # HullRadSAS reads z with 7 columns for the electron weighted atoms
+    unique_names, inverse = np.unique(names, return_inverse=True)
+    rules = [atom_electrons(name.decode()) for name in unique_names]
+    counts = np.array([len(rule) for rule in rules], dtype=np.int64)[inverse]
+    table = np.zeros((len(rules), max(map(len, rules), default=0)))
+    for i, rule in enumerate(rules):
+        table[i, :len(rule)] = rule
+    elec_atoms = np.repeat(np.arange(len(names)), counts)
+    elec_rule = np.arange(elec_atoms.size) \
+        - np.repeat(np.cumsum(counts) - counts, counts)
+    elec = table[inverse[elec_atoms], elec_rule]
+    elec_coords = get_xyz(records, z_stop=53)[elec_atoms]
+
+    # Reduced model, backbone atoms with the CB after every fourth
+    names2 = get_column(records, 13, 15)
+    backbone = np.isin(names2, [b'N ', b'CA', b'C ', b'O ']) \
+        | (names == b'OT1')
+    cb = names2 == b'CB'
+    prot = np.isin(resnames, list(map(str.encode, AA_data))) \
+        & (backbone | cb) \
+        & (get_column(records, 16, 17) != b'B')
+
+    n_n = np.sum(prot & (names2 == b'N '))
+    n_ca = np.sum(prot & (names2 == b'CA'))
+    n_o = np.sum(prot & ((names2 == b'O ') | (names == b'OT1')))
+    if 2 * n_n - n_ca - n_o != 0:
+        raise SPyCiPDBException(
+            errmsg=(
+                'Backbone atom missing. Delete residue missing backbone '
+                'atom(s) and try again.'
+                )
+            )
+
+    bb_idx = np.flatnonzero(prot & backbone)
+    cb_idx = np.flatnonzero(prot & cb)
+    with_cb = (np.arange(1, bb_idx.size + 1) % 4 == 0) \
+        & (resnames_raw[bb_idx] != b'GLY')
+    if np.sum(with_cb) > cb_idx.size:
+        raise SPyCiPDBException(
+            errmsg=(
+                'Found non-gly residue with no CB atom. Change the name of '
+                'the offending residue to GLY and try again.'
+                )
+            )
+    cb_idx = cb_idx[:np.sum(with_cb)]
+    order = np.argsort(
+        np.concatenate([
+            2 * np.arange(bb_idx.size),
+            2 * np.flatnonzero(with_cb) + 1,
+            ]),
+        kind='stable',
+        )
+    model_idx = np.concatenate([bb_idx, cb_idx])[order]
+
+    model_coords = coords[model_idx]
+    model_resnames = resnames[model_idx].astype(str)
+    model_ca = names2[model_idx] == b'CA'
+
+    # Make unified side chain as CB, extended along the CA-CB vector
+    ca_rows = np.flatnonzero(model_ca & (model_resnames != 'GLY'))
+    if ca_rows.size:
+        ca = model_coords[ca_rows]
+        d = model_coords[ca_rows + 3] - ca
+        ca_cb_dist = np.sqrt(d[:, 0] ** 2 + d[:, 1] ** 2 + d[:, 2] ** 2)
+        sc_rad = np.array([AA_data[r][3] for r in model_resnames[ca_rows]])
+        model_coords[ca_rows + 3] = \
+            ca + (sc_rad[:, np.newaxis] * d) / ca_cb_dist[:, np.newaxis]
+
+    return HullRadAtoms(
+        coords,
+        elec_coords,
+        elec,
+        model_coords,
+        model_resnames,
+        model_ca,
+        )
+
+
+def calc_hullrad(pdb, mesh_file=None):
+    """
+    Calculate the HullRadSAS properties of a structure.
+
+    Parameters
+    ----------
+    pdb : str, Path, bytes or list
+        Path to the PDB file, its content, or its lines.
+
+    mesh_file : str, Path or file, optional
+        Where to write the SAS points in PDB format.
+        Defaults to None, nothing is written.
+
+    Returns
+    -------
+    tuple
+        As returned by :func:`spycipdb.components.hullrad.Sved`.
+    """
+    atoms = read_hullrad_atoms(pdb)
+    if atoms is None:
+        # HullRadSAS reads a path or a list of str lines
+        if isinstance(pdb, bytes):
+            pdb = pdb.decode().splitlines()
+        elif isinstance(pdb, (list, tuple)):
+            pdb = [
+                line.decode() if isinstance(line, bytes) else line
+                for line in pdb
+                ]
+        else:
+            pdb = str(pdb)
+        return Sved(*mesh_from_pdb(pdb, mesh_file))
+
+    sr = ShrakeRupley(probe_radius=PROBE_RADIUS, n_points=N_POINTS)
+    mesh_coords, tot_asa = sr.compute(
+        len(atoms.model_coords),
+        atoms.model_coords,
+        mesh_file,
+        )
+
+    # Anhydrous radius of gyration, weighted by electrons
+    elec = atoms.elec
+    elec_xyz = np.sum(atoms.elec_coords * elec[:, np.newaxis], axis=0)
+    tot_anh_elec = np.sum(elec)
+    com = elec_xyz / tot_anh_elec
+    elec_d2 = np.sum((atoms.elec_coords - com) ** 2, axis=1)
+    AnhRg = math.sqrt(np.sum(elec_d2 * elec) / tot_anh_elec)
+
+    # Hydrated radius of gyration, with the SAS points as waters
+    tot_elec = tot_anh_elec + len(mesh_coords) * WAT_ELEC
+    com = (elec_xyz + np.sum(mesh_coords, axis=0) * WAT_ELEC) / tot_elec
+    elec_d2 = np.sum((atoms.elec_coords - com) ** 2, axis=1)
+    mesh_d2 = np.sum((mesh_coords - com) ** 2, axis=1)
+    HydRg2 = np.sum(elec_d2 * elec) + np.sum(mesh_d2) * WAT_ELEC
+    HydRg = math.sqrt(HydRg2 / tot_elec)
+
+    # Asphericity from the gyration tensor around the hydrated center,
+    # normalized by n_atoms - 1 as in HullRadSAS
+    centered = atoms.coords - com
+    gyration_tensor = (centered.T @ centered) / (len(centered) - 1)
+    L1, L2, L3 = np.linalg.eig(gyration_tensor)[0]
+    asphr = ((L1 - L2)**2 + (L2 - L3)**2 + (L1 - L3)**2) \
+        / (2.0 * ((L1 + L2 + L3)**2))
+
+    # Masses and specific volumes by residue, from the CA atoms
+    ca_resnames = atoms.model_resnames[atoms.model_ca]
+    aa_mass, aa_vbar = np.array(
+        [AA_data[r][0:3:2] for r in ca_resnames],
+        dtype=np.float64,
+        ).reshape(-1, 2).T
+
+    return Sved_coeffs(
+        float(np.sum(aa_mass)),
+        float(np.sum(aa_mass * aa_vbar)),
+        len(ca_resnames),
+        0, 0, 0,
+        0, 0, 0, 0,
+        mesh_coords,
+        tot_asa,
+        PROBE_RADIUS,
+        AnhRg,
+        HydRg,
+        asphr,
+        )
+
+
+def calc_hullrad_properties(pdb, mesh_file=None, names=None):
+    """
+    Calculate HullRadSAS properties of a structure by name.
+
+    All properties come from the same hull and SAS calculation.
+
+    Parameters
+    ----------
+    pdb : str, Path, bytes or list
+        Path to the PDB file, its content, or its lines.
+
+    mesh_file : str, Path or file, optional
+        Where to write the SAS points in PDB format.
+        Defaults to None, nothing is written.
+
+    names : list, optional
+        Names of the properties, keys of `HULLRAD_PROPERTIES`.
+        Defaults to None, all properties.
+
+    Returns
+    -------
+    dict
+        The properties as floats, in the order of `names`.
+    """
+    results = calc_hullrad(pdb, mesh_file)
+    return {
+        name: float(results[HULLRAD_PROPERTIES[name]])
+        for name in (names or HULLRAD_PROPERTIES)
+        }
@@ -0,0 +1,137 @@
+"""
+Streaming ensemble averages of back-calculated smFRET efficiencies.
+
+Conformers are added one at a time as their results arrive, so the
+ensemble values are obtained without keeping the per-conformer matrix
+in memory or reading it back from the output file.
+
+Three averaging regimes are provided for each dye pair:
+
+``static``
+    ``<E>``, efficiencies averaged over the conformers, for
+    conformational dynamics slower than the fluorescence lifetime.
+
+``dynamic``
+    ``E(<r^-6>)``, the efficiency of the ``<r^-6>`` averaged distance,
+    for dynamics faster than the fluorescence lifetime.
+
+``mean_distance``
+    ``E(<r>)``, the efficiency of the mean distance.
+
+Distances relative to the Foster radius are recovered from each
+efficiency, they are the scaled CA-CA distances of the default method
+and the FRET averaged dye distances of accessible-volume dyes.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from spycipdb.core.exceptions import SPyCiPDBException
+
+
+def read_weights(fweights):
+    """
+    Read the weights of the conformers of an ensemble.
+
+    Parameters
+    ----------
+    fweights : str or Path
+        Comma-delimited file with `name,weight` columns, names are the
+        PDB file names with or without extension.
+
+    Returns
+    -------
+    dict
+        Of weights by PDB file name without extension.
+    """
+    weights = pd.read_csv(fweights)
+    if not {'name', 'weight'}.issubset(weights.columns):
+        raise SPyCiPDBException(
+            errmsg=f'{fweights} must have `name` and `weight` columns.'
+            )
+
+    names = [Path(str(name)).stem for name in weights.name.values]
+    return dict(zip(names, weights.weight.values.astype(float)))
+
+
+class SmFRETAverage:
+    """
+    Accumulate the ensemble averages of smFRET efficiencies.
+
+    Parameters
+    ----------
+    weights : dict, optional
+        Of conformer weights by PDB file name without extension, as
+        given by :func:`read_weights`. Defaults to None, all the
+        conformers weight the same.
+    """
+
+    def __init__(self, weights=None):
+        self.weights = weights
+        self.n_conformers = 0
+        self.total_weight = 0.0
+        # sums of E, (r / r0)^-6 and r / r0, arrays once a conformer is added
+        self.sum_e = 0.0
+        self.sum_r6 = 0.0
+        self.sum_r = 0.0
+
+    def add(self, name, efficiencies):
+        """
+        Add the efficiencies of a conformer.
+
+        Parameters
+        ----------
+        name : str or Path
+            The PDB file name of the conformer.
+
+        efficiencies : list or np.ndarray
+            Shape (n_pairs,) of transfer efficiencies.
+        """
+        weight = 1.0
+        if self.weights is not None:
+            stem = Path(name).stem
+            if stem not in self.weights:
+                raise SPyCiPDBException(
+                    errmsg=f'No weight given for conformer {stem}.'
+                    )
+            weight = self.weights[stem]
+
+        e = np.asarray(efficiencies, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            # (r / r0)^6 of E = 1 / (1 + (r / r0)^6)
+            x6 = (1.0 - e) / e
+            self.sum_r6 = self.sum_r6 + weight / x6
+
+        self.n_conformers += 1
+        self.total_weight += weight
+        self.sum_e = self.sum_e + weight * e
+        self.sum_r = self.sum_r + weight * x6 ** (1 / 6)
+
+    def result(self):
+        """
+        Calculate the ensemble averages.
+
+        Returns
+        -------
+        dict
+            With the number of conformers, their total weight and the
+            `static`, `dynamic` and `mean_distance` efficiencies of
+            each dye pair.
+        """
+        if self.total_weight <= 0:
+            raise SPyCiPDBException(
+                errmsg='The total weight of the ensemble must be positive.'
+                )
+
+        mean_r6 = self.sum_r6 / self.total_weight
+        mean_r = self.sum_r / self.total_weight
+        with np.errstate(divide='ignore'):
+            dynamic = 1.0 / (1.0 + 1.0 / mean_r6)
+        return {
+            'n_conformers': self.n_conformers,
+            'total_weight': self.total_weight,
+            'static': (self.sum_e / self.total_weight).tolist(),
+            'dynamic': dynamic.tolist(),
+            'mean_distance': (1.0 / (1.0 + mean_r ** 6)).tolist(),
+            }
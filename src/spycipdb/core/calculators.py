@@ -1,10 +1,132 @@
 """Houses main internal back-calculators for SPyCi-PDB."""
+from collections import namedtuple
+
 import numpy as np
 import pandas as pd
-from idpconfgen.libs.libhigherlevel import get_torsions
-from idpconfgen.libs.libstructure import Structure, col_name, col_resSeq
+from idpconfgen.libs.libstructure import (
+    Structure,
+    col_element,
+    col_name,
+    col_resSeq,
+    )
+from scipy.spatial import cKDTree
+
+from spycipdb.core.exceptions import SPyCiPDBException
+
+
+def karplus_j(x):
+    """
+    Convert back-calculated units to hertz using the Karplus equation.
+    
+    Constants defined from Lincoff et al. 2020
+    (https://doi.org/10.1038/s42004-020-0323-0)
+
+    Parameters
+    ----------
+    x : float or np.ndarray
+        Back calculated value.
 
-from spycipdb.libs.libfuncs import get_scalar
+    Returns
+    -------
+        Value converted to Hertz.
+    """
+    a = 6.51
+    b = -1.76
+    c = 1.6
+    
+    return (a * (x ** 2)) + b * x + c
+
+
+def calc_dihedrals(points):
+    """
+    Calculate dihedral angles.
+    
+    Follows the same operations as `calc_torsion_angles` from
+    idpconfgen, for any number of dihedrals at once.
+    
+    Parameters
+    ----------
+    points : np.ndarray
+        Shape (..., 4, 3), the four points of each dihedral.
+    
+    Returns
+    -------
+    np.ndarray
+        Shape (...), dihedral angles in radians.
+    """
+    q_vecs = points[..., 1:, :] - points[..., :-1, :]
+    cross = np.cross(q_vecs[..., :-1, :], q_vecs[..., 1:, :])
+    unitary = cross / np.linalg.norm(cross, axis=-1)[..., None]
+    u0 = unitary[..., 0, :]
+    u1 = unitary[..., 1, :]
+    u3 = q_vecs[..., 1, :] / np.linalg.norm(q_vecs[..., 1, :], axis=-1)[..., None]  # noqa: E501
+    u2 = np.cross(u3, u1)
+    
+    return -np.arctan2(np.sum(u0 * u2, axis=-1), np.sum(u0 * u1, axis=-1))
+
+
+def get_jc_indices(exp, data_array):
+    """
+    Resolve the atoms of the phi torsions of a JC template.
+    
+    Parameters
+    ----------
+    exp : pd.DataFrame
+        Experimental JC template.
+    
+    data_array : np.ndarray
+        The `Structure.data_array` of the topology to index.
+    
+    Returns
+    -------
+    np.ndarray
+        Shape (n_residues, 4), indices of the C(i-1), N, CA, C atoms
+        of every residue in the template.
+    """
+    names = data_array[:, col_name]
+    n_idx = np.flatnonzero(names == 'N')
+    ca_idx = np.flatnonzero(names == 'CA')
+    c_idx = np.flatnonzero(names == 'C')
+    
+    # the first residue doesn't have phi torsion, residues are positioned
+    # in the list of phi torsions of the backbone as done historically
+    res = np.arange(1, n_idx.size)[exp.resnum.values.astype(int) - 2]
+    
+    return np.stack(
+        [c_idx[res - 1], n_idx[res], ca_idx[res], c_idx[res]],
+        axis=1,
+        )
+
+
+def calc_jc_values(coords, phi_idx, karplus=False):
+    """
+    Calculate JC values from the phi torsions of conformers.
+    
+    Parameters
+    ----------
+    coords : np.ndarray
+        Shape (..., n_atoms, 3), a conformer or a batch of conformers.
+    
+    phi_idx : np.ndarray
+        As given by :func:`get_jc_indices`.
+    
+    karplus : bool, optional
+        Convert the values to hertz with :func:`karplus_j`.
+        Defaults to False.
+    
+    Returns
+    -------
+    np.ndarray
+        Shape (..., n_residues), JC values of each residue in the
+        template.
+    """
+    torsions = np.round(
+        calc_dihedrals(coords[..., phi_idx, :].astype(np.float64)),
+        decimals=3,
+        )
+    jc = np.cos(torsions - np.radians(60))
+    
+    return karplus_j(jc) if karplus else jc
 
 
 def calc_jc(fexp, pdb):
@@ -30,113 +152,370 @@ def calc_jc(fexp, pdb):
         Of the PDB calculated
     """
     exp = pd.read_csv(fexp)
-    # align torsion index as the first residue doesn't have phi torsion
-    resn = exp.resnum.values - 2
-    jc_bc = np.cos(get_torsions(pdb)[2::3][resn] - np.radians(60))
+    
+    s = Structure(pdb)
+    s.build()
+    
+    phi_idx = get_jc_indices(exp, s.data_array)
+    jc_bc = calc_jc_values(s.coords, phi_idx)
     
     return pdb, jc_bc.tolist()
 
 
+def get_atom_indices(resseqs, names, res, atom, multiple=False):
+    """
+    Find the atom indices matching a residue/atom-name template entry.
+    
+    `H` selects the first atom of the residue, otherwise atoms whose
+    name contains `atom` are selected in file order. Up to two atoms
+    are returned for multiple assignments.
+    
+    Parameters
+    ----------
+    resseqs : np.ndarray
+        Residue numbers of the structure as integers.
+    
+    names : np.ndarray
+        Atom names of the structure.
+    
+    res : int
+        Residue number from the experimental template.
+    
+    atom : str
+        Atom name from the experimental template.
+    
+    multiple : bool, optional
+        Whether the atom has multiple assignments.
+        Defaults to False.
+    
+    Returns
+    -------
+    list
+        Of atom indices, empty if the atom is not found.
+    """
+    res_idxs = np.flatnonzero(resseqs == res)
+    if atom == 'H':
+        return res_idxs[:1].tolist()
+    
+    matches = [j for j in res_idxs if atom in names[j]]
+    
+    return matches[:2] if multiple else matches[:1]
+
+
+def get_noe_indices(exp, data_array):
+    """
+    Resolve the atom-pairs of an NOE template into atom indices.
+    
+    Every combination of the (multi-)assigned atoms of a restraint
+    is unrolled into a flat list of atom-pairs so that distances can
+    be computed in a single gather.
+    
+    Parameters
+    ----------
+    exp : pd.DataFrame
+        Experimental NOE template.
+    
+    data_array : np.ndarray
+        The `Structure.data_array` of the topology to index.
+    
+    Returns
+    -------
+    idx1, idx2 : np.ndarray
+        Atom indices for the first and second atom of every pair.
+    
+    starts : np.ndarray
+        Index of the first pair of every restraint in `idx1/idx2`.
+    """
+    resseqs = data_array[:, col_resSeq].astype(int)
+    names = data_array[:, col_name]
+    
+    idx1 = []
+    idx2 = []
+    starts = []
+    rows = zip(
+        exp.res1.values.astype(int),
+        exp.atom1.values,
+        exp.atom1_multiple_assignments.values,
+        exp.res2.values.astype(int),
+        exp.atom2.values,
+        exp.atom2_multiple_assignments.values,
+        )
+    for r1, a1, m1, r2, a2, m2 in rows:
+        atom1_list = get_atom_indices(resseqs, names, r1, a1, m1)
+        atom2_list = get_atom_indices(resseqs, names, r2, a2, m2)
+        if not atom1_list or not atom2_list:
+            raise SPyCiPDBException(
+                errmsg=f'Atoms for NOE pair {r1} {a1} - {r2} {a2} not found.'
+                )
+        
+        starts.append(len(idx1))
+        for first_atom in atom1_list:
+            for second_atom in atom2_list:
+                idx1.append(first_atom)
+                idx2.append(second_atom)
+    
+    return np.array(idx1), np.array(idx2), np.array(starts)
+
+
+def calc_noe_distances(coords, idx1, idx2, starts):
+    """
+    Calculate r^-6 averaged NOE distances from atom indices.
+    
+    Parameters
+    ----------
+    coords : np.ndarray
+        Shape (..., n_atoms, 3). Leading dimensions are kept so that
+        batches of conformers can be computed at once.
+    
+    idx1, idx2, starts : np.ndarray
+        As given by :func:`get_noe_indices`.
+    
+    Returns
+    -------
+    np.ndarray
+        Shape (..., n_restraints) of averaged distances.
+    """
+    dv = (coords[..., idx1, :] - coords[..., idx2, :]).astype(np.float64)
+    # r^-6 straight from the squared distances
+    sums = np.add.reduceat(np.sum(dv * dv, axis=-1) ** -3., starts, axis=-1)
+    num_combos = np.diff(np.append(starts, len(idx1)))
+    
+    return (sums / num_combos) ** (-1 / 6)
+
+
 def calc_noe(fexp, pdb):
     """
     Back-calculate NOE data.
     
     Atom-pairs and multi-assigns derived from experimental template.
     """
-    dist = []
-    
     exp = pd.read_csv(fexp)
-    res1 = exp.res1.values.astype(int)
-    atom1_name = exp.atom1.values
-    res2 = exp.res2.values.astype(int)
-    atom2_name = exp.atom2.values
-    multi1 = exp.atom1_multiple_assignments.values
-    multi2 = exp.atom2_multiple_assignments.values
     
     s = Structure(pdb)
     s.build()
     
-    for i in range(exp.shape[0]):
-        r1 = int(res1[i])
-        r2 = int(res2[i])
-        atom1_list = []
-        atom2_list = []
-        for j, r in enumerate(s.data_array[:, col_resSeq].astype(int)):
-            if r == r1:
-                if atom1_name[i] == 'H':
-                    atom1_list.append(s.coords[j, :])
-                    break
-                if atom1_name[i] in s.data_array[j, col_name]:
-                    atom1_list.append(s.coords[j, :])
-                if len(atom1_list) == 2:
-                    break
-                if not multi1[i] and len(atom1_list) == 1:
-                    break
-        for j, r in enumerate(s.data_array[:, col_resSeq].astype(int)):
-            if r == r2:
-                if atom2_name[i] == 'H':
-                    atom2_list.append(s.coords[j, :])
-                    break
-                if atom2_name[i] in s.data_array[j, col_name]:
-                    atom2_list.append(s.coords[j, :])
-                if len(atom2_list) == 2:
-                    break
-                if not multi2[i] and len(atom2_list) == 1:
-                    break
-
-        combos = 0.0
-        num_combos = 0
+    idx1, idx2, starts = get_noe_indices(exp, s.data_array)
+    dist = calc_noe_distances(s.coords, idx1, idx2, starts)
+    
+    return pdb, dist.tolist()
+
+
+def get_pre_indices(exp, data_array):
+    """
+    Resolve the atom-pairs of a PRE template into atom indices.
+    
+    Parameters
+    ----------
+    exp : pd.DataFrame
+        Experimental PRE template.
+    
+    data_array : np.ndarray
+        The `Structure.data_array` of the topology to index.
+    
+    Returns
+    -------
+    idx1, idx2 : np.ndarray
+        Atom indices for the first and second atom of every pair.
+    """
+    resseqs = data_array[:, col_resSeq].astype(int)
+    names = data_array[:, col_name]
+    
+    idx1 = []
+    idx2 = []
+    rows = zip(
+        exp.res1.values.astype(int),
+        exp.atom1.values,
+        exp.res2.values.astype(int),
+        exp.atom2.values,
+        )
+    # spin-label atoms repeat over many rows, resolved once each
+    labels = {}
+    for r1, a1, r2, a2 in rows:
+        if (r1, a1) not in labels:
+            labels[r1, a1] = get_atom_indices(resseqs, names, r1, a1)
+        atom1 = labels[r1, a1]
+        atom2 = get_atom_indices(resseqs, names, r2, a2)
+        if not atom1 or not atom2:
+            raise SPyCiPDBException(
+                errmsg=f'Atoms for PRE pair {r1} {a1} - {r2} {a2} not found.'
+                )
+        idx1.extend(atom1)
+        idx2.extend(atom2)
+    
+    return np.array(idx1), np.array(idx2)
+
+
+# labels with fewer partners are computed together pair by pair
+MIN_LABEL_PARTNERS = 4
+
+
+def get_pre_labels(idx1, idx2, min_partners=MIN_LABEL_PARTNERS):
+    """
+    Group the atom-pairs of a PRE template by spin-label atom.
+    
+    The distances of a label to all of its partners are computed in
+    a single broadcast, without gathering the coordinates of the
+    label once per pair.
+    
+    Parameters
+    ----------
+    idx1, idx2 : np.ndarray
+        As given by :func:`get_pre_indices`, the label atoms being
+        `idx1`.
+    
+    min_partners : int, optional
+        Minimum number of partners for a label to be broadcasted,
+        pairs of the other labels form a single last group.
+        Defaults to `MIN_LABEL_PARTNERS`.
+    
+    Returns
+    -------
+    list
+        Of (positions, labels, partners) arrays, the positions of the
+        pairs in the template, their label atoms, of length one for
+        broadcasted labels, and their partner atoms.
+    """
+    idx1 = np.asarray(idx1)
+    idx2 = np.asarray(idx2)
+    groups = []
+    rest = np.zeros(len(idx1), dtype=bool)
+    for label in dict.fromkeys(idx1.tolist()):
+        positions = np.flatnonzero(idx1 == label)
+        if len(positions) < min_partners:
+            rest[positions] = True
+            continue
+        groups.append((positions, np.array([label]), idx2[positions]))
+    
+    if rest.any():
+        positions = np.flatnonzero(rest)
+        groups.append((positions, idx1[positions], idx2[positions]))
+    
+    return groups
 
-        for first_atom in atom1_list:
-            for second_atom in atom2_list:
-                dv = first_atom - second_atom
-                assert dv.shape == (3,)
-                combos += (get_scalar(dv[0], dv[1], dv[2])) ** (-6.)
-                num_combos += 1
 
-        dist.append((combos / float(num_combos)) ** (-1 / 6))
+def calc_pre_distances(coords, idx1, idx2, labels=None):
+    """
+    Calculate PRE distances from atom indices.
+    
+    Parameters
+    ----------
+    coords : np.ndarray
+        Shape (..., n_atoms, 3). Leading dimensions are kept so that
+        batches of conformers can be computed at once.
+    
+    idx1, idx2 : np.ndarray
+        As given by :func:`get_pre_indices`.
+    
+    labels : list, optional
+        As given by :func:`get_pre_labels`, compiled once per
+        template. Defaults to None, grouped from `idx1` and `idx2`.
     
-    return pdb, dist
+    Returns
+    -------
+    np.ndarray
+        Shape (..., n_restraints) of distances, in the order of the
+        template.
+    """
+    if labels is None:
+        labels = get_pre_labels(idx1, idx2)
+    
+    coords = np.asarray(coords)
+    dist = np.empty(coords.shape[:-2] + (len(idx1),))
+    for positions, label, partners in labels:
+        dv = (coords[..., partners, :] - coords[..., label, :])
+        dv = dv.astype(np.float64)
+        dv *= dv
+        dist[..., positions] = np.sqrt(dv[..., 0] + dv[..., 1] + dv[..., 2])
+    
+    return dist
 
 
 def calc_pre(fexp, pdb):
     """Back calculates PRE data based on atom-pairs from template."""
-    dist = []
-    
     exp = pd.read_csv(fexp)
-    res1 = exp.res1.values.astype(int)
-    atom1_name = exp.atom1.values
-    res2 = exp.res2.values.astype(int)
-    atom2_name = exp.atom2.values
     
     s = Structure(pdb)
     s.build()
     
-    for i in range(exp.shape[0]):
-        r1 = int(res1[i])
-        r2 = int(res2[i])
-        for j, r in enumerate(s.data_array[:, col_resSeq].astype(int)):
-            if r == r1:
-                if atom1_name[i] == 'H':
-                    atom1 = s.coords[j, :]
-                    break
-                if atom1_name[i] in s.data_array[j, col_name]:
-                    atom1 = s.coords[j, :]
-                    break
-        for j, r in enumerate(s.data_array[:, col_resSeq].astype(int)):
-            if r == r2:
-                if atom2_name[i] == 'H':
-                    atom2 = s.coords[j, :]
-                    break
-                if atom2_name[i] in s.data_array[j, col_name]:
-                    atom2 = s.coords[j, :]
-                    break
-                
-        dv = atom1 - atom2
-        assert dv.shape == (3,)
-        dist.append(get_scalar(dv[0], dv[1], dv[2]))
-    
-    return pdb, dist
+    idx1, idx2 = get_pre_indices(exp, s.data_array)
+    dist = calc_pre_distances(s.coords, idx1, idx2)
+    
+    return pdb, dist.tolist()
+
+
+def get_smfret_indices(exp, data_array):
+    """
+    Resolve the labeled CA atoms and scale factors of a smFRET template.
+    
+    Parameters
+    ----------
+    exp : pd.DataFrame
+        Experimental smFRET template.
+    
+    data_array : np.ndarray
+        The `Structure.data_array` of the topology to index.
+    
+    Returns
+    -------
+    idx1, idx2 : np.ndarray
+        Indices of the CA atoms of the first and second residues.
+    
+    scale_factors : np.ndarray
+        To adjust for dye size and CA to label distances.
+    """
+    resseqs = data_array[:, col_resSeq].astype(int)
+    ca_mask = data_array[:, col_name] == 'CA'
+    
+    res1 = exp.res1.values.astype(int)
+    res2 = exp.res2.values.astype(int)
+    
+    # first CA of each residue, looked up once for all pairs
+    ca_idxs = np.flatnonzero(ca_mask)[::-1]
+    cas = dict(zip(resseqs[ca_idxs].tolist(), ca_idxs.tolist()))
+    
+    idx1 = []
+    idx2 = []
+    for r1, r2 in zip(res1.tolist(), res2.tolist()):
+        if r1 not in cas or r2 not in cas:
+            raise SPyCiPDBException(
+                errmsg=f'CA atoms for smFRET pair {r1} - {r2} not found.'
+                )
+        idx1.append(cas[r1])
+        idx2.append(cas[r2])
+    
+    # TODO: change r1 and r2 to r1p and r2p respectively
+    seq_sep = np.abs(res1 - res2)
+    scale_factors = ((seq_sep + 7) / seq_sep) ** 0.5
+    
+    return np.array(idx1), np.array(idx2), scale_factors
+
+
+def calc_smfret_efficiencies(coords, idx1, idx2, scale_factors, r0):
+    """
+    Calculate smFRET efficiencies from CA-CA distances.
+    
+    Parameters
+    ----------
+    coords : np.ndarray
+        Shape (..., n_atoms, 3). Leading dimensions are kept so that
+        batches of conformers can be computed at once.
+    
+    idx1, idx2, scale_factors : np.ndarray
+        As given by :func:`get_smfret_indices`.
+    
+    r0 : np.ndarray
+        The Foster radius of each dye pair.
+    
+    Returns
+    -------
+    np.ndarray
+        Shape (..., n_pairs) of transfer efficiencies.
+    """
+    dv = (coords[..., idx1, :] - coords[..., idx2, :]).astype(np.float64)
+    dv *= dv
+    # (d * s / r0)^6 straight from the squared distances
+    d2 = (dv[..., 0] + dv[..., 1] + dv[..., 2]) * (scale_factors / r0) ** 2
+    return 1.0 / (1.0 + d2 * d2 * d2)
 
 
 def calc_smfret(fexp, pdb):
@@ -146,42 +525,260 @@ def calc_smfret(fexp, pdb):
     Take into consideration residue pairs and
     scale from experimental data.
     """
-    fret_bc = []
-    
     exp = pd.read_csv(fexp)
-    res1 = exp.res1.values.astype(int)
-    res2 = exp.res2.values.astype(int)
-    scale = exp.scale.values
     
     s = Structure(pdb)
     s.build()
     
-    for i in range(exp.shape[0]):
-        r1 = int(res1[i])
-        r2 = int(res2[i])
-        r1p = 0
-        r2p = 0
-        
-        for j, r in enumerate(s.data_array[:, col_resSeq].astype(int)):
-            if r == r1 and s.data_array[j, col_name] == 'CA':
-                r1p = j
-                break
-        for j, r in enumerate(s.data_array[:, col_resSeq].astype(int)):
-            if r == r2 and s.data_array[j, col_name] == 'CA':
-                r2p = j
-                break
-            
-        # distance between 2 CA atoms
-        dv = s.coords[r1p, :] - s.coords[r2p, :]
-        assert dv.shape == (3,)
-        d = get_scalar(dv[0], dv[1], dv[2])
-
-        # scale_factor to adjust for dye size and CA to label distances
-        # TODO: change r1 and r2 to r1p and r2p respectively
-        scale_factor = ((np.abs(r1 - r2) + 7) / np.abs(r1 - r2)) ** 0.5
-        d = d * scale_factor
-        eff = 1.0 / (1.0 + (d / scale[i]) ** 6.0)
-        fret_bc.append(eff)
-    
-    fret_bc = np.reshape(fret_bc, (-1, exp.shape[0])).tolist()[0]
-    return pdb, fret_bc
+    idx1, idx2, scale_factors = get_smfret_indices(exp, s.data_array)
+    fret_bc = calc_smfret_efficiencies(
+        s.coords,
+        idx1,
+        idx2,
+        scale_factors,
+        exp.scale.values,
+        )
+    
+    return pdb, fret_bc.tolist()
+
+
+# accessible volume (AV) of dyes, in angstroms, after the AV1 model of
+# Kalinin et al. 2012, without the search of the linker path
+AV_LINKER_LENGTH = 20.0
+AV_DYE_RADIUS = 3.5
+AV_ATOM_RADIUS = 1.7
+AV_GRID_SPACING = 1.0
+# donor/acceptor position pairs averaged per dye pair
+AV_SAMPLES = 10000
+
+# `grid` is a cKDTree of the dye positions around the attachment atom
+AVModel = namedtuple(
+    'AVModel',
+    ['grid', 'linker_length', 'clash_radius', 'n_samples'],
+    )
+
+
+def get_av_model(
+        linker_length=AV_LINKER_LENGTH,
+        dye_radius=AV_DYE_RADIUS,
+        atom_radius=AV_ATOM_RADIUS,
+        spacing=AV_GRID_SPACING,
+        n_samples=AV_SAMPLES,
+        ):
+    """
+    Build the voxel grid of an accessible-volume dye model.
+    
+    The grid holds the dye positions reachable from the attachment
+    atom within the linker length. It is built once and reused for
+    every labeled residue of every conformer.
+    
+    Parameters
+    ----------
+    linker_length : float, optional
+        Maximum distance between the attachment atom and the dye
+        center. Defaults to `AV_LINKER_LENGTH`.
+    
+    dye_radius : float, optional
+        Radius of the dye sphere. Defaults to `AV_DYE_RADIUS`.
+    
+    atom_radius : float, optional
+        Radius of the protein heavy atoms.
+        Defaults to `AV_ATOM_RADIUS`.
+    
+    spacing : float, optional
+        Spacing of the voxel grid. Defaults to `AV_GRID_SPACING`.
+    
+    n_samples : int, optional
+        Number of donor/acceptor position pairs averaged per dye
+        pair. Defaults to `AV_SAMPLES`.
+    
+    Returns
+    -------
+    AVModel
+    """
+    n = int(linker_length // spacing)
+    axis = np.arange(-n, n + 1) * spacing
+    grid = np.stack(np.meshgrid(axis, axis, axis, indexing='ij'), axis=-1)
+    grid = grid.reshape(-1, 3)
+    grid = grid[np.sum(grid * grid, axis=1) <= linker_length ** 2]
+    
+    return AVModel(
+        cKDTree(grid),
+        linker_length,
+        dye_radius + atom_radius,
+        n_samples,
+        )
+
+
+def get_elements(data_array):
+    """
+    Get the element of each atom.
+    
+    Read from the element column, or from the first letter of the atom
+    name without digits when the column is blank, so old-style names
+    such as `1HB` are hydrogens.
+    
+    Parameters
+    ----------
+    data_array : np.ndarray
+        The `Structure.data_array` of the topology.
+    
+    Returns
+    -------
+    np.ndarray
+        Upper-case element symbols.
+    """
+    elements = np.char.strip(data_array[:, col_element].astype(str))
+    names = np.char.lstrip(
+        np.char.strip(data_array[:, col_name].astype(str)),
+        '0123456789',
+        )
+    elements = np.where(elements == '', [n[:1] for n in names], elements)
+    return np.char.upper(elements)
+
+
+def get_av_indices(exp, data_array):
+    """
+    Resolve the labeled CA atoms and clashing atoms of a smFRET template.
+    
+    Parameters
+    ----------
+    exp : pd.DataFrame
+        Experimental smFRET template.
+    
+    data_array : np.ndarray
+        The `Structure.data_array` of the topology to index.
+    
+    Returns
+    -------
+    idx1, idx2 : np.ndarray
+        Indices of the CA atoms of the first and second residues.
+    
+    clash_idx : np.ndarray
+        Indices of the heavy atoms the dyes cannot overlap.
+    
+    ignore : dict
+        For each labeled CA, the positions in `clash_idx` of the atoms
+        of its own residue, which do not clash with its dye.
+    """
+    idx1, idx2, _ = get_smfret_indices(exp, data_array)
+    
+    resseqs = data_array[:, col_resSeq].astype(int)
+    clash_idx = np.flatnonzero(~np.isin(get_elements(data_array), ('H', 'D')))
+    clash_resseqs = resseqs[clash_idx]
+    ignore = {
+        site: np.flatnonzero(clash_resseqs == resseqs[site])
+        for site in np.unique(np.concatenate([idx1, idx2])).tolist()
+        }
+    
+    return idx1, idx2, clash_idx, ignore
+
+
+def calc_av_points(coords, tree, site, model, ignore=()):
+    """
+    Calculate the accessible volume of a dye.
+    
+    Dye positions of the voxel grid closer than the clash radius to
+    any atom found by the KD-tree around the attachment atom are
+    masked out.
+    
+    Parameters
+    ----------
+    coords : np.ndarray
+        Shape (n_atoms, 3) of the atoms the dye cannot overlap.
+    
+    tree : cKDTree
+        Of `coords`.
+    
+    site : np.ndarray
+        Shape (3,), position of the attachment atom.
+    
+    model : AVModel
+        As given by :func:`get_av_model`.
+    
+    ignore : np.ndarray, optional
+        Indices of `coords` not considered for clashes.
+    
+    Returns
+    -------
+    np.ndarray
+        Shape (n_points, 3) of the accessible dye positions, only the
+        attachment atom position if no position is accessible.
+    """
+    near = tree.query_ball_point(site, model.linker_length + model.clash_radius)
+    near = np.setdiff1d(near, ignore)
+    
+    free = np.ones(model.grid.n, dtype=bool)
+    if near.size:
+        atoms = cKDTree(coords[near] - site)
+        clashes = atoms.sparse_distance_matrix(
+            model.grid,
+            model.clash_radius,
+            output_type='ndarray',
+            )
+        free[clashes['j']] = False
+    
+    if not free.any():
+        return site[None, :]
+    
+    return model.grid.data[free] + site
+
+
+def calc_av_efficiencies(
+        coords,
+        idx1,
+        idx2,
+        r0,
+        clash_idx,
+        ignore,
+        model,
+        seed=0,
+        ):
+    """
+    Calculate smFRET efficiencies with accessible-volume dyes.
+    
+    The efficiency of each dye pair is averaged over random pairs of
+    donor and acceptor positions of their accessible volumes. The
+    random generator is seeded so results are reproducible.
+    
+    Parameters
+    ----------
+    coords : np.ndarray
+        Shape (n_atoms, 3).
+    
+    idx1, idx2, clash_idx, ignore
+        As given by :func:`get_av_indices`.
+    
+    r0 : np.ndarray
+        The Foster radius of each dye pair.
+    
+    model : AVModel
+        As given by :func:`get_av_model`.
+    
+    seed : int, optional
+        Seed of the sampling of position pairs. Defaults to 0.
+    
+    Returns
+    -------
+    np.ndarray
+        Shape (n_pairs,) of transfer efficiencies.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    clash_coords = coords[clash_idx]
+    tree = cKDTree(clash_coords)
+    avs = {
+        site: calc_av_points(clash_coords, tree, coords[site], model, atoms)
+        for site, atoms in ignore.items()
+        }
+    
+    rng = np.random.default_rng(seed)
+    efficiencies = np.empty(len(idx1))
+    for i, (site1, site2) in enumerate(zip(idx1.tolist(), idx2.tolist())):
+        av1 = avs[site1]
+        av2 = avs[site2]
+        dv = av1[rng.integers(len(av1), size=model.n_samples)] \
+            - av2[rng.integers(len(av2), size=model.n_samples)]
+        d2 = np.sum(dv * dv, axis=1) / r0[i] ** 2
+        efficiencies[i] = np.mean(1.0 / (1.0 + d2 * d2 * d2))
+    
+    return efficiencies
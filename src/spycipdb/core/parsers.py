@@ -14,14 +14,66 @@ from idpconfgen.libs.libstructure import Structure, col_name, col_resSeq
 from spycipdb.core.exceptions import SPyCiPDBException
 
 
+def get_structure(fpdb):
+    """
+    Build the structure of a PDB used to validate a template.
+    
+    Parameters
+    ----------
+    fpdb : str, Path or Structure
+        Path to the PDB file or an already built `Structure`.
+    
+    Returns
+    -------
+    Structure
+        Built idpconfgen `Structure`.
+    """
+    if isinstance(fpdb, Structure):
+        return fpdb
+    
+    struc = Structure(fpdb)
+    struc.build()
+    
+    return struc
+
+
+def get_exp_format_jc(fexp, fpdb):
+    """Get format from experimental template."""
+    exp = pd.read_csv(fexp)
+    
+    struc = get_structure(fpdb)
+    last_residue = int(struc.data_array[:, col_resSeq][-1])
+    
+    try:
+        format = exp.resnum.values.tolist()
+        resnums = exp.resnum.values.astype(int).tolist()
+    except AttributeError as err:
+        errmsg = (
+            'Incorrect experimental file format for JC subclient. '
+            'Text file must have the following columns: '
+            'resnum'
+            )
+        raise SPyCiPDBException(errmsg) from err
+    
+    for res in resnums:
+        if res <= 0 or res > last_residue:
+            errmsg = (
+                'resnum cannot contain 0 or negative values '
+                'and cannot be greater than the maximum number of '
+                'residues in your PDB structure.'
+                )
+            raise SPyCiPDBException(errmsg)
+    
+    return format, []
+
+
 def get_exp_format_noe(fexp, fpdb):
     """Get format from experimental template."""
     errmsgs = []
     format = {}
     exp = pd.read_csv(fexp)
     
-    struc = Structure(fpdb)
-    struc.build()
+    struc = get_structure(fpdb)
     struc_residues = struc.data_array[:, col_resSeq]
     struc_atomnames = struc.data_array[:, col_name]
     last_residue = int(struc.data_array[:, col_resSeq][-1])
@@ -83,8 +135,7 @@ def get_exp_format_pre(fexp, fpdb):
     format = {}
     exp = pd.read_csv(fexp)
     
-    struc = Structure(fpdb)
-    struc.build()
+    struc = get_structure(fpdb)
     struc_residues = struc.data_array[:, col_resSeq]
     struc_atomnames = struc.data_array[:, col_name]
     last_residue = int(struc.data_array[:, col_resSeq][-1])
@@ -144,8 +195,7 @@ def get_exp_format_smfret(fexp, fpdb):
     errmsgs = []
     exp = pd.read_csv(fexp)
     
-    struc = Structure(fpdb)
-    struc.build()
+    struc = get_structure(fpdb)
     struc_residues = struc.data_array[:, col_resSeq]
     last_residue = int(struc.data_array[:, col_resSeq][-1])
     
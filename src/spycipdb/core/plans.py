@@ -0,0 +1,626 @@
+"""
+Compiled restraint plans for the internal back-calculators.
+
+A plan is compiled once per run from the experimental template and the
+topology of a reference conformer. It holds the atom indices, scale
+factors and residue offsets required by a calculator, so the template
+is parsed and validated only once and the workers only have to parse
+the coordinates of each conformer.
+
+Conformers sharing the topology of the reference are read through a
+fast path that only parses their coordinates. Conformers with a
+different topology fall back to a full parse and the template is
+resolved again for them.
+
+Several plans can be combined with :class:`CombinedPlan`, so each
+conformer is parsed once and its coordinates are dispatched to all the
+back-calculators in the same worker.
+
+Plans are shipped once to each worker with :func:`init_plan_worker`
+as the initializer of the pool, the workers then execute
+:func:`calc_with_plan` on each conformer, or
+:func:`calc_ensemble_with_plan` on batches of a packed ensemble.
+:func:`execute_plan` wraps both cases.
+
+:func:`write_plan` writes the results of a plan to an output writer.
+Matrix outputs of a known number of conformers are preallocated as a
+memory-mapped file whose rows are written in place by the workers with
+:func:`calc_rows_with_plan`, so only row indices are sent back to the
+main process instead of the back-calculated values.
+"""
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from copy import copy
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from idpconfgen.libs.libstructure import Structure
+
+from spycipdb.components.helpers import calc_hullrad_rh
+from spycipdb.core.calculators import (
+    calc_av_efficiencies,
+    calc_jc_values,
+    calc_noe_distances,
+    calc_pre_distances,
+    calc_smfret_efficiencies,
+    get_av_indices,
+    get_av_model,
+    get_jc_indices,
+    get_noe_indices,
+    get_pre_indices,
+    get_pre_labels,
+    get_smfret_indices,
+    )
+from spycipdb.core.parsers import (
+    get_exp_format_jc,
+    get_exp_format_noe,
+    get_exp_format_pre,
+    get_exp_format_smfret,
+    get_structure,
+    )
+from spycipdb.libs.libensemble import load_ensemble
+from spycipdb.libs.libmulticore import pool_function
+from spycipdb.libs.liboutput import MatrixWriter
+from spycipdb.libs.libpdb import (
+    get_coords,
+    get_topology,
+    read_atom_lines,
+    set_coords,
+    )
+from spycipdb.logger import report_on_crash
+
+
+# `data_array` is None when the conformer shares the reference topology,
+# `lines` is None for conformers of a packed ensemble
+Conformer = namedtuple('Conformer', ['name', 'coords', 'data_array', 'lines'])
+
+
+def read_conformer(pdb, topology=None):
+    """
+    Parse a conformer once for all plans.
+
+    Parameters
+    ----------
+    pdb : Path or tuple
+        To the PDB file, or (name, content) of a PDB streamed
+        from a tarball.
+
+    topology : bytes, optional
+        Topology fingerprint of the reference conformer. Conformers
+        sharing it only have their coordinates parsed.
+
+    Returns
+    -------
+    Conformer
+    """
+    pdb, data = pdb if isinstance(pdb, tuple) else (pdb, pdb)
+    
+    lines = read_atom_lines(data)
+    if topology is not None and get_topology(lines) == topology:
+        return Conformer(pdb, get_coords(lines), None, lines)
+    
+    s = Structure(b'\n'.join(lines))
+    s.build()
+    return Conformer(pdb, s.coords, s.data_array, lines)
+
+
+class RestraintPlan(ABC):
+    """
+    Base class for compiled restraint plans.
+
+    Subclasses implement :meth:`get_format`, :meth:`compile` and
+    :meth:`calc`.
+
+    Parameters
+    ----------
+    fexp : str or Path
+        To the experimental file template.
+
+    fpdb : str, Path, tuple or Structure
+        Reference conformer defining the topology of the ensemble.
+        Tuples are (name, content) of a PDB streamed from a tarball.
+
+    Attributes
+    ----------
+    format : dict or list
+        The output format as given by the template parsers.
+
+    errmsgs : list
+        Warnings raised while validating the template.
+
+    topology : bytes or None
+        Topology fingerprint of the reference conformer. None when
+        the reference is given as a `Structure`, which disables the
+        coordinates-only fast path.
+
+    batched : bool
+        Whether `calc` accepts a (n_conformers, n_atoms, 3) batch of
+        coordinates, used for packed ensembles.
+    """
+
+    batched = False
+
+    def __init__(self, fexp, fpdb):
+        if isinstance(fpdb, tuple):
+            fpdb = fpdb[1]
+        
+        if isinstance(fpdb, Structure):
+            self.topology = None
+        else:
+            self.topology = get_topology(read_atom_lines(fpdb))
+        
+        struc = get_structure(fpdb)
+        self.format, self.errmsgs = self.get_format(fexp, struc)
+        self.exp = pd.read_csv(fexp)
+        self.compile(self.exp, struc.data_array)
+
+    @abstractmethod
+    def get_format(self, fexp, struc):
+        """Validate the template and return its format."""
+
+    @abstractmethod
+    def compile(self, exp, data_array):
+        """Resolve the template against the reference topology."""
+
+    @abstractmethod
+    def calc(self, coords):
+        """Back-calculate values from conformer coordinates."""
+
+    def calc_array(self, conformer):
+        """
+        Back-calculate a parsed conformer.
+
+        Parameters
+        ----------
+        conformer : Conformer
+            As given by :func:`read_conformer`.
+
+        Returns
+        -------
+        np.ndarray
+            Back-calculated values, one per row of the template.
+        """
+        plan = self
+        if conformer.data_array is not None:
+            # topology differs from the reference, resolve the template again
+            plan = copy(self)
+            plan.compile(self.exp, conformer.data_array)
+        return plan.calc(conformer.coords)
+
+    def calc_conformer(self, conformer):
+        """
+        Back-calculate a parsed conformer.
+
+        Returns
+        -------
+        list
+            Back-calculated values.
+        """
+        return self.calc_array(conformer).tolist()
+
+    def __call__(self, pdb):
+        """
+        Back-calculate a single conformer.
+
+        Parameters
+        ----------
+        pdb : Path or tuple
+            To the PDB file, or (name, content) of a PDB streamed
+            from a tarball.
+
+        Returns
+        -------
+        pdb : Path
+            Of the PDB calculated.
+
+        values : list or dict
+            Back-calculated values.
+        """
+        conformer = read_conformer(pdb, self.topology)
+        return conformer.name, self.calc_conformer(conformer)
+
+
+class JCPlan(RestraintPlan):
+    """
+    Compiled JC template.
+
+    Only the phi torsions of the residues in the template are
+    calculated.
+
+    Parameters
+    ----------
+    karplus : bool, optional
+        Convert the values to hertz with the Karplus equation.
+        Defaults to False.
+    """
+
+    batched = True
+
+    def __init__(self, fexp, fpdb, karplus=False):
+        self.karplus = karplus
+        super().__init__(fexp, fpdb)
+
+    def get_format(self, fexp, struc):
+        """Read the JC template in the order of the PDB residues."""
+        return get_exp_format_jc(fexp, struc)
+
+    def compile(self, exp, data_array):
+        """Resolve the atoms of the phi torsions of the template."""
+        self.phi_idx = get_jc_indices(exp, data_array)
+
+    def calc(self, coords):
+        """Calculate the JC values of coordinates, in hertz with `karplus`."""
+        return calc_jc_values(coords, self.phi_idx, self.karplus)
+
+
+class NOEPlan(RestraintPlan):
+    """Compiled NOE template."""
+
+    batched = True
+
+    def get_format(self, fexp, struc):
+        """Read the NOE template and its atom pairs."""
+        return get_exp_format_noe(fexp, struc)
+
+    def compile(self, exp, data_array):
+        """Resolve the atom groups of the NOE pairs."""
+        self.idx1, self.idx2, self.starts = get_noe_indices(exp, data_array)
+
+    def calc(self, coords):
+        """Calculate the NOE distances of coordinates."""
+        return calc_noe_distances(coords, self.idx1, self.idx2, self.starts)
+
+
+class PREPlan(RestraintPlan):
+    """Compiled PRE template."""
+
+    batched = True
+
+    def get_format(self, fexp, struc):
+        """Read the PRE template and its atom pairs."""
+        return get_exp_format_pre(fexp, struc)
+
+    def compile(self, exp, data_array):
+        """Resolve the atom pairs of each spin label."""
+        self.idx1, self.idx2 = get_pre_indices(exp, data_array)
+        self.labels = get_pre_labels(self.idx1, self.idx2)
+
+    def calc(self, coords):
+        """Calculate the PRE distances of coordinates."""
+        return calc_pre_distances(coords, self.idx1, self.idx2, self.labels)
+
+
+class SmFRETPlan(RestraintPlan):
+    """Compiled smFRET template."""
+
+    batched = True
+
+    def get_format(self, fexp, struc):
+        """Read the smFRET template and its residue pairs."""
+        return get_exp_format_smfret(fexp, struc)
+
+    def compile(self, exp, data_array):
+        """Resolve the CA atoms and scale factors of the residue pairs."""
+        self.idx1, self.idx2, self.scale_factors = \
+            get_smfret_indices(exp, data_array)
+        self.r0 = exp.scale.values
+
+    def calc(self, coords):
+        """Calculate the smFRET efficiencies of coordinates."""
+        return calc_smfret_efficiencies(
+            coords,
+            self.idx1,
+            self.idx2,
+            self.scale_factors,
+            self.r0,
+            )
+
+
+class SmFRETAVPlan(SmFRETPlan):
+    """
+    Compiled smFRET template with accessible-volume dyes.
+
+    Dyes are attached to the CA atoms of the template residues, see
+    :func:`get_av_model` for the parameters.
+    """
+
+    batched = False
+
+    def __init__(self, fexp, fpdb, **av_parameters):
+        self.model = get_av_model(**av_parameters)
+        super().__init__(fexp, fpdb)
+
+    def compile(self, exp, data_array):
+        """Resolve the dye sites and the atoms clashing with the dyes."""
+        self.idx1, self.idx2, self.clash_idx, self.ignore = \
+            get_av_indices(exp, data_array)
+        self.r0 = exp.scale.values
+
+    def calc(self, coords):
+        """Calculate the accessible-volume efficiencies of coordinates."""
+        return calc_av_efficiencies(
+            coords,
+            self.idx1,
+            self.idx2,
+            self.r0,
+            self.clash_idx,
+            self.ignore,
+            self.model,
+            )
+
+
+class CombinedPlan:
+    """
+    Several compiled plans sharing a single parse of each conformer.
+
+    It has no template of its own, but is executed as a
+    :class:`RestraintPlan` with :func:`execute_plan`.
+
+    Parameters
+    ----------
+    plans : dict
+        Of compiled plans by observable name. All plans must be
+        compiled against the same reference conformer.
+
+    fpdb : str, Path or tuple
+        Reference conformer defining the topology of the ensemble.
+        Tuples are (name, content) of a PDB streamed from a tarball.
+
+    rh : bool, optional
+        Whether to also calculate the translational hydrodynamic
+        radius with HullRad, stored under the `rh` key.
+        Defaults to False.
+    """
+
+    batched = False
+
+    def __init__(self, plans, fpdb, rh=False):
+        if isinstance(fpdb, tuple):
+            fpdb = fpdb[1]
+        
+        self.plans = plans
+        self.rh = rh
+        self.reference_lines = read_atom_lines(fpdb)
+        self.topology = get_topology(self.reference_lines)
+        self.format = {name: plan.format for name, plan in plans.items()}
+        self.errmsgs = [e for plan in plans.values() for e in plan.errmsgs]
+
+    def calc_conformer(self, conformer):
+        """
+        Back-calculate a parsed conformer with all the plans.
+
+        Returns
+        -------
+        dict
+            Back-calculated values by observable name.
+        """
+        results = {
+            name: plan.calc_conformer(conformer)
+            for name, plan in self.plans.items()
+            }
+        
+        if self.rh:
+            lines = conformer.lines
+            if lines is None:
+                lines = set_coords(self.reference_lines, conformer.coords)
+            results['rh'] = calc_hullrad_rh(lines)
+        
+        return results
+
+    def __call__(self, pdb):
+        """
+        Back-calculate a single conformer with all the plans.
+
+        Returns
+        -------
+        pdb : Path
+            Of the PDB calculated.
+
+        results : dict
+            Back-calculated values by observable name.
+        """
+        conformer = read_conformer(pdb, self.topology)
+        return conformer.name, self.calc_conformer(conformer)
+
+
+# tasks read ahead per worker, bounds memory when streaming tarballs
+PREFETCH = 4
+
+_worker_plan = None
+_worker_ensemble = None
+_worker_matrix = None
+
+
+def init_plan_worker(plan, ensemble=None, matrix=None):
+    """
+    Ship a compiled plan to a worker.
+
+    To be used as the `initializer` of a multiprocessing pool.
+
+    Parameters
+    ----------
+    plan : RestraintPlan
+        The compiled plan.
+
+    ensemble : str or Path, optional
+        Path to a packed ensemble, memory-mapped once per worker.
+
+    matrix : str or Path, optional
+        Path to the .NPY output matrix, memory-mapped once per worker.
+    """
+    global _worker_plan, _worker_ensemble, _worker_matrix
+    _worker_plan = plan
+    _worker_ensemble = ensemble and load_ensemble(ensemble)
+    _worker_matrix = matrix and np.load(matrix, mmap_mode='r+')
+
+
+def calc_with_plan(pdb):
+    """Back-calculate a conformer with the plan of the current worker."""
+    return _worker_plan(pdb)
+
+
+def calc_ensemble_with_plan(batch):
+    """
+    Back-calculate a batch of the packed ensemble of the current worker.
+
+    Parameters
+    ----------
+    batch : tuple
+        (start, stop) indices of the conformers.
+
+    Returns
+    -------
+    list
+        Of (name, values) for each conformer of the batch.
+    """
+    start, stop = batch
+    names = _worker_ensemble.names[start:stop]
+    coords = _worker_ensemble.coords[start:stop]
+    if _worker_plan.batched:
+        return list(zip(names, _worker_plan.calc(coords).tolist()))
+    
+    return [
+        (name, _worker_plan.calc_conformer(Conformer(name, xyz, None, None)))
+        for name, xyz in zip(names, coords)
+        ]
+
+
+def calc_rows_with_plan(task):
+    """
+    Back-calculate conformers into the output matrix of the current worker.
+
+    Parameters
+    ----------
+    task : tuple
+        (row, pdb) of a conformer, or (start, stop) indices of a batch
+        of the packed ensemble, which are also its rows.
+
+    Returns
+    -------
+    tuple
+        (start, stop) of the rows written.
+    """
+    if _worker_ensemble is None:
+        row, pdb = task
+        conformer = read_conformer(pdb, _worker_plan.topology)
+        _worker_matrix[row] = _worker_plan.calc_array(conformer)
+        return row, row + 1
+    
+    start, stop = task
+    coords = _worker_ensemble.coords[start:stop]
+    if _worker_plan.batched:
+        _worker_matrix[start:stop] = _worker_plan.calc(coords)
+    else:
+        for row, xyz in enumerate(coords, start=start):
+            conformer = Conformer(None, xyz, None, None)
+            _worker_matrix[row] = _worker_plan.calc_array(conformer)
+    return task
+
+
+def execute_plan(plan, items, ncores=1, ensemble=None):
+    """
+    Back-calculate conformers with a compiled plan.
+
+    Parameters
+    ----------
+    plan : RestraintPlan
+        The compiled plan.
+
+    items : iterable
+        Paths to PDB files, (name, content) of PDBs streamed from a
+        tarball, or (start, stop) batches of `ensemble`.
+
+    ncores : int, optional
+        The number of workers.
+        Defaults to 1.
+
+    ensemble : str or Path, optional
+        Path to a packed ensemble.
+
+    Yields
+    ------
+    tuple
+        (pdb, values) for each conformer, in the order of `items`.
+    """
+    func = calc_with_plan if ensemble is None else calc_ensemble_with_plan
+    execute_pool = pool_function(
+        partial(report_on_crash, func),
+        items,
+        method='imap',
+        ncores=ncores,
+        initializer=init_plan_worker,
+        initargs=(plan, ensemble),
+        prefetch=PREFETCH * ncores,
+        )
+    
+    if ensemble is None:
+        yield from execute_pool
+    else:
+        for batch in execute_pool:
+            yield from batch
+
+
+def write_plan(plan, items, writer, ncores=1, ensemble=None, callback=None):
+    """
+    Back-calculate conformers with a compiled plan into an output writer.
+
+    The format of the plan is written first. For matrix writers, with
+    a list of PDB files or a packed ensemble, the matrix is allocated
+    on disk and the workers write their rows in place. Otherwise the
+    results are streamed to the writer as given by :func:`execute_plan`.
+
+    Parameters
+    ----------
+    plan : RestraintPlan
+        The compiled plan, of one value per row of the template.
+
+    items : iterable
+        As given by :func:`spycipdb.libs.libfuncs.get_plan_inputs`.
+
+    writer : writer
+        As given by :func:`spycipdb.libs.liboutput.get_writer`.
+
+    ncores : int, optional
+        The number of workers.
+        Defaults to 1.
+
+    ensemble : str or Path, optional
+        Path to a packed ensemble.
+
+    callback : callable, optional
+        Called with (pdb, values) of each conformer, in order.
+    """
+    writer.write('format', plan.format)
+    
+    if not isinstance(writer, MatrixWriter) \
+            or (ensemble is None and not isinstance(items, list)):
+        for pdb, values in execute_plan(plan, items, ncores, ensemble):
+            writer.write(pdb.stem, values)
+            if callback is not None:
+                callback(pdb, values)
+        return
+    
+    if ensemble is None:
+        names = items
+        tasks = enumerate(items)
+    else:
+        names = load_ensemble(ensemble).names
+        tasks = items
+    
+    matrix = writer.allocate(len(names), len(plan.exp))
+    execute_pool = pool_function(
+        partial(report_on_crash, calc_rows_with_plan),
+        tasks,
+        method='imap',
+        ncores=ncores,
+        initializer=init_plan_worker,
+        initargs=(plan, ensemble, matrix),
+        prefetch=PREFETCH * ncores,
+        )
+    
+    for start, stop in execute_pool:
+        for row in range(start, stop):
+            writer.write_row(names[row].stem)
+            if callback is not None:
+                callback(names[row], writer.matrix[row])
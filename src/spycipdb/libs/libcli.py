@@ -9,6 +9,7 @@ import sys
 from os import cpu_count
 
 from spycipdb import __version__
+from spycipdb.libs.liboutput import OUTPUT_FORMATS
 
 
 detailed = "detailed instructions:\n\n{}"
@@ -144,7 +145,8 @@ def add_argument_pdb_files(parser):
             'Path to PDB file(s) on the disk. '
             'Accepts a path to a directory containing .pdb files. '
             'Accepts tarball formats with .tar, .tar.gz, .tar.xz '
-            'file extensions containing .pdb files.'
+            'file extensions containing .pdb files. '
+            'Accepts a packed ensemble from `spycipdb pack`.'
             ),
         nargs='+',
         action=FolderOrTar,
@@ -218,6 +220,51 @@ def add_argument_output(parser):
         )
 
 
+def add_argument_output_format(parser):
+    """Add argument for the format of the output file."""
+    parser.add_argument(
+        '--output-format',
+        help=(
+            'Format of the output file. `json` writes a single .JSON '
+            'object, `ndjson` writes one .JSON object per line, both as '
+            'results come. `npz`, `parquet` and `hdf5` write a dense '
+            '(conformers x values) matrix with the conformer names and '
+            'the format, `parquet` requires `pyarrow` and `hdf5` '
+            'requires `h5py`. '
+            'Defaults to `json`.'
+            ),
+        choices=OUTPUT_FORMATS,
+        default='json',
+        )
+
+
+def add_argument_deprecated_tmpdir(parser):
+    """Add the `--tmpdir` argument of modules streaming tarballs."""
+    parser.add_argument(
+        '--tmpdir',
+        help=(
+            'Deprecated and ignored, tarballs are streamed without '
+            'extracting them to a temporary directory.'
+            ),
+        default=None,
+        )
+
+
+def add_argument_resume(parser):
+    """Add argument to resume interrupted runs."""
+    parser.add_argument(
+        '--resume',
+        help=(
+            'Records completed conformers in a `<output>.journal` file. '
+            'If the run is interrupted, running the same command again '
+            'skips the conformers already recorded. '
+            'Defaults to off.'
+            ),
+        action='store_true',
+        default=False,
+        )
+
+
 def add_argument_plot(parser):
     """Add argument for plotting back-calculated result."""
     parser.add_argument(
@@ -0,0 +1,145 @@
+"""
+Packed ensembles of conformers sharing the same topology.
+
+A packed ensemble is a folder holding:
+
+    * ``coords.npy``, float32 coordinates of shape
+      (n_conformers, n_atoms, 3) that is memory-mapped when loaded
+    * ``topology.pdb``, the atom records of the first conformer,
+      shared by all conformers
+    * ``names.txt``, the file name of each conformer, one per line
+
+Back-calculators read coordinates as zero-copy slices of the
+memory-mapped array instead of parsing PDB text for every run.
+"""
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+
+COORDS_FILE = 'coords.npy'
+TOPOLOGY_FILE = 'topology.pdb'
+NAMES_FILE = 'names.txt'
+
+# number of conformers back-calculated per task
+ENSEMBLE_BATCH = 256
+
+Ensemble = namedtuple('Ensemble', ['path', 'names', 'topology', 'coords'])
+
+
+def is_ensemble(path):
+    """
+    Check if a path is a packed ensemble.
+
+    Parameters
+    ----------
+    path : str, Path or list
+        As given by `libcli.add_argument_pdb_files`.
+
+    Returns
+    -------
+    bool
+    """
+    if isinstance(path, (list, tuple)):
+        if len(path) != 1:
+            return False
+        path = path[0]
+
+    return Path(path, COORDS_FILE).exists() \
+        and Path(path, TOPOLOGY_FILE).exists()
+
+
+def create_ensemble(path, names, reference_lines, n_atoms):
+    """
+    Create the files of a packed ensemble.
+
+    Parameters
+    ----------
+    path : str or Path
+        Folder of the packed ensemble.
+
+    names : list
+        File names of the conformers.
+
+    reference_lines : list
+        Atom records, as bytes, of the reference conformer.
+
+    n_atoms : int
+        Number of atoms per conformer.
+
+    Returns
+    -------
+    np.memmap
+        Writable coordinates of shape (n_conformers, n_atoms, 3).
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    Path(path, TOPOLOGY_FILE).write_bytes(b'\n'.join(reference_lines) + b'\n')
+    Path(path, NAMES_FILE).write_text('\n'.join(names) + '\n')
+
+    return np.lib.format.open_memmap(
+        Path(path, COORDS_FILE),
+        mode='w+',
+        dtype=np.float32,
+        shape=(len(names), n_atoms, 3),
+        )
+
+
+def remove_ensemble(path):
+    """
+    Remove the files of a packed ensemble.
+
+    Other files in the folder are kept, the folder is removed only
+    if it is left empty.
+
+    Parameters
+    ----------
+    path : str or Path
+        Folder of the packed ensemble.
+    """
+    path = Path(path)
+    for name in (COORDS_FILE, TOPOLOGY_FILE, NAMES_FILE):
+        Path(path, name).unlink(missing_ok=True)
+    if path.is_dir() and not any(path.iterdir()):
+        path.rmdir()
+
+
+def load_ensemble(path):
+    """
+    Load a packed ensemble.
+
+    Parameters
+    ----------
+    path : str, Path or list
+        Folder of the packed ensemble.
+
+    Returns
+    -------
+    Ensemble
+        With the conformer names as `Path` objects, the path to the
+        topology PDB, and the read-only memory-mapped coordinates.
+    """
+    if isinstance(path, (list, tuple)):
+        path = path[0]
+    path = Path(path)
+
+    names = [Path(n) for n in Path(path, NAMES_FILE).read_text().splitlines()]
+    coords = np.load(Path(path, COORDS_FILE), mmap_mode='r')
+
+    return Ensemble(path, names, Path(path, TOPOLOGY_FILE), coords)
+
+
+def get_batches(n_conformers, batch_size=ENSEMBLE_BATCH):
+    """
+    Split conformer indices into batches.
+
+    Returns
+    -------
+    list
+        Of (start, stop) tuples.
+    """
+    return [
+        (start, min(start + batch_size, n_conformers))
+        for start in range(0, n_conformers, batch_size)
+        ]
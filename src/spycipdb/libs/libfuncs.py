@@ -1,6 +1,20 @@
 """Useful functions required throughout."""
+import os
+import tarfile
+import tempfile
+from contextlib import contextmanager
+from itertools import chain
+from pathlib import Path
+
 import matplotlib.pyplot as plt
 from idpconfgen.libs.libio import extract_from_tar, read_path_bundle
+from natsort import os_sorted
+
+from spycipdb.libs.libensemble import get_batches, is_ensemble, load_ensemble
+
+
+# memory-backed filesystem preferred for the files of external programs
+SCRATCH_ROOT = '/dev/shm'
 
 
 def get_scalar(x, y, z):
@@ -20,6 +34,123 @@ def get_pdb_paths(pdb_files, tmpdir):
     return pdbs2operate, _istarfile
 
 
+def get_scratch_root():
+    """
+    Get the folder where to create scratch directories.
+
+    Returns
+    -------
+    str or None
+        `SCRATCH_ROOT` if it is a writable folder, otherwise None
+        for the default temporary folder of the system.
+    """
+    if os.path.isdir(SCRATCH_ROOT) and os.access(SCRATCH_ROOT, os.W_OK):
+        return SCRATCH_ROOT
+    return None
+
+
+@contextmanager
+def scratch_dir(prefix='spycipdb_'):
+    """
+    Create a private scratch directory for an external program.
+
+    Each call gets its own directory, so workers running the same
+    program on conformers of the same name never share files. The
+    directory and all its content are removed on exit, also when
+    the program fails.
+
+    Parameters
+    ----------
+    prefix : str, optional
+        Prefix of the directory name.
+        Defaults to `spycipdb_`.
+
+    Yields
+    ------
+    Path
+        The scratch directory.
+    """
+    with tempfile.TemporaryDirectory(
+            prefix=prefix,
+            dir=get_scratch_root(),
+            ) as tmpdir:
+        yield Path(tmpdir)
+
+
+def is_tarball(pdb_files):
+    """Check if the input is a tarball as given by `FolderOrTar`."""
+    return isinstance(pdb_files, (str, Path)) \
+        and str(pdb_files).endswith(('.tar', '.tar.gz', '.tar.xz'))
+
+
+def iter_tar_pdbs(tarball, ext='.pdb'):
+    """
+    Stream PDB files out of a tarball without extracting them.
+    
+    Members are decompressed sequentially as they are requested.
+    
+    Parameters
+    ----------
+    tarball : str or Path
+        Path to a .tar, .tar.gz or .tar.xz file.
+    
+    ext : str, optional
+        Extension of the members to stream.
+        Defaults to `.pdb`.
+    
+    Yields
+    ------
+    tuple
+        (name, content) of each PDB, with name as a `Path` and
+        content as bytes.
+    """
+    with tarfile.open(tarball, mode='r|*') as tar:
+        for member in tar:
+            if member.isfile() and member.name.endswith(ext):
+                yield Path(member.name), tar.extractfile(member).read()
+
+
+def get_plan_inputs(pdb_files):
+    """
+    Get the conformers to back-calculate with a compiled plan.
+    
+    Tarballs are streamed in their archive order, folders are
+    sorted.
+    
+    Parameters
+    ----------
+    pdb_files : str, Path or list
+        A tarball, folder(s) of PDB files or a packed ensemble.
+    
+    Returns
+    -------
+    items : iterable
+        PDB paths, (name, content) of PDBs streamed from a tarball,
+        or (start, stop) batches of the packed ensemble.
+    
+    reference : Path, tuple or None
+        The PDB defining the topology of the ensemble.
+        None if no PDB files were found.
+    
+    ensemble : Path or None
+        Path to the packed ensemble if given.
+    """
+    if is_ensemble(pdb_files):
+        ensemble = load_ensemble(pdb_files)
+        items = get_batches(len(ensemble.names))
+        return items, ensemble.topology, ensemble.path
+    
+    if is_tarball(pdb_files):
+        stream = iter_tar_pdbs(pdb_files)
+        reference = next(stream, None)
+        return chain([reference], stream), reference, None
+    
+    pdbs2operate = os_sorted(read_path_bundle(pdb_files, ext='pdb'))
+    reference = pdbs2operate[0] if pdbs2operate else None
+    
+    return pdbs2operate, reference, None
+
+
 def plot_data_and_ranges(
         values,
         ranges,
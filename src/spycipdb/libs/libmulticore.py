@@ -0,0 +1,201 @@
+"""
+Multiprocessing operations for SPyCi-PDB.
+
+Extends `pool_function` from IDPConformerGenerator:
+https://github.com/julie-forman-kay-lab/IDPConformerGenerator/blob/3aef6b085ec09eeebc5812639a5eb6832c0215cd/src/idpconfgen/libs/libmulticore.py
+
+External programs are scheduled with `async_pool_function` instead,
+from a single process waiting on all of them.
+"""
+import asyncio
+import subprocess
+from collections import deque
+from multiprocessing import Pool
+from threading import Event, Semaphore
+
+from spycipdb.core.exceptions import SPyCiPDBException
+
+
+def pool_function(
+        func,
+        items,
+        method='imap',
+        ncores=1,
+        chunksize=1,
+        initializer=None,
+        initargs=(),
+        prefetch=None,
+        ):
+    """
+    Execute a function over items in a multiprocessing pool.
+
+    Parameters
+    ----------
+    func : callable
+        The function to execute over each item.
+
+    items : iterable
+        The items to feed to `func`.
+
+    method : str, optional
+        The `multiprocessing.Pool` mapping method.
+        Defaults to `imap`, which preserves the order of `items`.
+
+    ncores : int, optional
+        The number of worker processes.
+        Defaults to 1.
+
+    chunksize : int, optional
+        Number of items sent to a worker at once.
+        Defaults to 1.
+
+    initializer : callable, optional
+        Executed once in each worker when it starts. Use it to ship
+        data shared by all tasks once per worker instead of once
+        per item.
+
+    initargs : tuple, optional
+        Arguments for `initializer`.
+
+    prefetch : int, optional
+        Maximum number of items taken from `items` ahead of the
+        results consumed. Without it the pool drains `items` into
+        memory as fast as it can, use it when `items` is a lazy
+        stream of large objects.
+        Defaults to None, no limit.
+
+    Yields
+    ------
+    The results of `func` for each item.
+    """
+    if prefetch is not None:
+        slots = Semaphore(prefetch)
+        stop = Event()
+        items = _throttle(items, slots, stop)
+
+    with Pool(ncores, initializer=initializer, initargs=initargs) as pool:
+        imap = getattr(pool, method)(func, items, chunksize=chunksize)
+        try:
+            for result in imap:
+                if prefetch is not None:
+                    slots.release()
+                yield result
+        finally:
+            # unblocks the task feeder so the pool can terminate
+            if prefetch is not None:
+                stop.set()
+                slots.release()
+
+
+def _throttle(items, slots, stop):
+    """Yield items only when a slot is available."""
+    for item in items:
+        slots.acquire()
+        if stop.is_set():
+            return
+        yield item
+
+
+async def run_program(args, cwd=None):
+    """
+    Run an external program, without a shell, until it exits.
+
+    Parameters
+    ----------
+    args : list
+        The executable and its arguments.
+
+    cwd : str or Path, optional
+        Working directory of the program.
+
+    Raises
+    ------
+    SPyCiPDBException
+        If the program exits with a non-zero code, with its
+        standard error in the message.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *map(str, args),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        )
+    try:
+        _, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+    
+    if proc.returncode != 0:
+        # braces are format fields of the message
+        stderr = stderr.decode(errors='replace').strip()
+        stderr = stderr.replace('{', '{{').replace('}', '}}')
+        raise SPyCiPDBException(
+            errmsg=(
+                f'{args[0]} exited with code {proc.returncode}: '
+                f'{stderr}'
+                )
+            )
+
+
+def async_pool_function(func, items, ncores=1, prefetch=None):
+    """
+    Execute a coroutine function over items in an event loop.
+
+    Made for the wrappers of external programs, which spend their
+    time waiting on a subprocess. At most `ncores` calls run at
+    once, and each call parses the output of its program as soon
+    as the program exits.
+
+    Parameters
+    ----------
+    func : coroutine function
+        The function to execute over each item.
+
+    items : iterable
+        The items to feed to `func`.
+
+    ncores : int, optional
+        The maximum number of calls running at once.
+        Defaults to 1.
+
+    prefetch : int, optional
+        Maximum number of calls scheduled ahead of the results
+        consumed, to bound the memory of results waiting for a
+        slower one before them.
+        Defaults to four times `ncores`.
+
+    Yields
+    ------
+    The results of `func` for each item, in the order of `items`.
+    """
+    prefetch = max(prefetch or 4 * ncores, ncores)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    semaphore = asyncio.Semaphore(ncores)
+
+    async def bounded(item):
+        async with semaphore:
+            return await func(item)
+
+    scheduled = deque()
+    items = iter(items)
+    try:
+        while True:
+            for item in items:
+                scheduled.append(loop.create_task(bounded(item)))
+                if len(scheduled) >= prefetch:
+                    break
+            if not scheduled:
+                return
+            yield loop.run_until_complete(scheduled.popleft())
+    finally:
+        for task in scheduled:
+            task.cancel()
+        if scheduled:
+            loop.run_until_complete(
+                asyncio.gather(*scheduled, return_exceptions=True)
+                )
+        asyncio.set_event_loop(None)
+        loop.close()
@@ -0,0 +1,612 @@
+"""
+Streaming writers for back-calculated results.
+
+Results are written to disk as they come out of the workers, so memory
+stays constant with the size of the ensemble and a crash keeps all the
+conformers completed so far.
+
+Text formats are written as results come:
+
+    * ``json``, a single JSON object identical to
+      ``json.dumps(results, indent=4)``, closed when the writer closes
+    * ``ndjson``, one ``{key: value}`` JSON object per line
+
+Binary formats store the results as a dense float64 matrix of shape
+(n_conformers, n_values), written when the writer closes:
+
+    * ``npz``, NumPy arrays `values`, `names`, `format` and `fields`
+    * ``parquet``, one row per conformer indexed by name, with `format`
+      and `fields` in the schema metadata, requires `pyarrow`. Columns
+      of dictionaries are named by key
+    * ``hdf5``, datasets `values` and `names`, with `format` and
+      `fields` as attributes, requires `h5py`
+
+When the shape is known in advance, the matrix can be preallocated
+with :meth:`MatrixWriter.allocate` as a memory-mapped ``.npy`` file next
+to the output, whose rows are written in place by the workers.
+
+`format` is the JSON of the format of the module. `fields` is the JSON
+of how each row maps to the values of a conformer: null for lists,
+``"scalar"`` for single values, or ``[[key, length], ...]`` for
+dictionaries of lists, whose lists are concatenated in the row. A null
+length stands for a single value in the dictionary.
+
+Long runs can be made resumable with a :class:`Journal` that records
+the results of each completed conformer. Restarting the run skips the
+conformers in the journal, and the output is merged from the journal
+once all conformers are done.
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+from spycipdb.core.exceptions import SPyCiPDBException
+
+
+OUTPUT_FORMATS = ('json', 'ndjson', 'npz', 'parquet', 'hdf5')
+
+
+class JSONWriter:
+    """
+    Write results incrementally as a single JSON object.
+
+    Parameters
+    ----------
+    output : str or Path
+        Path to the output file.
+    """
+
+    def __init__(self, output):
+        self.fout = open(output, mode='w')
+        self.empty = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self, conformer):
+        """Mark the start of the results of a conformer."""
+        return
+
+    def write(self, key, value):
+        """Write a key-value pair of the output."""
+        sep = '{\n' if self.empty else ',\n'
+        self.empty = False
+        dump = json.dumps(value, indent=4).replace('\n', '\n    ')
+        self.fout.write(f'{sep}    {json.dumps(key)}: {dump}')
+        self.fout.flush()
+
+    def close(self):
+        """Close the JSON object and the file."""
+        self.fout.write('{}' if self.empty else '\n}')
+        self.fout.close()
+
+
+class NDJSONWriter(JSONWriter):
+    """Write results incrementally as one JSON object per line."""
+
+    def write(self, key, value):
+        """Write a result as a single JSON line."""
+        self.empty = False
+        self.fout.write(json.dumps({key: value}) + '\n')
+        self.fout.flush()
+
+    def close(self):
+        """Close the output file."""
+        self.fout.close()
+
+
+class MatrixWriter(ABC):
+    """
+    Base writer of results as a dense matrix.
+
+    Rows are kept in memory as float arrays, a fraction of the size
+    of their JSON text, and saved when the writer closes. Rows of an
+    allocated matrix live on disk instead.
+
+    Parameters
+    ----------
+    output : str or Path
+        Path to the output file.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.empty = True
+        self.format = None
+        self.fields = None
+        self.names = []
+        self.rows = []
+        self.matrix = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self, conformer):
+        """Mark the start of the results of a conformer."""
+        return
+
+    def write(self, key, value):
+        """Write a key-value pair of the output."""
+        self.empty = False
+        if key == 'format':
+            self.format = value
+            return
+
+        if isinstance(value, dict):
+            self.fields = [
+                [k, None if np.isscalar(v) else len(v)]
+                for k, v in value.items()
+                ]
+            value = np.hstack(list(value.values()))
+        elif np.isscalar(value):
+            self.fields = 'scalar'
+        self.names.append(key)
+        self.rows.append(np.asarray(value, dtype=np.float64).ravel())
+
+    def allocate(self, n_conformers, n_values):
+        """
+        Preallocate the matrix as a memory-mapped file.
+
+        The file is `<output>.rows.npy` and is removed once the matrix
+        is saved.
+
+        Parameters
+        ----------
+        n_conformers : int
+            The number of rows.
+
+        n_values : int
+            The number of values per conformer.
+
+        Returns
+        -------
+        Path
+            To the .NPY file, to be opened with ``mmap_mode='r+'`` by
+            the workers writing the rows.
+        """
+        path = Path(f'{self.output}.rows.npy')
+        self.matrix = np.lib.format.open_memmap(
+            path,
+            mode='w+',
+            dtype=np.float64,
+            shape=(n_conformers, n_values),
+            )
+        return path
+
+    def write_row(self, key):
+        """Name the next row of the allocated matrix, already written."""
+        self.empty = False
+        self.names.append(key)
+
+    def close(self):
+        """Save the matrix."""
+        if self.matrix is not None:
+            # rows of the conformers completed so far
+            values = self.matrix[:len(self.names)]
+        else:
+            values = np.array(self.rows, dtype=np.float64)
+            if not self.rows:
+                values = values.reshape(0, 0)
+        self.save(
+            values,
+            [str(name) for name in self.names],
+            json.dumps(self.format),
+            json.dumps(self.fields),
+            )
+        
+        if self.matrix is not None:
+            path = self.matrix.filename
+            self.matrix = None
+            del values
+            os.remove(path)
+
+    @abstractmethod
+    def save(self, values, names, format, fields):
+        """Save the matrix to the output file."""
+
+
+class NPZWriter(MatrixWriter):
+    """Write results as NumPy arrays in a .NPZ file."""
+
+    def save(self, values, names, format, fields):
+        """Save the matrix and its metadata to a .NPZ file."""
+        # a file object prevents numpy from appending `.npz` to the name
+        with open(self.output, mode='wb') as fout:
+            np.savez(
+                fout,
+                values=values,
+                names=np.array(names, dtype=str),
+                format=np.array(format),
+                fields=np.array(fields),
+                )
+
+
+class ParquetWriter(MatrixWriter):
+    """Write results as a Parquet table."""
+
+    def __init__(self, output):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as err:
+            raise SPyCiPDBException(
+                errmsg='Writing .parquet files requires `pyarrow`.'
+                ) from err
+        super().__init__(output)
+
+    def save(self, values, names, format, fields):
+        """Save the matrix as a Parquet table with named columns."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = [pa.array(names)]
+        columns.extend(pa.array(col) for col in values.T)
+        table = pa.table(
+            columns,
+            names=['name'] + get_column_names(values.shape[1], fields),
+            metadata={'format': format, 'fields': fields},
+            )
+        pq.write_table(table, self.output)
+
+
+def get_column_names(n_columns, fields):
+    """
+    Name the columns of the matrix of results.
+
+    Parameters
+    ----------
+    n_columns : int
+        The number of columns of the matrix.
+
+    fields : str
+        JSON of the `fields` of the matrix.
+
+    Returns
+    -------
+    list
+        Keys of dictionaries, suffixed with the index of lists,
+        or column indexes otherwise.
+    """
+    fields = json.loads(fields)
+    if not isinstance(fields, list):
+        return [str(i) for i in range(n_columns)]
+    
+    names = []
+    for key, length in fields:
+        if length is None:
+            names.append(key)
+        else:
+            names.extend(f'{key}_{i}' for i in range(length))
+    return names
+
+
+class HDF5Writer(MatrixWriter):
+    """Write results as HDF5 datasets."""
+
+    def __init__(self, output):
+        try:
+            import h5py  # noqa: F401
+        except ImportError as err:
+            raise SPyCiPDBException(
+                errmsg='Writing .hdf5 files requires `h5py`.'
+                ) from err
+        super().__init__(output)
+
+    def save(self, values, names, format, fields):
+        """Save the matrix and its metadata as HDF5 datasets."""
+        import h5py
+
+        with h5py.File(self.output, mode='w') as fout:
+            fout.create_dataset('values', data=values)
+            fout.create_dataset(
+                'names',
+                data=names,
+                dtype=h5py.string_dtype(),
+                )
+            fout.attrs['format'] = format
+            fout.attrs['fields'] = fields
+
+
+class Journal:
+    """
+    On-disk journal of the results of completed conformers.
+
+    Each line of the journal holds all the key-value pairs written for
+    a conformer as ``[conformer, [[key, value], ...]]``, so a conformer
+    is either fully recorded or not at all. When closed with all the
+    conformers done, the results are merged into the output in the
+    order of `conformers` and the journal is removed.
+
+    Parameters
+    ----------
+    path : str or Path
+        Path to the journal file. Existing journals are resumed.
+
+    output : str or Path
+        Path to the output file.
+
+    output_format : str
+        One of `OUTPUT_FORMATS`.
+
+    conformers : list
+        Names of all the conformers of the run, in output order.
+    """
+
+    def __init__(self, path, output, output_format, conformers):
+        self.path = Path(path)
+        self.output = output
+        self.output_format = output_format
+        self.conformers = conformers
+        self.offsets = {}
+        self.format_offset = None
+        self.current = None
+        self.entries = []
+
+        if self.path.exists():
+            self._index()
+        self.fout = open(self.path, mode='ab')
+
+    def _index(self):
+        """Index the offset of each conformer in the journal."""
+        offset = 0
+        with open(self.path, mode='rb') as fin:
+            for line in fin:
+                if not line.endswith(b'\n'):
+                    # partial line of an interrupted run
+                    break
+                conformer, entries = json.loads(line)
+                self.offsets[conformer] = offset
+                if self.format_offset is None \
+                        and any(key == 'format' for key, _ in entries):
+                    self.format_offset = offset
+                offset += len(line)
+
+        os.truncate(self.path, offset)
+
+    def __contains__(self, conformer):
+        return conformer in self.offsets
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        self.close(merge=exc_type is None)
+
+    @property
+    def empty(self):
+        """Whether no results were recorded yet."""
+        return not self.offsets and not self.entries
+
+    def start(self, conformer):
+        """Record the previous conformer and start a new one."""
+        self._record()
+        self.current = conformer
+
+    def write(self, key, value):
+        """Write a key-value pair of the current conformer."""
+        self.entries.append([key, value])
+
+    def _record(self):
+        if self.current is None:
+            return
+        offset = self.fout.tell()
+        line = json.dumps([self.current, self.entries]) + '\n'
+        self.fout.write(line.encode())
+        self.fout.flush()
+        self.offsets[self.current] = offset
+        if self.format_offset is None \
+                and any(key == 'format' for key, _ in self.entries):
+            self.format_offset = offset
+        self.current = None
+        self.entries = []
+
+    def _read(self, fin, offset):
+        fin.seek(offset)
+        return json.loads(fin.readline())[1]
+
+    def close(self, merge=True):
+        """
+        Close the journal.
+
+        Parameters
+        ----------
+        merge : bool, optional
+            Merge the results into the output if all the conformers
+            are done.
+            Defaults to True.
+        """
+        self._record()
+        self.fout.close()
+        if not merge or any(c not in self for c in self.conformers):
+            return
+
+        with open(self.path, mode='rb') as fin, \
+                get_writer(self.output, self.output_format) as writer:
+            if self.format_offset is not None:
+                for key, value in self._read(fin, self.format_offset):
+                    if key == 'format':
+                        writer.write(key, value)
+                        break
+            for conformer in self.conformers:
+                for key, value in self._read(fin, self.offsets[conformer]):
+                    if key != 'format':
+                        writer.write(key, value)
+
+        self.path.unlink()
+
+
+def get_writer(output, output_format='json'):
+    """
+    Get the streaming writer of an output format.
+
+    Parameters
+    ----------
+    output : str or Path
+        Path to the output file.
+
+    output_format : str, optional
+        One of `OUTPUT_FORMATS`.
+        Defaults to `json`.
+
+    Returns
+    -------
+    Writer to be used as a context manager.
+    """
+    writers = {
+        'json': JSONWriter,
+        'ndjson': NDJSONWriter,
+        'npz': NPZWriter,
+        'parquet': ParquetWriter,
+        'hdf5': HDF5Writer,
+        }
+    return writers[output_format](output)
+
+
+def read_matrix(output):
+    """
+    Read results written as a dense matrix.
+
+    Parameters
+    ----------
+    output : str or Path
+        Path to a .NPZ, .PARQUET or .HDF5 output file.
+
+    Returns
+    -------
+    values : np.ndarray
+        Of shape (n_conformers, n_values).
+
+    names : list
+        Conformer names of the rows.
+
+    format : object
+        The format of the module.
+
+    fields : object
+        How each row maps to the values of a conformer.
+    """
+    with open(output, mode='rb') as fin:
+        magic = fin.read(4)
+
+    if magic.startswith(b'PK'):
+        with np.load(output) as npz:
+            values = npz['values']
+            names = npz['names'].tolist()
+            format, fields = str(npz['format']), str(npz['fields'])
+
+    elif magic == b'PAR1':
+        import pyarrow.parquet as pq
+        table = pq.read_table(output)
+        names = table.column('name').to_pylist()
+        values = np.array(
+            [table.column(c).to_numpy() for c in table.column_names[1:]],
+            dtype=np.float64,
+            ).T.reshape(len(names), -1)
+        format = table.schema.metadata[b'format']
+        fields = table.schema.metadata[b'fields']
+
+    else:
+        import h5py
+        with h5py.File(output, mode='r') as fin:
+            values = fin['values'][()]
+            names = fin['names'].asstr()[()].tolist()
+            format, fields = fin.attrs['format'], fin.attrs['fields']
+
+    return values, names, json.loads(format), json.loads(fields)
+
+
+def read_output(output):
+    """
+    Read back results written by any of the writers.
+
+    Parameters
+    ----------
+    output : str or Path
+        Path to the output file.
+
+    Returns
+    -------
+    dict
+        The results by key, in the order they were written.
+    """
+    with open(output, mode='rb') as fin:
+        magic = fin.read(4)
+
+    if magic.startswith((b'PK', b'PAR1', b'\x89HDF')):
+        values, names, format, fields = read_matrix(output)
+        results = {} if format is None else {'format': format}
+        for name, row in zip(names, values.tolist()):
+            if fields == 'scalar':
+                row = row[0]
+            elif fields is not None:
+                ends = np.cumsum([
+                    1 if length is None else length
+                    for _, length in fields
+                    ])
+                row = {
+                    key: row[end - 1] if length is None
+                    else row[end - length:end]
+                    for (key, length), end in zip(fields, ends)
+                    }
+            results[name] = row
+        return results
+
+    with open(output) as fin:
+        first = fin.readline()
+        fin.seek(0)
+        # an NDJSON line is a complete object on its own
+        try:
+            json.loads(first)
+        except json.JSONDecodeError:
+            return json.load(fin)
+
+        results = {}
+        for line in fin:
+            results.update(json.loads(line))
+        return results
+
+
+def get_resumable_writer(output, output_format, pdbs, resume=False):
+    """
+    Get the writer of a run that can be resumed.
+
+    Parameters
+    ----------
+    output : str or Path
+        Path to the output file.
+
+    output_format : str
+        One of `OUTPUT_FORMATS`.
+
+    pdbs : list
+        Paths to all the PDB files of the run, in output order.
+
+    resume : bool, optional
+        Record results in the `<output>.journal` file and skip the
+        PDB files already recorded there by a previous run.
+        Defaults to False, results are written straight to `output`.
+
+    Returns
+    -------
+    writer
+        To be used as a context manager. Call `writer.start` with the
+        file name of each PDB before writing its results.
+
+    list
+        The PDB files left to back-calculate.
+    """
+    if not resume:
+        return get_writer(output, output_format), pdbs
+
+    names = [Path(pdb).name for pdb in pdbs]
+    journal = Journal(f'{output}.journal', output, output_format, names)
+    pending = [pdb for pdb, name in zip(pdbs, names) if name not in journal]
+    return journal, pending
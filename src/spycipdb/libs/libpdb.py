@@ -0,0 +1,96 @@
+"""
+Fast fixed-width readers for PDB atom records.
+
+Conformers from the same ensemble share an identical atom ordering.
+Once a reference topology is known, only the x, y, z columns of each
+conformer need to be read instead of building a full `Structure`.
+"""
+from pathlib import Path
+
+import numpy as np
+
+
+ATOM_RECORDS = (b'ATOM', b'HETATM')
+
+# atom name, altLoc, residue name, chainID, residue number and iCode
+topology_slice = slice(12, 27)
+coords_slices = (slice(30, 38), slice(38, 46), slice(46, 54))
+
+
+def read_atom_lines(pdb):
+    """
+    Read the atom records of a PDB.
+
+    Parameters
+    ----------
+    pdb : str, Path or bytes
+        Path to the PDB file or its content.
+
+    Returns
+    -------
+    list
+        Of ATOM/HETATM lines as bytes.
+    """
+    data = pdb if isinstance(pdb, bytes) else Path(pdb).read_bytes()
+    return [line for line in data.splitlines() if line.startswith(ATOM_RECORDS)]
+
+
+def get_topology(lines):
+    """
+    Get the topology fingerprint of atom records.
+
+    Two conformers with the same fingerprint have the same atoms, in
+    the same order, for the same residues.
+
+    Parameters
+    ----------
+    lines : list
+        Atom records as given by :func:`read_atom_lines`.
+
+    Returns
+    -------
+    bytes
+        The concatenated topology columns of all atoms.
+    """
+    return b''.join(line[topology_slice] for line in lines)
+
+
+def get_coords(lines):
+    """
+    Read the coordinates of atom records.
+
+    Parameters
+    ----------
+    lines : list
+        Atom records as given by :func:`read_atom_lines`.
+
+    Returns
+    -------
+    np.ndarray
+        Shape (n_atoms, 3), float32 as `Structure.coords`.
+    """
+    xyz = [[line[s] for s in coords_slices] for line in lines]
+    return np.array(xyz).astype(np.float32)
+
+
+def set_coords(lines, coords):
+    """
+    Write coordinates into atom records.
+
+    Parameters
+    ----------
+    lines : list
+        Atom records as given by :func:`read_atom_lines`.
+
+    coords : np.ndarray
+        Shape (n_atoms, 3).
+
+    Returns
+    -------
+    list
+        Of the atom records with the new coordinates.
+    """
+    return [
+        line[:30] + b'%8.3f%8.3f%8.3f' % tuple(xyz) + line[54:]
+        for line, xyz in zip(lines, coords)
+        ]
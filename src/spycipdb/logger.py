@@ -111,39 +111,75 @@ def report_on_crash(
     ROC_prefix : str
         The prefix of the report file.
     """
-    ROC_folder = ROC_folder or Path.cwd()
-
     try:
         return func(*args, **kwargs)
 
     except ROC_exception as err:
-        sig = signature(func)
-        s = (
-            '#Recording error for exception: {}\n\n'
-            '#function: {}\n\n'
-            '#signature: {}\n\n'
-            '#Args:\n\n{}\n\n'
-            '#Kwargs:\n\n{}\n\n'
-            '#traceback:\n\n{}\n\n'
-            ).format(
-                ROC_exception,
-                str(func),
-                sig,
-                '\n\n'.join(map(str, args)),
-                '\n\n'.join(map(str, kwargs.items())),
-                traceback.format_exc(),
-                )
-
-        fout_path = Path(
-            ROC_folder,
-            f'{ROC_prefix}_{hash(s)}_{time_ns()}.{ROC_ext}',
+        raise _save_crash_report(
+            func, args, kwargs, ROC_exception, ROC_ext, ROC_folder, ROC_prefix,
+            ) from err
+
+
+async def async_report_on_crash(
+        func,
+        *args,
+        ROC_exception=Exception,
+        ROC_ext='rpr_on_crash',
+        ROC_folder=None,
+        ROC_prefix='ROC',
+        **kwargs,
+        ):
+    """
+    Report to a file upon exception(s) of a coroutine function.
+
+    Awaits `func`, otherwise as :func:`report_on_crash`.
+    """
+    try:
+        return await func(*args, **kwargs)
+
+    except ROC_exception as err:
+        raise _save_crash_report(
+            func, args, kwargs, ROC_exception, ROC_ext, ROC_folder, ROC_prefix,
+            ) from err
+
+
+def _save_crash_report(
+        func,
+        args,
+        kwargs,
+        ROC_exception,
+        ROC_ext,
+        ROC_folder,
+        ROC_prefix,
+        ):
+    """Save the report of the exception being handled."""
+    ROC_folder = ROC_folder or Path.cwd()
+    sig = signature(func)
+    s = (
+        '#Recording error for exception: {}\n\n'
+        '#function: {}\n\n'
+        '#signature: {}\n\n'
+        '#Args:\n\n{}\n\n'
+        '#Kwargs:\n\n{}\n\n'
+        '#traceback:\n\n{}\n\n'
+        ).format(
+            ROC_exception,
+            str(func),
+            sig,
+            '\n\n'.join(map(str, args)),
+            '\n\n'.join(map(str, kwargs.items())),
+            traceback.format_exc(),
             )
-        fout_path.write_text(s)
 
-        log.error(S('saved ERROR REPORT: {}', fout_path))
+    fout_path = Path(
+        ROC_folder,
+        f'{ROC_prefix}_{hash(s)}_{time_ns()}.{ROC_ext}',
+        )
+    fout_path.write_text(s)
+
+    log.error(S('saved ERROR REPORT: {}', fout_path))
 
-        roc_error = ReportOnCrashError(fout_path)
-        raise roc_error from err
+    return ReportOnCrashError(fout_path)
 
 
 def pre_msg(msg, sep=']'):
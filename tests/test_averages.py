@@ -0,0 +1,59 @@
+"""Test streaming ensemble averages."""
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from spycipdb.core.averages import SmFRETAverage, read_weights
+from spycipdb.core.exceptions import SPyCiPDBException
+
+
+def efficiency(r, r0):
+    """FRET efficiency of a distance."""
+    return 1.0 / (1.0 + (r / r0) ** 6)
+
+
+def test_smfret_average():
+    """Test the static and dynamic averages of distances."""
+    r0 = np.array([50.0, 60.0])
+    distances = np.array([[30.0, 45.0], [55.0, 70.0], [80.0, 62.0]])
+    averages = SmFRETAverage()
+    for i, r in enumerate(distances):
+        averages.add(f'conf_{i}.pdb', efficiency(r, r0))
+    
+    result = averages.result()
+    assert result['n_conformers'] == 3
+    assert result['total_weight'] == 3.0
+    assert_allclose(
+        result['static'],
+        efficiency(distances, r0).mean(axis=0),
+        )
+    r_eff = np.mean(distances ** -6.0, axis=0) ** (-1 / 6)
+    assert_allclose(result['dynamic'], efficiency(r_eff, r0))
+    assert_allclose(
+        result['mean_distance'],
+        efficiency(distances.mean(axis=0), r0),
+        )
+
+
+def test_smfret_average_weights(tmp_path):
+    """Test conformers are weighted by name."""
+    fweights = tmp_path / 'weights.csv'
+    fweights.write_text('name,weight\nconf_0.pdb,3\nconf_1,1\n')
+    weights = read_weights(fweights)
+    assert weights == {'conf_0': 3.0, 'conf_1': 1.0}
+    
+    averages = SmFRETAverage(weights)
+    averages.add('conf_0.pdb', [0.2, 0.9])
+    averages.add('conf_1.pdb', [0.6, 0.5])
+    result = averages.result()
+    assert result['total_weight'] == 4.0
+    assert_allclose(result['static'], [0.3, 0.8])
+    
+    with pytest.raises(SPyCiPDBException):
+        averages.add('conf_2.pdb', [0.5, 0.5])
+
+
+def test_smfret_average_empty():
+    """Test averages of no conformers raise."""
+    with pytest.raises(SPyCiPDBException):
+        SmFRETAverage().result()
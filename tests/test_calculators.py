@@ -1,9 +1,33 @@
 """Test internal calculator functions."""
 import json
 
+import numpy as np
+import pandas as pd
+from idpconfgen.libs.libstructure import Structure, col_element, col_name
 from numpy.testing import assert_allclose
+from scipy.spatial import cKDTree
 
-from spycipdb.core.calculators import calc_jc, calc_noe, calc_pre, calc_smfret
+from spycipdb.core.calculators import (
+    calc_av_efficiencies,
+    calc_av_points,
+    calc_dihedrals,
+    calc_jc,
+    calc_jc_values,
+    calc_noe,
+    calc_noe_distances,
+    calc_pre,
+    calc_pre_distances,
+    calc_smfret,
+    calc_smfret_efficiencies,
+    get_av_indices,
+    get_av_model,
+    get_elements,
+    get_jc_indices,
+    get_noe_indices,
+    get_pre_labels,
+    get_smfret_indices,
+    karplus_j,
+    )
 
 from . import (
     asyn_test,
@@ -28,6 +52,32 @@ def test_calc_jc():
         assert_allclose(expected, jc_bc, rtol=1e-5, atol=0)
 
 
+def test_calc_dihedrals():
+    """Test dihedral angles of known geometries."""
+    points = np.array([
+        [[1, 0, 0], [0, 0, 0], [0, 1, 0], [1, 1, 0]],
+        [[1, 0, 0], [0, 0, 0], [0, 1, 0], [0, 1, 1]],
+        [[1, 0, 0], [0, 0, 0], [0, 1, 0], [-1, 1, 0]],
+        ], dtype=np.float64)
+    assert_allclose(
+        np.abs(calc_dihedrals(points)),
+        [0, np.pi / 2, np.pi],
+        atol=1e-12,
+        )
+
+
+def test_calc_jc_values_batch():
+    """Test JC values over a batch of conformers, in hertz."""
+    s = Structure(drk_test)
+    s.build()
+    exp = pd.read_csv(jc_exp_expected)
+    phi_idx = get_jc_indices(exp, s.data_array)
+    single = calc_jc_values(s.coords, phi_idx)
+    batch = calc_jc_values(np.stack([s.coords] * 3), phi_idx, karplus=True)
+    assert batch.shape == (3, exp.shape[0])
+    assert_allclose(batch, np.stack([karplus_j(single)] * 3))
+
+
 def test_calc_noe():
     """Test the internal `calc_noe` module."""
     _pdb, noe_bc = calc_noe(noe_exp_expected, drk_test)
@@ -37,6 +87,18 @@ def test_calc_noe():
         assert_allclose(expected, noe_bc, rtol=1e-5, atol=0)
 
 
+def test_calc_noe_distances_batch():
+    """Test NOE distances over a batch of conformers."""
+    s = Structure(drk_test)
+    s.build()
+    exp = pd.read_csv(noe_exp_expected)
+    idx1, idx2, starts = get_noe_indices(exp, s.data_array)
+    single = calc_noe_distances(s.coords, idx1, idx2, starts)
+    batch = calc_noe_distances(np.stack([s.coords] * 3), idx1, idx2, starts)
+    assert batch.shape == (3, exp.shape[0])
+    assert_allclose(batch, np.stack([single] * 3))
+
+
 def test_calc_pre():
     """Test the internal `calc_pre` module."""
     _pdb, pre_bc = calc_pre(pre_exp_expected, drk_test)
@@ -46,6 +108,25 @@ def test_calc_pre():
         assert_allclose(expected, pre_bc, rtol=1e-5, atol=0)
 
 
+def test_calc_pre_distances_labels():
+    """Test label-centric PRE distances keep the template order."""
+    rng = np.random.default_rng(0)
+    coords = rng.normal(scale=20.0, size=(3, 50, 3)).astype(np.float32)
+    idx1 = np.array([7, 3, 7, 7, 12, 7, 3, 7])
+    idx2 = np.array([1, 9, 20, 30, 40, 2, 5, 49])
+    
+    labels = get_pre_labels(idx1, idx2)
+    assert [label.tolist() for _, label, _ in labels] == [[7], [3, 12, 3]]
+    
+    dv = (coords[:, idx1] - coords[:, idx2]).astype(np.float64)
+    expected = np.sqrt(np.sum(dv * dv, axis=-1))
+    assert np.array_equal(calc_pre_distances(coords, idx1, idx2), expected)
+    assert np.array_equal(
+        calc_pre_distances(coords[1], idx1, idx2, labels),
+        expected[1],
+        )
+
+
 def test_calc_smfret():
     """Test the internal `calc_smfret` module."""
     _pdb, fret_bc = calc_smfret(fret_exp_expected, asyn_test)
@@ -53,3 +134,73 @@ def test_calc_smfret():
         loadedf = json.load(f)
         expected = list(loadedf.values())[0]
         assert_allclose(expected, fret_bc, rtol=1e-5, atol=0)
+
+
+def test_calc_smfret_efficiencies_batch():
+    """Test smFRET efficiencies over a batch of conformers."""
+    s = Structure(asyn_test)
+    s.build()
+    exp = pd.read_csv(fret_exp_expected)
+    idx1, idx2, scale_factors = get_smfret_indices(exp, s.data_array)
+    r0 = exp.scale.values
+    
+    coords = np.stack([s.coords, s.coords * 1.01, s.coords * 0.99])
+    batch = calc_smfret_efficiencies(coords, idx1, idx2, scale_factors, r0)
+    assert batch.shape == (3, exp.shape[0])
+    for xyz, efficiencies in zip(coords, batch):
+        dv = (xyz[idx1] - xyz[idx2]).astype(np.float64)
+        d = np.linalg.norm(dv, axis=-1) * scale_factors
+        assert_allclose(efficiencies, 1.0 / (1.0 + (d / r0) ** 6.0))
+
+
+def test_calc_av_points():
+    """Test dye positions clashing with atoms are masked out."""
+    model = get_av_model(linker_length=5.0, dye_radius=1.0, atom_radius=1.0)
+    site = np.array([10.0, 10.0, 10.0])
+    assert_allclose(model.grid.data.min(axis=0), [-5, -5, -5])
+    
+    coords = np.array([[10.0, 10.0, 10.0], [13.0, 10.0, 10.0]])
+    tree = cKDTree(coords)
+    free = calc_av_points(coords, tree, site, model, ignore=[0])
+    assert len(free) < model.grid.n
+    assert np.all(np.linalg.norm(free - coords[1], axis=1) > 2.0)
+    assert np.all(np.linalg.norm(free - site, axis=1) <= 5.0)
+    
+    assert len(calc_av_points(coords, tree, site, model, [0, 1])) \
+        == model.grid.n
+    
+    # no accessible position, the dye sits on the attachment atom
+    buried = get_av_model(linker_length=2.0, dye_radius=2.0, atom_radius=1.0)
+    assert_allclose(calc_av_points(coords, tree, site, buried), [site])
+
+
+def test_get_elements():
+    """Test hydrogens with digit-prefixed names are not heavy atoms."""
+    s = Structure(drk_test)
+    s.build()
+    data_array = s.data_array[:4].copy()
+    data_array[:, col_name] = ['N', 'CA', '1HB', 'HG12']
+    data_array[:, col_element] = ['N', 'C', 'H', '']
+    assert get_elements(data_array).tolist() == ['N', 'C', 'H', 'H']
+    data_array[:, col_element] = ''
+    assert get_elements(data_array).tolist() == ['N', 'C', 'H', 'H']
+
+
+def test_calc_av_efficiencies():
+    """Test AV efficiencies are reproducible and follow distances."""
+    s = Structure(asyn_test)
+    s.build()
+    exp = pd.read_csv(fret_exp_expected)
+    idx1, idx2, clash_idx, ignore = get_av_indices(exp, s.data_array)
+    assert set(ignore) == set(idx1) | set(idx2)
+    
+    model = get_av_model(spacing=2.0, n_samples=2000)
+    r0 = np.full(len(idx1), 54.0)
+    args = (idx1, idx2, r0, clash_idx, ignore, model)
+    efficiencies = calc_av_efficiencies(s.coords, *args)
+    assert efficiencies.shape == (exp.shape[0],)
+    assert np.all((efficiencies > 0) & (efficiencies < 1))
+    assert_allclose(calc_av_efficiencies(s.coords, *args), efficiencies)
+    
+    d = np.linalg.norm(s.coords[idx1] - s.coords[idx2], axis=-1)
+    assert efficiencies[np.argmin(d)] > efficiencies[np.argmax(d)]
@@ -1,14 +1,37 @@
 """Test internal spycipdb client interfaces."""
 import inspect
+import json
+import os
+import shutil
+import sys
+import types
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
 import pytest
 
 # import bellow by alphabetical order the cli interfaces implemented
-from spycipdb.clis import cli_jc, cli_noe, cli_pre, cli_smfret
+from spycipdb.clis import (
+    cli_all,
+    cli_cs,
+    cli_jc,
+    cli_noe,
+    cli_pack,
+    cli_pre,
+    cli_rdc,
+    cli_saxs,
+    cli_smfret,
+    )
+from spycipdb.components import helpers
+from spycipdb.core.exceptions import ReportOnCrashError, SPyCiPDBException
+from spycipdb.libs.libensemble import is_ensemble, load_ensemble
+from spycipdb.libs.liboutput import read_output
 
 from . import (
+    asyn_test,
     asyn_test_tar,
+    drk_test,
     drk_test_tar,
     fret_exp_expected,
     jc_exp_expected,
@@ -19,8 +42,10 @@ from . import (
 
 subclients = [
     # add your new client to this list.
+    cli_all,
     cli_jc,
     cli_noe,
+    cli_pack,
     cli_pre,
     cli_smfret,
     ]
@@ -61,8 +86,10 @@ def test_clients_if_main_code(client):
         # add here the name of your client, this ensures that changes
         # in the command interface get noticed by the tests.
         # (cli_NAME, 'NAME'),
+        (cli_all, 'all'),
         (cli_jc, 'jc'),
         (cli_noe, 'noe'),
+        (cli_pack, 'pack'),
         (cli_pre, 'pre'),
         (cli_smfret, 'smfret'),
         ],
@@ -72,6 +99,13 @@ def test_cli__name(module, name):
     assert module._name == name
 
 
+@pytest.mark.parametrize('module', [cli_jc, cli_noe, cli_smfret])
+def test_cli_deprecated_tmpdir(module):
+    """Test command lines with --tmpdir are still accepted."""
+    args = module.ap.parse_args(['conf.tar', '-e', 'exp.txt', '--tmpdir', 'x'])
+    assert args.tmpdir == 'x'
+
+
 # tox -e test hanging up after trying to read paths...
 def test_cli_jc():
     """Test jc module."""
@@ -156,3 +190,272 @@ def test_cli_smfret():
     debug.unlink()
     error.unlink()
     log.unlink()
+
+
+def test_cli_smfret_av(tmp_path):
+    """Test smfret module with accessible-volume dyes."""
+    output = tmp_path / 'fret_av.json'
+    cli_smfret.main(
+        str(asyn_test_tar),
+        str(fret_exp_expected),
+        output=str(output),
+        method='av',
+        )
+    results = json.loads(output.read_text())
+    assert list(results) == ['format', 'asyn_conf']
+    assert len(results['asyn_conf']) == len(results['format']['res1'])
+    for f in Path('.').glob('.spycipdb_smfret.*'):
+        f.unlink()
+
+
+def test_cli_smfret_average(tmp_path):
+    """Test smfret module saves ensemble averages."""
+    fweights = tmp_path / 'weights.csv'
+    fweights.write_text('name,weight\nasyn_conf.pdb,2\n')
+    average = tmp_path / 'fret_average.json'
+    cli_smfret.main(
+        str(asyn_test_tar),
+        str(fret_exp_expected),
+        output=str(tmp_path / 'fret.json'),
+        average=average,
+        weights=fweights,
+        )
+    results = json.loads((tmp_path / 'fret.json').read_text())
+    averages = json.loads(average.read_text())
+    assert averages['format'] == results['format']
+    assert averages['n_conformers'] == 1
+    assert averages['total_weight'] == 2.0
+    assert averages['static'] == pytest.approx(results['asyn_conf'])
+    assert averages['dynamic'] == pytest.approx(results['asyn_conf'])
+    for f in Path('.').glob('.spycipdb_smfret.*'):
+        f.unlink()
+
+
+@pytest.fixture
+def pdb_folder(tmp_path, monkeypatch):
+    """Folder of two conformers, with the CWD in a scratch folder."""
+    pdbs = tmp_path / 'pdbs'
+    pdbs.mkdir()
+    for name in ('conf_1.pdb', 'conf_2.pdb'):
+        shutil.copy(drk_test, pdbs / name)
+    workdir = tmp_path / 'run'
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    return pdbs
+
+
+def assert_one_format(output, output_format, names):
+    """Test the format is written once, before the conformers."""
+    results = read_output(output)
+    assert list(results) == ['format'] + names
+    if output_format == 'ndjson':
+        lines = output.read_text().splitlines()
+        assert [list(json.loads(line))[0] for line in lines] == \
+            ['format'] + names
+
+
+def ucbshift(pdb, pH=5):
+    """Mock UCBShift predictions of a conformer."""
+    shifts = pd.DataFrame({
+        'RESNUM': [1, 2],
+        'RESNAME': ['MET', 'GLU'],
+        **{
+            f'{atom}_UCBShift': [1.0, 2.0]
+            for atom in ('H', 'HA', 'C', 'CA', 'CB', 'N')
+            },
+        })
+    return Path(pdb).name, shifts
+
+
+@pytest.mark.parametrize('output_format', ['json', 'ndjson'])
+def test_cli_cs(pdb_folder, monkeypatch, output_format):
+    """Test cs module writes the format once."""
+    monkeypatch.setattr(cli_cs, 'calc_sing_pdb', ucbshift, raising=False)
+    output = pdb_folder.parent / f'cs.{output_format}'
+    cli_cs.main(str(pdb_folder), output, output_format=output_format)
+    assert_one_format(output, output_format, ['conf_1.pdb', 'conf_2.pdb'])
+
+
+@pytest.mark.parametrize('cached', [True, False])
+def test_cli_cs_ram_warning(pdb_folder, monkeypatch, caplog, cached):
+    """Test the RAM warning is dropped only when models are shared."""
+    monkeypatch.setattr(cli_cs, 'calc_sing_pdb', ucbshift, raising=False)
+    cspred = types.ModuleType('CSpred')
+    if cached:
+        cspred.load = ucbshift
+    monkeypatch.setitem(sys.modules, 'CSpred', cspred)
+    output = pdb_folder.parent / 'cs.json'
+    cli_cs.main(str(pdb_folder), output, ncores=5)
+    assert ('RAM hungry' in caplog.text) is not cached
+
+
+@pytest.mark.parametrize('output_format', ['json', 'ndjson'])
+def test_cli_rdc(pdb_folder, monkeypatch, output_format):
+    """Test rdc module writes the format once."""
+    pales = pdb_folder.parent / 'pales'
+    pales.write_text(
+        '#!/bin/sh\n'
+        'echo "    3   GLU     N     3   GLU    HN  0 0 -1.2 1 1" > "$6"\n'
+        )
+    pales.chmod(0o755)
+    monkeypatch.setattr(helpers, 'PALES_FP', str(pales))
+    output = pdb_folder.parent / f'rdc.{output_format}'
+    cli_rdc.main(
+        str(pdb_folder),
+        'exp.tbl',
+        output,
+        output_format=output_format,
+        )
+    assert_one_format(output, output_format, ['conf_1.pdb', 'conf_2.pdb'])
+
+
+def test_cli_rdc_pales_fails(pdb_folder, monkeypatch):
+    """Test a failed PALES run is reported with its error."""
+    pales = pdb_folder.parent / 'pales'
+    pales.write_text('#!/bin/sh\necho "cannot read exp.tbl" >&2\nexit 1\n')
+    pales.chmod(0o755)
+    monkeypatch.setattr(helpers, 'PALES_FP', str(pales))
+    with pytest.raises(ReportOnCrashError) as err:
+        cli_rdc.main(str(pdb_folder), 'exp.tbl', pdb_folder.parent / 'rdc')
+    assert 'cannot read exp.tbl' in str(err.value.__cause__)
+    assert len(list(Path.cwd().glob('*.rpr_on_crash'))) == 1
+
+
+@pytest.mark.parametrize('output_format', ['json', 'ndjson'])
+def test_cli_saxs(pdb_folder, monkeypatch, output_format):
+    """Test saxs module writes the format once."""
+    bindir = pdb_folder.parent / 'bin'
+    bindir.mkdir()
+    crysol = bindir / 'crysol'
+    crysol.write_text(
+        '#!/bin/sh\n'
+        '[ "$1" = "-h" ] && exit 0\n'
+        'printf " Dat columns\\n 0.0 0.25\\n 0.01 0.24\\n" '
+        '> "$(basename "$1" .pdb).abs"\n'
+        )
+    crysol.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bindir}{os.pathsep}{os.environ["PATH"]}')
+    output = pdb_folder.parent / f'saxs.{output_format}'
+    cli_saxs.main(str(pdb_folder), output, output_format=output_format)
+    assert_one_format(output, output_format, ['conf_1.pdb', 'conf_2.pdb'])
+
+
+def test_cli_pack():
+    """Test pack module and back-calculating from a packed ensemble."""
+    cli_pack.main(str(drk_test_tar), output='packed_test')
+    packed = Path('packed_test')
+    assert Path(packed, 'coords.npy').exists()
+    assert Path(packed, 'topology.pdb').exists()
+    assert Path(packed, 'names.txt').exists()
+    
+    cli_noe.main(
+        [str(packed)],
+        str(noe_exp_expected),
+        output='noe_packed_output.json',
+        )
+    o = Path('noe_packed_output.json')
+    with open(o) as fin:
+        assert 'drksh3_conf' in json.load(fin)
+    
+    o.unlink()
+    shutil.rmtree(packed)
+    for ext in ('debug', 'error', 'log'):
+        Path(f'.spycipdb_pack.{ext}').unlink()
+        Path(f'.spycipdb_noe.{ext}').unlink()
+
+
+def test_cli_pack_topology_mismatch(tmp_path):
+    """Test a failed pack only removes the files of the ensemble."""
+    pdbs = tmp_path / 'pdbs'
+    pdbs.mkdir()
+    shutil.copy(drk_test, pdbs / 'conf_1.pdb')
+    shutil.copy(asyn_test, pdbs / 'conf_2.pdb')
+    output = tmp_path / 'packed'
+    output.mkdir()
+    (output / 'notes.txt').write_text('keep me')
+    
+    with pytest.raises(SPyCiPDBException):
+        cli_pack.main(str(pdbs), output=output)
+    assert [f.name for f in output.iterdir()] == ['notes.txt']
+    for ext in ('debug', 'error', 'log'):
+        Path(f'.spycipdb_pack.{ext}').unlink()
+
+
+def test_cli_pack_parse_error(tmp_path, monkeypatch):
+    """Test a conformer that fails to parse leaves no ensemble behind."""
+    monkeypatch.chdir(tmp_path)
+    pdbs = tmp_path / 'pdbs'
+    pdbs.mkdir()
+    shutil.copy(drk_test, pdbs / 'a.pdb')
+    lines = Path(drk_test).read_text().splitlines(keepends=True)
+    i = next(i for i, line in enumerate(lines) if line.startswith('ATOM'))
+    lines[i] = lines[i][:30] + 'xxxxxxxx' + lines[i][38:]
+    (pdbs / 'b.pdb').write_text(''.join(lines))
+    output = tmp_path / 'packed'
+    
+    with pytest.raises(ReportOnCrashError):
+        cli_pack.main(str(pdbs), output=output)
+    assert not output.exists()
+    assert not is_ensemble(output)
+
+
+def test_cli_pack_names_with_spaces(tmp_path, monkeypatch):
+    """Test conformer names with spaces survive packing."""
+    monkeypatch.chdir(tmp_path)
+    pdbs = tmp_path / 'pdbs'
+    pdbs.mkdir()
+    shutil.copy(drk_test, pdbs / 'conf 1.pdb')
+    shutil.copy(drk_test, pdbs / 'conf 2.pdb')
+    output = tmp_path / 'packed'
+    
+    cli_pack.main(str(pdbs), output=output)
+    ensemble = load_ensemble(output)
+    assert [n.name for n in ensemble.names] == ['conf 1.pdb', 'conf 2.pdb']
+    assert ensemble.coords.shape[0] == 2
+
+
+def assert_same_results(output, expected):
+    """Test two outputs hold the same format and values."""
+    results = read_output(output)
+    expected = read_output(expected)
+    assert list(results) == list(expected)
+    assert results['format'] == expected['format']
+    for name in expected:
+        if name != 'format':
+            np.testing.assert_allclose(results[name], expected[name])
+
+
+def test_cli_all():
+    """Test all module against the individual modules."""
+    cli_all.main(
+        str(drk_test_tar),
+        output='all_output',
+        noe=str(noe_exp_expected),
+        jc=str(jc_exp_expected),
+        )
+    cli_noe.main(
+        str(drk_test_tar),
+        str(noe_exp_expected),
+        output='noe_output.json',
+        )
+    cli_jc.main(
+        str(drk_test_tar),
+        str(jc_exp_expected),
+        output='jc_output.json',
+        )
+    assert_same_results('all_output_noe.json', 'noe_output.json')
+    assert_same_results('all_output_jc.json', 'jc_output.json')
+    assert not Path('all_output_pre.json').exists()
+    
+    outputs = (
+        'all_output_noe.json',
+        'all_output_jc.json',
+        'noe_output.json',
+        'jc_output.json',
+        )
+    for o in outputs:
+        Path(o).unlink()
+    for ext in ('debug', 'error', 'log'):
+        Path(f'.spycipdb_all.{ext}').unlink()
+        Path(f'.spycipdb_noe.{ext}').unlink()
+        Path(f'.spycipdb_jc.{ext}').unlink()
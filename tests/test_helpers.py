@@ -0,0 +1,157 @@
+"""Test helpers of third-party programs."""
+import sys
+import types
+
+import pytest
+from numpy.testing import assert_array_equal
+
+from spycipdb.components import helpers
+from spycipdb.components.helpers import (
+    keep_ucbshift_warm,
+    load_once,
+    read_crysol_output,
+    read_pales_layout,
+    read_pales_values,
+    )
+
+from . import drk_test
+
+
+PALES_OUT = """\
+REMARK Orientational Statistics, Dipolar Couplings.
+
+DATA SEQUENCE MEAQKLISEE DLNSAVEQLL
+
+VARS   RESID_I RESNAME_I ATOMNAME_I RESID_J RESNAME_J ATOMNAME_J DI D_OBS D DD W
+FORMAT %5d %6s %6s %5d %6s %6s %9.2f %9.3f %9.3f %.2f %.2f
+
+    3   GLU     N     3   GLU    HN  -21585.19     5.400    -1.234 1.00 1.00
+    4   ALA     N     4   ALA    HN  -21585.19    -2.100     0.567 1.00 1.00
+   10   LEU     N    10   LEU    HN  -21585.19     1.000     2.000 1.00 1.00
+"""
+
+
+def test_load_once(tmp_path):
+    """Test models are loaded once per file."""
+    calls = []
+
+    def load(filename, mmap_mode=None):
+        calls.append(filename)
+        return object()
+
+    model = tmp_path / 'H_R0.sav'
+    other = tmp_path / 'N_R0.sav'
+    for f in (model, other):
+        f.touch()
+
+    loader = load_once(load)
+    assert loader(str(model)) is loader(model)
+    assert loader(other) is not loader(model)
+    assert len(calls) == 2
+
+    # calls with other arguments are passed through
+    loader(model, mmap_mode='r')
+    assert len(calls) == 3
+
+    # the least recently used model is released
+    loader = load_once(load, maxsize=1)
+    loader(model)
+    loader(other)
+    loader(model)
+    assert len(calls) == 6
+
+
+def test_keep_ucbshift_warm(monkeypatch):
+    """Test only the loader of CSpred is memoized."""
+    calls = []
+
+    def load(filename):
+        calls.append(filename)
+        return object()
+
+    cspred = types.ModuleType('CSpred')
+    cspred.load = load
+    monkeypatch.setitem(sys.modules, 'CSpred', cspred)
+    
+    assert keep_ucbshift_warm()
+    assert keep_ucbshift_warm()
+    assert cspred.load('H_R0.sav') is cspred.load('H_R0.sav')
+    assert len(calls) == 1
+    assert cspred.load.__wrapped__ is load
+
+
+def test_keep_ucbshift_warm_missing(monkeypatch, caplog):
+    """Test a warning is logged when the loader cannot be cached."""
+    monkeypatch.setitem(sys.modules, 'CSpred', types.ModuleType('CSpred'))
+    assert not keep_ucbshift_warm()
+    assert 'model loader of UCBShift' in caplog.text
+
+
+def test_keep_ucbshift_warm_cspred(monkeypatch):
+    """Test a real UCBShift prediction reuses the loaded models."""
+    cspred = pytest.importorskip('CSpred')
+    calls = []
+    
+    def load(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+    
+    original = cspred.load
+    monkeypatch.setattr(cspred, 'load', load)
+    assert keep_ucbshift_warm()
+    cspred.calc_sing_pdb(str(drk_test), pH=5)
+    n_loads = len(calls)
+    assert n_loads > 0
+    cspred.calc_sing_pdb(str(drk_test), pH=5)
+    assert len(calls) == n_loads
+
+
+def test_pales_helper_scratch(tmp_path, monkeypatch):
+    """Test PALES runs in a scratch directory outside the CWD."""
+    pales = tmp_path / 'pales'
+    pales.write_text(
+        '#!/bin/sh\n'
+        'pwd > "$6"\n'
+        'echo "   5 ASP N    5 ASP HN  0 0 -1.5" >> "$6"\n'
+        )
+    pales.chmod(0o755)
+    monkeypatch.setattr(helpers, 'PALES_FP', str(pales))
+    
+    workdir = tmp_path / 'run'
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    
+    format, name, rdc_bc = helpers.pales_helper('exp.tbl', '/data/conf_1.pdb')
+    assert name == 'conf_1.pdb'
+    assert rdc_bc.tolist() == [-1.5]
+    assert format['atomname2'] == ['HN']
+    assert not list(workdir.iterdir())
+
+
+def test_read_pales_output(tmp_path):
+    """Test the atom pairs and RDCs of a PALES output."""
+    outpath = tmp_path / 'conf_1.pdb.txt'
+    outpath.write_text(PALES_OUT)
+    
+    layout = read_pales_layout(outpath)
+    assert layout.format['resnum1'] == [3, 4, 10]
+    assert layout.format['resname2'] == ['GLU', 'ALA', 'LEU']
+    assert layout.format['atomname2'] == ['HN', 'HN', 'HN']
+    assert_array_equal(read_pales_values(outpath, layout), [-1.234, 0.567, 2.0])
+
+
+def test_read_crysol_output(tmp_path):
+    """Test the scattering curve of a CRYSOL .abs file."""
+    abs_path = tmp_path / 'conf_1.abs'
+    abs_path.write_text(
+        ' Dat columns: s, I_abs(s)[cm^-1]/c[mg/ml]\n'
+        '  0.000000E+00  0.253300E+00\n'
+        '  0.100000E-01  0.250100E+00\n'
+        )
+    
+    saxs_bc = read_crysol_output(abs_path)
+    assert_array_equal(saxs_bc['index'], [0.0, 0.01])
+    assert_array_equal(saxs_bc['value'], [0.2533, 0.2501])
+    
+    index = saxs_bc['index']
+    assert read_crysol_output(abs_path, index)['index'] is index
@@ -0,0 +1,143 @@
+"""Test the HullRad components."""
+import io
+
+import numpy as np
+import pytest
+from idpconfgen.libs.libstructure import Structure
+from numpy.testing import assert_allclose, assert_array_equal
+
+from spycipdb.components.helpers import calc_hullrad_rh, hullrad_helper
+from spycipdb.components.hullrad import (
+    HullVolume,
+    ShrakeRupley,
+    Sved,
+    max_distance,
+    mesh_from_pdb,
+    )
+from spycipdb.components.hullrad_arrays import (
+    HULLRAD_PROPERTIES,
+    calc_hullrad,
+    calc_hullrad_properties,
+    read_hullrad_atoms,
+    )
+from spycipdb.core.exceptions import SPyCiPDBException
+
+from . import asyn_test, drk_test
+
+
+def brute_force_sasa(sr, coords):
+    """Calculate reference SAS points one atom at a time."""
+    radii = np.full(len(coords), 2.0 + sr.probe_radius)
+    mesh_coords = []
+    asa = []
+    for i, r_i in enumerate(radii):
+        s_on_i = sr._sphere * r_i + coords[i]
+        buried = np.zeros(sr.n_points, dtype=bool)
+        for j, r_j in enumerate(radii):
+            dist = np.sqrt(np.sum((coords[i] - coords[j]) ** 2))
+            if i != j and dist < r_i + r_j:
+                buried |= np.sum((coords[j] - s_on_i) ** 2, axis=1) <= r_j ** 2
+        mesh_coords.extend(s_on_i[~buried])
+        asa.append(np.sum(~buried) * r_i * r_i * 4 * np.pi / sr.n_points)
+    return np.array(mesh_coords), sum(asa)
+
+
+def test_shrake_rupley():
+    """Test vectorized SAS points against a per-atom reference."""
+    s = Structure(drk_test)
+    s.build()
+    coords = s.coords[:300].astype(np.float64)
+    sr = ShrakeRupley(probe_radius=0.6, n_points=10)
+
+    mesh_coords, tot_asa = sr.compute(len(coords), coords)
+    expected_mesh, expected_asa = brute_force_sasa(sr, coords)
+
+    assert_array_equal(mesh_coords, expected_mesh)
+    assert_allclose(tot_asa, expected_asa)
+
+
+def test_mesh_opt_in(tmp_path, monkeypatch):
+    """Test the SAS points are only written when requested."""
+    monkeypatch.chdir(tmp_path)
+    rh = calc_hullrad_rh(str(drk_test))
+    assert not list(tmp_path.iterdir())
+
+    mesh = io.StringIO()
+    assert calc_hullrad_rh(str(drk_test), mesh) == rh
+    mesh_coords = mesh_from_pdb(str(drk_test))[6]
+    lines = mesh.getvalue().splitlines()
+    assert len(lines) == len(mesh_coords)
+    assert_allclose(
+        [[float(line[30:38]), float(line[38:46]), float(line[46:54])]
+         for line in lines],
+        mesh_coords,
+        atol=5e-4,
+        )
+
+    name, rh_file = hullrad_helper(str(drk_test), mesh_dir=tmp_path)
+    assert (name, rh_file) == (drk_test.name, rh)
+    assert (tmp_path / 'drksh3_conf_mesh.pdb').read_text() == mesh.getvalue()
+
+
+@pytest.mark.parametrize('pdb', [drk_test, asyn_test])
+def test_calc_hullrad(pdb):
+    """Test the array pipeline against the original HullRadSAS."""
+    expected = Sved(*mesh_from_pdb(str(pdb)))
+    result = calc_hullrad(pdb)
+    assert result[4] == expected[4]
+    assert_allclose(result, expected, rtol=1e-12)
+    assert calc_hullrad(pdb.read_bytes())[4] == expected[4]
+    assert calc_hullrad(pdb.read_text().splitlines())[4] == expected[4]
+
+
+def test_calc_hullrad_fallback():
+    """Test structures with ions use the original HullRadSAS."""
+    lines = drk_test.read_text().splitlines()
+    lines.append(
+        'HETATM  942 MG    MG A  60      10.000  10.000  10.000'
+        '  1.00  0.00          MG'
+        )
+    assert read_hullrad_atoms(lines) is None
+    assert calc_hullrad(lines) == Sved(*mesh_from_pdb(lines))
+
+
+def test_read_hullrad_atoms_missing_backbone():
+    """Test a residue missing a backbone atom raises."""
+    lines = [
+        line
+        for line in drk_test.read_text().splitlines()
+        if not (line[13:15] == 'O ' and line[22:26] == '   5')
+        ]
+    with pytest.raises(SPyCiPDBException):
+        read_hullrad_atoms(lines)
+
+
+def test_max_distance():
+    """Test Dmax against all pairs of points."""
+    rng = np.random.default_rng(0)
+    points = rng.normal(scale=20.0, size=(600, 3))
+    expected = max(
+        np.sqrt(np.sum((p - points) ** 2, axis=1)).max()
+        for p in points
+        )
+    assert max_distance(points) == expected
+    assert max_distance(points, chunk=7) == expected
+    assert HullVolume(points)[2] == expected
+
+
+def test_hullrad_helper_dmax():
+    """Test Dmax is output along Rh when requested."""
+    name, rh = hullrad_helper(str(drk_test))
+    _, values = hullrad_helper(str(drk_test), dmax=True)
+    properties = calc_hullrad(drk_test)
+    assert values == {'rh': rh, 'dmax': properties[14]}
+
+
+def test_hullrad_helper_properties():
+    """Test all properties are output from a single calculation."""
+    expected = Sved(*mesh_from_pdb(str(drk_test)))
+    _, values = hullrad_helper(str(drk_test), properties=True)
+    assert list(values) == list(HULLRAD_PROPERTIES)
+    for name, index in HULLRAD_PROPERTIES.items():
+        assert_allclose(values[name], expected[index], rtol=1e-12)
+    assert values == calc_hullrad_properties(drk_test)
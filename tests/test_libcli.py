@@ -100,10 +100,14 @@ def test_add_version():
         (libcli.add_argument_ncores, ['-n'], ['ncores', os.cpu_count() - 1]),
         (libcli.add_argument_output, ['-o', 'out.json'], ['output', 'out.json']),  # noqa: E501
         (libcli.add_argument_output, ['--output', 'out.json'], ['output', 'out.json']),  # noqa: E501
+        (libcli.add_argument_output_format, [], ['output_format', 'json']),
+        (libcli.add_argument_output_format, ['--output-format', 'ndjson'], ['output_format', 'ndjson']),  # noqa: E501
         (libcli.add_argument_pdb_files, ['myfolder'], ['pdb_files', ['myfolder']]),  # noqa: E501
         (libcli.add_argument_pdb_files, ['my.tar'], ['pdb_files', 'my.tar']),
         (libcli.add_argument_exp_file, ['-e', 'my.txt'], ['exp_file', 'my.txt']),  # noqa: E501
         (libcli.add_argument_exp_file, ['--exp-file', 'my.txt'], ['exp_file', 'my.txt']),  # noqa: E501
+        (libcli.add_argument_deprecated_tmpdir, [], ['tmpdir', None]),
+        (libcli.add_argument_deprecated_tmpdir, ['--tmpdir', 'tmp'], ['tmpdir', 'tmp']),  # noqa: E501
         ]
     )
 def test_add_arguments(func, parsing, expected):
@@ -1,8 +1,11 @@
 """Test libfuncs."""
 from math import isclose
+from pathlib import Path
 
 from spycipdb.libs import libfuncs
 
+from . import drk_test, drk_test_tar
+
 
 def test_get_scalar():
     """Test get scalar function."""
@@ -11,3 +14,37 @@ def test_get_scalar():
     
     assert isclose(scalar_pve, 0.37416, abs_tol=1e-5)
     assert isclose(scalar_nve, 0.37416, abs_tol=1e-5)
+
+
+def test_iter_tar_pdbs():
+    """Test streaming PDBs out of a tarball."""
+    members = list(libfuncs.iter_tar_pdbs(drk_test_tar))
+    assert len(members) == 1
+    name, data = members[0]
+    assert name == Path('drksh3_conf.pdb')
+    assert data == drk_test.read_bytes()
+
+
+def test_get_plan_inputs_tarball():
+    """Test tarballs are streamed without a temporary directory."""
+    items, reference, ensemble = libfuncs.get_plan_inputs(str(drk_test_tar))
+    assert ensemble is None
+    assert reference[0] == Path('drksh3_conf.pdb')
+    assert list(items) == [reference]
+
+
+def test_scratch_dir():
+    """Test scratch directories are private and removed on exit."""
+    with libfuncs.scratch_dir() as tmpdir, libfuncs.scratch_dir() as other:
+        assert tmpdir != other
+        assert tmpdir.is_dir()
+        (tmpdir / 'conf.pdb.txt').write_text('out')
+    assert not tmpdir.exists()
+    
+    try:
+        with libfuncs.scratch_dir() as tmpdir:
+            (tmpdir / 'conf.abs').write_text('out')
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert not tmpdir.exists()
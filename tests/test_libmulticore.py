@@ -0,0 +1,78 @@
+"""Test multiprocessing operations."""
+import asyncio
+
+import pytest
+
+from spycipdb.core.exceptions import SPyCiPDBException
+from spycipdb.libs.libmulticore import (
+    async_pool_function,
+    pool_function,
+    run_program,
+    )
+
+
+def _square(x):
+    return x ** 2
+
+
+@pytest.mark.parametrize('prefetch', [None, 1, 3])
+def test_pool_function(prefetch):
+    """Test results are in the order of items."""
+    items = (i for i in range(20))
+    results = list(pool_function(_square, items, ncores=2, prefetch=prefetch))
+    assert results == [i ** 2 for i in range(20)]
+
+
+def test_pool_function_stop_early():
+    """Test the pool terminates when results are not fully consumed."""
+    results = pool_function(_square, iter(range(100)), ncores=2, prefetch=2)
+    assert next(results) == 0
+    results.close()
+
+
+def test_async_pool_function():
+    """Test coroutines are bounded by ncores and yielded in order."""
+    running = []
+    peak = []
+
+    async def job(i):
+        running.append(i)
+        peak.append(len(running))
+        await asyncio.sleep(0.01 * (i % 3))
+        running.remove(i)
+        return i ** 2
+
+    results = list(async_pool_function(job, iter(range(20)), ncores=3))
+    assert results == [i ** 2 for i in range(20)]
+    assert max(peak) == 3
+
+
+def test_async_pool_function_stop_early():
+    """Test pending calls are cancelled when results are not consumed."""
+    started = []
+
+    async def job(i):
+        started.append(i)
+        await asyncio.sleep(0.01)
+        return i
+
+    results = async_pool_function(job, iter(range(100)), ncores=2, prefetch=4)
+    assert next(results) == 0
+    results.close()
+    assert len(started) <= 4
+
+
+def test_run_program(tmp_path):
+    """Test programs run without a shell in their working directory."""
+    asyncio.run(run_program(['sh', '-c', 'touch out.txt'], cwd=tmp_path))
+    assert (tmp_path / 'out.txt').exists()
+
+
+def test_run_program_fails(tmp_path):
+    """Test a failed program raises with its standard error."""
+    with pytest.raises(SPyCiPDBException) as err:
+        asyncio.run(run_program(
+            ['sh', '-c', 'echo "bad input" >&2; exit 3'],
+            cwd=tmp_path,
+            ))
+    assert 'exited with code 3: bad input' in str(err.value)
@@ -0,0 +1,177 @@
+"""Test streaming output writers."""
+import json
+from pathlib import Path
+
+import pytest
+
+from spycipdb.libs.liboutput import (
+    MatrixWriter,
+    get_resumable_writer,
+    get_writer,
+    read_matrix,
+    read_output,
+    )
+
+
+# optional dependencies of the output formats
+requires = {'parquet': 'pyarrow', 'hdf5': 'h5py'}
+
+results = {
+    'format': {'res1': [1, 2], 'atom1': ['H', 'CA']},
+    'conf_1': [1.5, 2.25],
+    'conf_2': {'H': [8.1], 'N': []},
+    }
+
+# matrix formats require the same number of values for all conformers
+matrix_results = {
+    'format': {'res1': [1, 2], 'atom1': ['H', 'CA']},
+    'conf_1': [1.5, 2.25],
+    'conf_2': [3.0, 4.5],
+    }
+
+
+@pytest.mark.parametrize('output_format', ['json', 'ndjson'])
+def test_writers_read_output(tmp_path, output_format):
+    """Test results are read back as written."""
+    output = tmp_path / f'out.{output_format}'
+    with get_writer(output, output_format) as writer:
+        for key, value in results.items():
+            writer.write(key, value)
+    assert read_output(output) == results
+
+
+@pytest.mark.parametrize('output_format', ['npz', 'parquet', 'hdf5'])
+def test_matrix_writers_read_output(tmp_path, output_format):
+    """Test matrix results are read back as written."""
+    if output_format in requires:
+        pytest.importorskip(requires[output_format])
+    output = tmp_path / f'out.{output_format}'
+    with get_writer(output, output_format) as writer:
+        for key, value in matrix_results.items():
+            writer.write(key, value)
+    assert read_output(output) == matrix_results
+
+
+def test_matrix_writer_abstract(tmp_path):
+    """Test matrix writers must implement `save`."""
+    with pytest.raises(TypeError):
+        MatrixWriter(tmp_path / 'results.npz')
+
+
+def test_json_writer_identical(tmp_path):
+    """Test JSON output is identical to dumping the whole results."""
+    output = tmp_path / 'out.json'
+    with get_writer(output) as writer:
+        for key, value in results.items():
+            writer.write(key, value)
+    assert output.read_text() == json.dumps(results, indent=4)
+
+
+def test_json_writer_empty(tmp_path):
+    """Test JSON output without results."""
+    output = tmp_path / 'out.json'
+    with get_writer(output):
+        pass
+    assert read_output(output) == {}
+
+
+def test_json_writer_crash(tmp_path):
+    """Test results written before a crash are kept as valid JSON."""
+    output = tmp_path / 'out.json'
+    with pytest.raises(ValueError):
+        with get_writer(output) as writer:
+            writer.write('conf_1', [1.0])
+            raise ValueError
+    assert read_output(output) == {'conf_1': [1.0]}
+
+
+def _run(output, pdbs, resume, crash_after=None):
+    """Write fake results of `pdbs`, crashing after `crash_after` PDBs."""
+    writer, pending = get_resumable_writer(output, 'json', pdbs, resume)
+    with writer:
+        for i, pdb in enumerate(pending):
+            if i == crash_after:
+                raise ValueError
+            writer.start(pdb)
+            if writer.empty:
+                writer.write('format', results['format'])
+            writer.write(pdb, results[pdb])
+    return pending
+
+
+@pytest.mark.parametrize('crash_after', [0, 1])
+def test_resume(tmp_path, crash_after):
+    """Test a resumed run gives the same output as a single run."""
+    pdbs = ['conf_1', 'conf_2']
+    expected = tmp_path / 'expected.json'
+    _run(expected, pdbs, resume=False)
+
+    output = tmp_path / 'out.json'
+    with pytest.raises(ValueError):
+        _run(output, pdbs, resume=True, crash_after=crash_after)
+    assert not output.exists()
+    # an interrupted write of the journal
+    with open(f'{output}.journal', 'a') as fout:
+        fout.write('["conf_2", [["conf')
+
+    pending = _run(output, pdbs, resume=True)
+    assert pending == pdbs[crash_after:]
+    assert output.read_text() == expected.read_text()
+    assert not Path(f'{output}.journal').exists()
+
+
+@pytest.mark.parametrize('output_format', ['npz', 'parquet', 'hdf5'])
+@pytest.mark.parametrize(
+    'values',
+    [
+        {'conf_1': 17.2, 'conf_2': 18.5},
+        {'conf_1': {'H': [8.1, 8.2], 'N': [120.0]}},
+        {'conf_1': {'rh': 17.2, 'dmax': 50.1}},
+        ],
+    )
+def test_matrix_writers_fields(tmp_path, output_format, values):
+    """Test scalar and dictionary results are read back as written."""
+    if output_format in requires:
+        pytest.importorskip(requires[output_format])
+    output = tmp_path / 'out'
+    with get_writer(output, output_format) as writer:
+        for key, value in values.items():
+            writer.write(key, value)
+    assert read_output(output) == values
+
+
+def test_read_matrix(tmp_path):
+    """Test the dense matrix of matrix_results."""
+    output = tmp_path / 'out.npz'
+    with get_writer(output, 'npz') as writer:
+        for key, value in matrix_results.items():
+            writer.write(key, value)
+    values, names, format, fields = read_matrix(output)
+    assert values.shape == (2, 2)
+    assert names == ['conf_1', 'conf_2']
+    assert format == matrix_results['format']
+    assert fields is None
+
+
+def test_matrix_writer_allocate(tmp_path):
+    """Test rows written in place are saved up to the last named row."""
+    output = tmp_path / 'out.npz'
+    with get_writer(output, 'npz') as writer:
+        writer.write('format', matrix_results['format'])
+        path = writer.allocate(3, 2)
+        writer.matrix[0] = matrix_results['conf_1']
+        writer.matrix[1] = matrix_results['conf_2']
+        writer.write_row('conf_1')
+        writer.write_row('conf_2')
+    assert read_output(output) == matrix_results
+    assert not path.exists()
+
+
+def test_parquet_column_names(tmp_path):
+    """Test Parquet columns of dictionaries are named by key."""
+    pq = pytest.importorskip('pyarrow.parquet')
+    output = tmp_path / 'out.parquet'
+    with get_writer(output, 'parquet') as writer:
+        writer.write('conf_1', {'rh': 17.2, 'H': [8.1, 8.2]})
+    table = pq.read_table(output)
+    assert table.column_names == ['name', 'rh', 'H_0', 'H_1']
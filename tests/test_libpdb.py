@@ -0,0 +1,46 @@
+"""Test fast PDB readers."""
+from idpconfgen.libs.libstructure import Structure
+from numpy.testing import assert_allclose, assert_array_equal
+
+from spycipdb.libs.libpdb import (
+    get_coords,
+    get_topology,
+    read_atom_lines,
+    set_coords,
+    )
+
+from . import asyn_test, drk_test
+
+
+def test_read_atom_lines():
+    """Test only atom records are read."""
+    lines = read_atom_lines(drk_test)
+    assert all(line.startswith((b'ATOM', b'HETATM')) for line in lines)
+    assert lines == read_atom_lines(drk_test.read_bytes())
+
+
+def test_get_coords():
+    """Test coordinates are the same as from `Structure`."""
+    s = Structure(drk_test)
+    s.build()
+    coords = get_coords(read_atom_lines(drk_test))
+    assert coords.dtype == s.coords.dtype
+    assert_array_equal(coords, s.coords)
+
+
+def test_get_topology():
+    """Test topology fingerprints."""
+    drk = get_topology(read_atom_lines(drk_test))
+    asyn = get_topology(read_atom_lines(asyn_test))
+    assert drk == get_topology(read_atom_lines(drk_test))
+    assert drk != asyn
+
+
+def test_set_coords():
+    """Test writing coordinates back reproduces the atom records."""
+    lines = read_atom_lines(drk_test)
+    coords = get_coords(lines)
+    assert set_coords(lines, coords) == lines
+    moved = set_coords(lines, coords + 1)
+    assert get_topology(moved) == get_topology(lines)
+    assert_allclose(get_coords(moved), coords + 1, atol=5e-4)
@@ -1,11 +1,18 @@
 """Test logging functions of spycipdb."""
+import asyncio
 from functools import partial
 
 import pytest
 
 from spycipdb import Path, log
 from spycipdb.core.exceptions import ReportOnCrashError
-from spycipdb.logger import S, T, init_files, report_on_crash
+from spycipdb.logger import (
+    S,
+    T,
+    async_report_on_crash,
+    init_files,
+    report_on_crash,
+    )
 
 
 def test_init_files():
@@ -83,3 +90,23 @@ def test_report_on_crash_partial():
     assert len(errfiles) > 0
     for p in errfiles:
         p.unlink()
+
+
+def test_async_report_on_crash():
+    """Test record coroutine func on error to file."""
+    async def funca(a, b, c=1, d=2):
+        raise TypeError
+
+    ext = 'testing_ROC'
+    with pytest.raises(ReportOnCrashError):
+        asyncio.run(async_report_on_crash(
+            funca,
+            'spycipdb', c=range(10), d=dict.fromkeys('qwerty'),
+            ROC_exception=TypeError,
+            ROC_ext=ext,
+            ))
+
+    errfiles = list(Path.cwd().glob(f'*.{ext}'))
+    assert len(errfiles) > 0
+    for p in errfiles:
+        p.unlink()
@@ -1,5 +1,6 @@
 """Test parsing functions in SPyCi-PDB."""
 from spycipdb.core.parsers import (
+    get_exp_format_jc,
     get_exp_format_noe,
     get_exp_format_pre,
     get_exp_format_smfret,
@@ -9,11 +10,19 @@ from . import (
     asyn_test,
     drk_test,
     fret_exp_expected,
+    jc_exp_expected,
     noe_exp_expected,
     pre_exp_expected,
     )
 
 
+def test_get_exp_format_jc():
+    """Test getting the format from jc exp file."""
+    format, errmsgs = get_exp_format_jc(jc_exp_expected, drk_test)
+    assert isinstance(format, list)
+    assert errmsgs == []
+
+
 def test_get_exp_format_noe():
     """Test getting the format from noe exp file."""
     format, _ = get_exp_format_noe(noe_exp_expected, drk_test)
@@ -0,0 +1,231 @@
+"""Test compiled restraint plans."""
+import json
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+from spycipdb.core.calculators import karplus_j
+from spycipdb.core.plans import (
+    CombinedPlan,
+    Conformer,
+    JCPlan,
+    NOEPlan,
+    PREPlan,
+    RestraintPlan,
+    SmFRETAVPlan,
+    SmFRETPlan,
+    calc_ensemble_with_plan,
+    calc_with_plan,
+    init_plan_worker,
+    read_conformer,
+    write_plan,
+    )
+from spycipdb.libs.libensemble import create_ensemble, get_batches
+from spycipdb.libs.liboutput import get_writer, read_matrix, read_output
+from spycipdb.libs.libpdb import get_coords, read_atom_lines, set_coords
+
+from . import (
+    asyn_test,
+    drk_test,
+    fret_exp_expected,
+    fret_output,
+    jc_exp_expected,
+    jc_output,
+    noe_exp_expected,
+    noe_output,
+    pre_exp_expected,
+    pre_output,
+    )
+
+
+def read_expected(output):
+    """Read the stored back-calculated values of the test conformer."""
+    with open(output) as fin:
+        return list(json.load(fin).values())[0]
+
+
+def test_restraint_plan_abstract():
+    """Test plans must implement the template and calculator."""
+    with pytest.raises(TypeError):
+        RestraintPlan(noe_exp_expected, drk_test)
+
+
+def test_jc_plan():
+    """Test JC plan against the stored output."""
+    plan = JCPlan(jc_exp_expected, drk_test)
+    _pdb, jc_bc = plan(drk_test)
+    assert_allclose(read_expected(jc_output), jc_bc, rtol=1e-5, atol=0)
+
+
+def test_noe_plan():
+    """Test NOE plan against the stored output."""
+    plan = NOEPlan(noe_exp_expected, drk_test)
+    _pdb, noe_bc = plan(drk_test)
+    assert_allclose(read_expected(noe_output), noe_bc, rtol=1e-5, atol=0)
+
+
+def test_pre_plan():
+    """Test PRE plan against the stored output."""
+    plan = PREPlan(pre_exp_expected, drk_test)
+    _pdb, pre_bc = plan(drk_test)
+    assert_allclose(read_expected(pre_output), pre_bc, rtol=1e-5, atol=0)
+
+
+def test_smfret_plan():
+    """Test smFRET plan against the stored output."""
+    plan = SmFRETPlan(fret_exp_expected, asyn_test)
+    _pdb, fret_bc = plan(asyn_test)
+    assert_allclose(read_expected(fret_output), fret_bc, rtol=1e-5, atol=0)
+    assert list(plan.format) == ['res1', 'res2', 'scale']
+
+
+def test_smfret_av_plan():
+    """Test smFRET plan with accessible-volume dyes."""
+    plan = SmFRETAVPlan(fret_exp_expected, asyn_test, spacing=2.0)
+    assert plan.model.linker_length == 20.0
+    assert plan.format == SmFRETPlan(fret_exp_expected, asyn_test).format
+    _pdb, fret_bc = plan(asyn_test)
+    assert len(fret_bc) == len(plan.exp)
+    
+    # reproducible in the workers
+    init_plan_worker(plan)
+    assert calc_with_plan(asyn_test)[1] == fret_bc
+
+
+def test_jc_plan_karplus():
+    """Test JC plan in hertz."""
+    plan = JCPlan(jc_exp_expected, drk_test, karplus=True)
+    _pdb, jc_bc = plan(drk_test)
+    expected = karplus_j(np.array(read_expected(jc_output)))
+    assert_allclose(expected, jc_bc, rtol=1e-5, atol=0)
+
+
+def test_calc_with_plan():
+    """Test the worker plan is used to back-calculate."""
+    plan = NOEPlan(noe_exp_expected, drk_test)
+    init_plan_worker(plan)
+    pdb, noe_bc = calc_with_plan(drk_test)
+    assert pdb == drk_test
+    assert_allclose(plan(drk_test)[1], noe_bc)
+
+
+def test_plan_topology_mismatch(tmp_path):
+    """Test conformers with a different topology are resolved again."""
+    plan = NOEPlan(noe_exp_expected, drk_test)
+    lines = drk_test.read_text().splitlines(keepends=True)
+    # drops the first atom, shifting all atom indices
+    other = tmp_path / 'other.pdb'
+    other.write_text(''.join(lines[1:]))
+    _pdb, noe_bc = plan(other)
+    assert_allclose(read_expected(noe_output), noe_bc, rtol=1e-5, atol=0)
+
+
+def test_combined_plan():
+    """Test combined plans against individual plans."""
+    plans = {
+        'noe': NOEPlan(noe_exp_expected, drk_test),
+        'pre': PREPlan(pre_exp_expected, drk_test),
+        'jc': JCPlan(jc_exp_expected, drk_test),
+        }
+    plan = CombinedPlan(plans, drk_test)
+    assert list(plan.format) == ['noe', 'pre', 'jc']
+    pdb, results = plan(drk_test)
+    assert pdb == drk_test
+    for name, p in plans.items():
+        assert_allclose(p(drk_test)[1], results[name])
+
+
+def test_combined_plan_ensemble(tmp_path):
+    """Test combined plans over a packed ensemble."""
+    lines = read_atom_lines(drk_test)
+    packed = create_ensemble(tmp_path, ['a.pdb'], lines, len(lines))
+    packed[0] = get_coords(lines)
+    packed.flush()
+    
+    plans = {'noe': NOEPlan(noe_exp_expected, drk_test)}
+    plan = CombinedPlan(plans, drk_test)
+    init_plan_worker(plan, tmp_path)
+    [(name, results)] = calc_ensemble_with_plan((0, 1))
+    assert name.name == 'a.pdb'
+    assert_allclose(results['noe'], plans['noe'](drk_test)[1], rtol=1e-6)
+
+
+def test_combined_plan_rh():
+    """Test Rh from coordinates only matches Rh from the PDB lines."""
+    plan = CombinedPlan({}, drk_test, rh=True)
+    conformer = read_conformer(drk_test, plan.topology)
+    rh = plan.calc_conformer(conformer)['rh']
+    packed = Conformer(conformer.name, conformer.coords, None, None)
+    assert plan.calc_conformer(packed)['rh'] == rh
+
+
+@pytest.mark.parametrize(
+    'plan_class,fexp,pdb',
+    [
+        (JCPlan, jc_exp_expected, drk_test),
+        (NOEPlan, noe_exp_expected, drk_test),
+        (PREPlan, pre_exp_expected, drk_test),
+        (SmFRETPlan, fret_exp_expected, asyn_test),
+        ],
+    )
+def test_calc_ensemble_with_plan(tmp_path, plan_class, fexp, pdb):
+    """Test batches of a packed ensemble match single conformers."""
+    lines = read_atom_lines(pdb)
+    coords = get_coords(lines)
+    packed = create_ensemble(tmp_path, ['a.pdb', 'b.pdb'], lines, len(lines))
+    packed[0] = coords
+    packed[1] = coords * 1.01
+    packed.flush()
+    
+    plan = plan_class(fexp, pdb)
+    assert plan.batched
+    init_plan_worker(plan, tmp_path)
+    results = calc_ensemble_with_plan((0, 2))
+    assert [r[0].name for r in results] == ['a.pdb', 'b.pdb']
+    assert_allclose(results[0][1], plan.calc(packed[0]))
+    assert_allclose(results[1][1], plan.calc(packed[1]))
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_write_plan(tmp_path, packed):
+    """Test rows written in place match the streamed results."""
+    plan = NOEPlan(noe_exp_expected, drk_test)
+    lines = read_atom_lines(drk_test)
+    coords = get_coords(lines)
+    names = ['a.pdb', 'b.pdb', 'c.pdb']
+    ensemble = create_ensemble(tmp_path / 'ens', names, lines, len(lines))
+    pdbs = []
+    for i, name in enumerate(names):
+        conf_lines = set_coords(lines, coords * (1 + i / 100))
+        ensemble[i] = get_coords(conf_lines)
+        pdb = tmp_path / name
+        pdb.write_bytes(b'\n'.join(conf_lines) + b'\n')
+        pdbs.append(pdb)
+    ensemble.flush()
+    
+    if packed:
+        items, path = get_batches(len(names), 2), tmp_path / 'ens'
+    else:
+        items, path = pdbs, None
+    
+    seen = []
+    with get_writer(tmp_path / 'out.npz', 'npz') as writer:
+        write_plan(
+            plan,
+            items,
+            writer,
+            ensemble=path,
+            callback=lambda pdb, values: seen.append(pdb.name),
+            )
+    values, rows, format, fields = read_matrix(tmp_path / 'out.npz')
+    assert rows == ['a', 'b', 'c']
+    assert seen == names
+    assert format == plan.format
+    assert fields is None
+    
+    with get_writer(tmp_path / 'out.json', 'json') as writer:
+        write_plan(plan, iter(pdbs), writer)
+    streamed = read_output(tmp_path / 'out.json')
+    assert_allclose(values, [streamed[row] for row in rows], rtol=1e-5)
+    assert not list(tmp_path.glob('*.rows.npy'))